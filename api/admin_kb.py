@@ -5,7 +5,7 @@ import secrets
 import base64
 import requests
 from pathlib import Path
-from typing import List
+from typing import Callable, List
 from fastapi import APIRouter, HTTPException, Depends, status, Request
 from fastapi.responses import StreamingResponse
 from fastapi.security import HTTPBasic, HTTPBasicCredentials
@@ -30,6 +30,9 @@ GITHUB_BRANCH = os.getenv("GITHUB_BRANCH", "main")
 
 ALLOWED_ORIGIN = "https://enatega-chatbot-knowledge-update.netlify.app"
 
+# Called after a successful re-ingest (e.g. to drop answer caches tied to the old KB)
+REINGEST_HOOKS: List[Callable[[], None]] = []
+
 
 # --- GitHub Sync ---
 def _github_headers():
@@ -254,7 +257,7 @@ async def reingest_knowledge(username: str = Depends(verify_admin)):
             env['PYTHONIOENCODING'] = 'utf-8'
 
             process = subprocess.Popen(
-                [sys.executable, "ingest_qdrant.py", "--recreate"],
+                [sys.executable, "ingest_qdrant.py"],
                 stdout=subprocess.PIPE,
                 stderr=subprocess.PIPE,
                 text=True,
@@ -279,6 +282,11 @@ async def reingest_knowledge(username: str = Depends(verify_admin)):
 
             stderr = process.stderr.read()
             if process.returncode == 0:
+                for hook in REINGEST_HOOKS:
+                    try:
+                        hook()
+                    except Exception as e:
+                        print("Reingest hook failed:", e)
                 msg = json.dumps({"status": "success", "message": "Re-ingestion completed successfully!"})
                 yield f"data: {msg}\n\n"
             else:
@@ -297,6 +305,7 @@ def get_status(username: str = Depends(verify_admin)):
     """Get Qdrant collection status"""
     try:
         from qdrant_client import QdrantClient
+        from qdrant_aliases import resolve_target
         QDRANT_URL = os.getenv("QDRANT_URL")
         QDRANT_API_KEY = os.getenv("QDRANT_API_KEY")
         COLLECTION = os.getenv("COLLECTION_NAME")
@@ -306,6 +315,7 @@ def get_status(username: str = Depends(verify_admin)):
 
         return {
             "collection": COLLECTION,
+            "target": resolve_target(client, COLLECTION),
             "chunks": count,
             "files": len(list(DATA_DIR.glob("*.txt")))
         }
@@ -0,0 +1,99 @@
+# api/answer_cache.py
+"""
+Semantic answer cache for first-turn questions.
+
+An entry matches when the retrieved chunk IDs are the same set and the query
+embeddings have cosine similarity >= threshold. Because the chunk IDs are part
+of the key, a re-ingest that changes the knowledge base makes old entries
+unreachable; clear() drops everything explicitly (hooked to admin reingest).
+"""
+import time, threading
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+
+class AnswerCache:
+    def __init__(self, threshold: float = 0.95, max_entries: int = 512, ttl_s: int = 24 * 3600):
+        self.threshold = threshold
+        self.max_entries = max(1, max_entries)
+        self.ttl_s = ttl_s
+        # entry id -> (chunk_key, unit query vector, answer, stored_at)
+        self._entries: "OrderedDict[int, Tuple[tuple, np.ndarray, str, float]]" = OrderedDict()
+        self._by_chunks: Dict[tuple, List[int]] = {}
+        self._next_id = 0
+        self._lock = threading.Lock()
+        self._counters = {"hits": 0, "misses": 0, "stores": 0, "evictions": 0, "clears": 0}
+
+    @staticmethod
+    def _chunk_key(chunk_ids: Iterable) -> tuple:
+        return tuple(sorted(str(i) for i in chunk_ids if i is not None))
+
+    @staticmethod
+    def _unit(vector) -> np.ndarray:
+        v = np.asarray(vector, dtype=np.float32)
+        n = float(np.linalg.norm(v))
+        return v / n if n else v
+
+    def _drop(self, entry_id: int):
+        chunk_key = self._entries.pop(entry_id)[0]
+        ids = self._by_chunks.get(chunk_key, [])
+        if entry_id in ids:
+            ids.remove(entry_id)
+        if not ids:
+            self._by_chunks.pop(chunk_key, None)
+
+    def get(self, vector, chunk_ids: Iterable) -> Optional[str]:
+        chunk_key = self._chunk_key(chunk_ids)
+        with self._lock:
+            candidates = self._by_chunks.get(chunk_key) if chunk_key else None
+            if candidates:
+                q = self._unit(vector)
+                now = time.time()
+                best_id, best_sim = None, self.threshold
+                for entry_id in list(candidates):
+                    _, v, _, stored_at = self._entries[entry_id]
+                    if now - stored_at > self.ttl_s:
+                        self._drop(entry_id)
+                        continue
+                    sim = float(np.dot(q, v))
+                    if sim >= best_sim:
+                        best_id, best_sim = entry_id, sim
+                if best_id is not None:
+                    self._entries.move_to_end(best_id)
+                    self._counters["hits"] += 1
+                    return self._entries[best_id][2]
+            self._counters["misses"] += 1
+            return None
+
+    def put(self, vector, chunk_ids: Iterable, answer: str):
+        chunk_key = self._chunk_key(chunk_ids)
+        if not chunk_key or not (answer or "").strip():
+            return
+        with self._lock:
+            entry_id = self._next_id
+            self._next_id += 1
+            self._entries[entry_id] = (chunk_key, self._unit(vector), answer, time.time())
+            self._by_chunks.setdefault(chunk_key, []).append(entry_id)
+            self._counters["stores"] += 1
+            while len(self._entries) > self.max_entries:
+                self._drop(next(iter(self._entries)))
+                self._counters["evictions"] += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._by_chunks.clear()
+            self._counters["clears"] += 1
+
+    def stats(self) -> Dict:
+        with self._lock:
+            lookups = self._counters["hits"] + self._counters["misses"]
+            return {
+                **self._counters,
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "threshold": self.threshold,
+                "hit_rate": round(self._counters["hits"] / lookups, 3) if lookups else 0.0,
+            }
@@ -0,0 +1,97 @@
+# api/chat_buckets.py
+"""
+Bucketed transcript layout.
+
+chat_sessions (MONGO_COL) keeps one small header per session: activity,
+expiry, page urls, user details and two counters, `first_seq` and
+`message_count`. The messages themselves live in chat_messages
+(MONGO_MSG_COL): one document per (session_id, bucket) holding up to
+`size` messages, where a message with sequence number `seq` goes to
+bucket `seq // size`. So no document grows without limit, and appending
+touches only the newest bucket.
+
+Sequence numbers are handed out by $inc on the header's message_count, so
+concurrent writers never share one. Transcripts migrated from the old
+`messages` array are given negative numbers ending at -1, below
+`first_seq`, so they sort before anything written since (see
+migrate_chat_buckets.py). Each message carries its `seq`, and buckets
+keep their array sorted by it. Until a session is migrated its header
+still embeds the old array and any messages written since deploy are in
+buckets from seq 0; readers merge the two (embedded_messages), numbering
+the array the way the migration will, and skip bucket copies of it that an
+interrupted migration may have left.
+
+Buckets expire on their own expireAt, which is refreshed whenever they are
+written. The oldest buckets of a very long session can therefore expire
+before its header; readers just return what is there.
+"""
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+from pymongo import ASCENDING, UpdateOne
+
+BUCKET_SIZE = 50
+
+
+def bucket_of(seq: int, size: int = BUCKET_SIZE) -> int:
+    return seq // size          # floor: migrated (negative) seqs get negative buckets
+
+
+def bucket_updates(session_id: str, first_seq: int, messages: List[Dict], expire_at: datetime,
+                   size: int = BUCKET_SIZE) -> List[UpdateOne]:
+    """Upserts appending `messages` (numbered from first_seq) to their buckets."""
+    by_bucket: Dict[int, List[Dict]] = {}
+    for i, m in enumerate(messages):
+        seq = first_seq + i
+        by_bucket.setdefault(bucket_of(seq, size), []).append({**m, "seq": seq})
+    ops = []
+    for bucket, items in by_bucket.items():
+        ops.append(UpdateOne(
+            {"session_id": session_id, "bucket": bucket},
+            {
+                "$push": {"messages": {"$each": items, "$sort": {"seq": 1}}},
+                "$min": {"first_ts": items[0].get("ts")},
+                "$max": {"last_ts": items[-1].get("ts")},
+                "$set": {"expireAt": expire_at},
+            },
+            upsert=True,
+        ))
+    return ops
+
+
+def embedded_messages(header: Dict) -> Tuple[List[Dict], int]:
+    """(messages still embedded in an unmigrated header, numbered to end at first_seq - 1, first_seq)."""
+    first = header.get("first_seq", 0)
+    legacy = header.get("messages") or []
+    start = first - len(legacy)
+    return [{**m, "seq": start + i} for i, m in enumerate(legacy)], first
+
+
+def page_range(header: Dict, limit: int, before: Optional[int] = None,
+               size: int = BUCKET_SIZE) -> Tuple[int, int, Dict]:
+    """(lo, hi, bucket filter) for the `limit` messages with seq < before (default: the newest)."""
+    first = header.get("first_seq", 0)
+    end = header.get("message_count", 0)
+    hi = end if before is None else max(first, min(before, end))
+    lo = max(first, hi - max(1, limit))
+    flt = {"session_id": header["session_id"],
+           "bucket": {"$gte": bucket_of(lo, size), "$lte": bucket_of(max(lo, hi - 1), size)}}
+    return lo, hi, flt
+
+
+def messages_in(buckets: List[Dict], lo: int, hi: int) -> List[Dict]:
+    """Messages with lo <= seq < hi from the fetched bucket documents, in order."""
+    out = [m for b in buckets for m in b.get("messages", []) if lo <= m.get("seq", lo) < hi]
+    out.sort(key=lambda m: m.get("seq", 0))
+    return out
+
+
+def tail_query(session_id: str, n: int, size: int = BUCKET_SIZE) -> Tuple[Dict, int]:
+    """(filter, bucket count) for reading the buckets holding a session's last n messages, newest first."""
+    return {"session_id": session_id}, -(-n // size) + 1
+
+
+def ensure_bucket_indexes(col):
+    """Unique (session_id, bucket) and a TTL index on expireAt (sync pymongo collection)."""
+    col.create_index([("session_id", ASCENDING), ("bucket", ASCENDING)], unique=True)
+    col.create_index([("expireAt", ASCENDING)], expireAfterSeconds=0)
@@ -0,0 +1,181 @@
+# api/context_packer.py
+"""
+Token-budgeted context assembly for the answer prompt.
+
+Retrieved chunks of the same page that overlap (the chunker records each
+chunk's chunk_index / start_index) are first stitched into one passage with
+the shared TOKEN_CHUNK_OVERLAP region kept once; the passage takes the rank of
+its best chunk. Passages are then taken in relevance order until the token
+budget (tiktoken, the chat model's encoding) is used up. Chunks without
+offsets (older payloads) fall back to trimming the text they share with
+already-picked chunks of their page. Exact duplicates are dropped. The last
+passage that does not fit is cut to the remaining budget if enough of it is
+left to be useful.
+"""
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+import tiktoken
+from langchain_core.documents import Document
+
+SEPARATOR = "\n\n"
+
+
+@dataclass
+class PackedContext:
+    docs: List[Document]
+    text: str
+    stats: Dict[str, int] = field(default_factory=dict)
+
+
+def _overlap(a: str, b: str, min_chars: int, max_chars: int) -> int:
+    """Length of the longest suffix of `a` that is also a prefix of `b` (0 if shorter than min_chars)."""
+    if len(a) < min_chars or len(b) < min_chars:
+        return 0
+    probe = b[:min_chars]
+    start = max(0, len(a) - max_chars)
+    best = 0
+    pos = a.find(probe, start)
+    while pos != -1:
+        n = len(a) - pos
+        if b.startswith(a[pos:]):
+            best = n            # earliest match = longest overlap
+            break
+        pos = a.find(probe, pos + 1)
+    return best
+
+
+def merge_adjacent(docs: List[Document]) -> List[Document]:
+    """Stitch overlapping/neighbouring chunks of the same page; order follows each group's best-ranked chunk."""
+    groups: Dict[str, List[tuple]] = {}
+    order: List[str] = []
+    singles: List[tuple] = []
+    for rank, d in enumerate(docs):
+        m = d.metadata or {}
+        start = m.get("start_index")
+        if m.get("slug") is None or start is None or start < 0:
+            singles.append((rank, d))
+            continue
+        if m["slug"] not in groups:
+            groups[m["slug"]] = []
+            order.append(m["slug"])
+        groups[m["slug"]].append((rank, d))
+
+    merged: List[tuple] = list(singles)
+    for slug in order:
+        run = None                                   # [best rank, start, text, metadata, n chunks]
+        seen_starts = set()
+        for rank, d in sorted(groups[slug], key=lambda x: x[1].metadata["start_index"]):
+            start, text = d.metadata["start_index"], d.page_content
+            if start in seen_starts:
+                continue
+            seen_starts.add(start)
+            if run is not None:
+                end = run[1] + len(run[2])
+                shared = end - start
+                offset = start - run[1]
+                overlaps = 0 < shared <= len(text) and run[2].endswith(text[:shared])
+                # a chunk lying wholly inside the run adds nothing (and no prefix/suffix trim would catch it)
+                inside = shared > len(text) and run[2][offset:offset + len(text)] == text
+                if overlaps or inside:
+                    if start + len(text) > end:
+                        run[2] += text[shared:]
+                    run[0] = min(run[0], rank)
+                    run[4] += 1
+                    continue
+                merged.append((run[0], _stitched(run)))
+            run = [rank, start, text, d.metadata, 1]
+        if run is not None:
+            merged.append((run[0], _stitched(run)))
+    return [d for _, d in sorted(merged, key=lambda x: x[0])]
+
+
+def _stitched(run: list) -> Document:
+    if run[4] == 1:
+        return Document(page_content=run[2], metadata=run[3])
+    return Document(page_content=run[2], metadata={**run[3], "start_index": run[1], "merged_chunks": run[4]})
+
+
+class ContextPacker:
+    def __init__(self, budget_tokens: int = 2000, model: str = "gpt-4o-mini", min_chunk_tokens: int = 60,
+                 min_overlap_chars: int = 40, max_overlap_chars: int = 4000):
+        self.budget_tokens = budget_tokens
+        self.min_chunk_tokens = min_chunk_tokens
+        self.min_overlap_chars = min_overlap_chars
+        self.max_overlap_chars = max_overlap_chars
+        try:
+            self.enc = tiktoken.encoding_for_model(model)
+        except KeyError:
+            self.enc = tiktoken.get_encoding("o200k_base")
+        self._sep_tokens = self.count(SEPARATOR)
+
+    def count(self, text: str) -> int:
+        return len(self.enc.encode(text or "", disallowed_special=()))
+
+    def _trim_overlap(self, text: str, picked: List[str]) -> tuple:
+        """Drop text shared with already-picked chunks of the same page (their tail = our head, or the reverse)."""
+        trimmed = 0
+        for prev in picked:
+            n = _overlap(prev, text, self.min_overlap_chars, self.max_overlap_chars)
+            if n:
+                text, trimmed = text[n:].lstrip(), trimmed + n
+            n = _overlap(text, prev, self.min_overlap_chars, self.max_overlap_chars)
+            if n:
+                text, trimmed = text[:-n].rstrip(), trimmed + n
+            if not text:
+                break
+        return text, trimmed
+
+    def pack(self, docs: List[Document], budget_tokens: Optional[int] = None) -> PackedContext:
+        budget = self.budget_tokens if budget_tokens is None else budget_tokens
+        n_in = len(docs)
+        docs = merge_adjacent(docs)
+        out: List[Document] = []
+        parts: List[str] = []
+        by_page: Dict[str, List[str]] = {}
+        seen = set()
+        used = 0
+        # counts are in retrieved chunks; a stitched passage counts as all of its chunks
+        stats = {"chunks_in": n_in, "chunks_used": 0, "chunks_merged": n_in - len(docs), "duplicates": 0,
+                 "overlap_tokens_trimmed": 0, "truncated": 0, "dropped": 0}
+
+        for d in docs:
+            n = d.metadata.get("merged_chunks", 1)
+            text = (d.page_content or "").strip()
+            key = text if n > 1 else d.metadata.get("content_hash") or text
+            if not text or key in seen:
+                stats["duplicates"] += n
+                continue
+            seen.add(key)
+
+            page = d.metadata.get("slug") or d.metadata.get("url") or ""
+            before = text
+            text, trimmed = self._trim_overlap(text, by_page.get(page, []))
+            if trimmed:
+                stats["overlap_tokens_trimmed"] += self.count(before) - self.count(text)
+            if not text:
+                stats["duplicates"] += n
+                continue
+
+            cost = self.count(text) + (self._sep_tokens if parts else 0)
+            if used + cost > budget:
+                room = budget - used - (self._sep_tokens if parts else 0)
+                if room >= self.min_chunk_tokens:
+                    text = self.enc.decode(self.enc.encode(text, disallowed_special=())[:room]).rstrip()
+                    cost = self.count(text) + (self._sep_tokens if parts else 0)
+                    stats["truncated"] += 1
+                else:
+                    stats["dropped"] = stats["chunks_in"] - stats["chunks_used"] - stats["duplicates"]
+                    break
+
+            by_page.setdefault(page, []).append(before)
+            out.append(Document(page_content=text, metadata=d.metadata))
+            parts.append(text)
+            used += cost
+            stats["chunks_used"] += n
+            if used >= budget:
+                stats["dropped"] = stats["chunks_in"] - stats["chunks_used"] - stats["duplicates"]
+                break
+
+        stats["context_tokens"] = used
+        return PackedContext(docs=out, text=SEPARATOR.join(parts), stats=stats)
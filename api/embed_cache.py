@@ -0,0 +1,175 @@
+# api/embed_cache.py
+"""
+Query-embedding cache that sits in front of OpenAIEmbeddings.
+
+Keys are the normalized query text (case/whitespace/trailing punctuation
+folded), values are float32 vectors. Memory is bounded by an LRU with a TTL;
+an optional sqlite file keeps vectors across restarts. On the async path the
+sqlite lookup and write run in a worker thread so they never block the
+event loop.
+"""
+import asyncio, re, time, sqlite3, hashlib, threading
+from array import array
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+from langchain_core.embeddings import Embeddings
+
+_ws_re = re.compile(r"\s+")
+
+
+def normalize_query(text: str) -> str:
+    return _ws_re.sub(" ", (text or "").strip().lower()).rstrip("?!.,; ")
+
+
+class CachedEmbeddings(Embeddings):
+    """Wraps an Embeddings instance; only embed_query/aembed_query are cached."""
+
+    def __init__(self, inner: Embeddings, max_entries: int = 2048, ttl_s: int = 7 * 24 * 3600,
+                 path: Optional[str] = None, disk_max_entries: Optional[int] = None):
+        self.inner = inner
+        self.namespace = getattr(inner, "model", "") or inner.__class__.__name__
+        self.max_entries = max(1, max_entries)
+        self.ttl_s = ttl_s
+        self.disk_max_entries = disk_max_entries or self.max_entries * 10
+        self._mem: "OrderedDict[str, tuple]" = OrderedDict()  # key -> (stored_at, array('f'))
+        self._lock = threading.Lock()
+        self._db_lock = threading.Lock()
+        self._counters = {"hits": 0, "misses": 0, "disk_hits": 0, "evictions": 0}
+        self._db = None
+        self._puts = 0
+        if path:
+            self._open_db(path)
+
+    # ---- persistence ----
+    def _open_db(self, path: str):
+        try:
+            db = sqlite3.connect(path, check_same_thread=False)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=NORMAL")
+            db.execute("CREATE TABLE IF NOT EXISTS emb (key TEXT PRIMARY KEY, ts REAL, vec BLOB)")
+            db.execute("DELETE FROM emb WHERE ts < ?", (time.time() - self.ttl_s,))
+            db.commit()
+            self._db = db
+        except Exception as e:
+            print("Embedding cache disk store disabled:", e)
+
+    def _disk_get(self, key: str) -> Optional[tuple]:
+        row = self._db.execute("SELECT ts, vec FROM emb WHERE key = ?", (key,)).fetchone()
+        if not row or time.time() - row[0] > self.ttl_s:
+            return None
+        vec = array("f")
+        vec.frombytes(row[1])
+        return row[0], vec
+
+    def _disk_put(self, key: str, stored_at: float, vec: array):
+        self._db.execute("INSERT OR REPLACE INTO emb (key, ts, vec) VALUES (?, ?, ?)", (key, stored_at, vec.tobytes()))
+        self._puts += 1
+        if self._puts % 256 == 0:
+            self._db.execute(
+                "DELETE FROM emb WHERE key NOT IN (SELECT key FROM emb ORDER BY ts DESC LIMIT ?)",
+                (self.disk_max_entries,),
+            )
+        self._db.commit()
+
+    # ---- cache core ----
+    def _key(self, text: str) -> str:
+        return hashlib.sha1(f"{self.namespace}\0{normalize_query(text)}".encode("utf-8")).hexdigest()
+
+    def _mem_get(self, key: str) -> Optional[List[float]]:
+        with self._lock:
+            hit = self._mem.get(key)
+            if hit and time.time() - hit[0] <= self.ttl_s:
+                self._mem.move_to_end(key)
+                self._counters["hits"] += 1
+                return hit[1].tolist()
+            if hit:
+                del self._mem[key]
+            if self._db is None:
+                self._counters["misses"] += 1
+            return None
+
+    def _disk_lookup(self, key: str) -> Optional[List[float]]:
+        """Second level after a memory miss (only called with a disk store)."""
+        try:
+            with self._db_lock:
+                hit = self._disk_get(key)
+        except Exception as e:
+            print("Embedding cache disk read failed:", e)
+            hit = None
+        with self._lock:
+            if hit:
+                self._insert(key, hit)
+                self._counters["disk_hits"] += 1
+                return hit[1].tolist()
+            self._counters["misses"] += 1
+            return None
+
+    def _get(self, key: str) -> Optional[List[float]]:
+        vec = self._mem_get(key)
+        if vec is None and self._db is not None:
+            vec = self._disk_lookup(key)
+        return vec
+
+    def _insert(self, key: str, entry: tuple):
+        self._mem[key] = entry
+        self._mem.move_to_end(key)
+        while len(self._mem) > self.max_entries:
+            self._mem.popitem(last=False)
+            self._counters["evictions"] += 1
+
+    def _mem_put(self, key: str, vector: List[float]) -> tuple:
+        entry = (time.time(), array("f", vector))
+        with self._lock:
+            self._insert(key, entry)
+        return entry
+
+    def _disk_write(self, key: str, entry: tuple):
+        try:
+            with self._db_lock:
+                self._disk_put(key, *entry)
+        except Exception as e:
+            print("Embedding cache disk write failed:", e)
+
+    def _put(self, key: str, vector: List[float]):
+        entry = self._mem_put(key, vector)
+        if self._db is not None:
+            self._disk_write(key, entry)
+
+    # ---- Embeddings interface ----
+    def embed_query(self, text: str) -> List[float]:
+        key = self._key(text)
+        vec = self._get(key)
+        if vec is None:
+            vec = self.inner.embed_query(text)
+            self._put(key, vec)
+        return vec
+
+    async def aembed_query(self, text: str) -> List[float]:
+        key = self._key(text)
+        vec = self._mem_get(key)
+        if vec is None and self._db is not None:
+            vec = await asyncio.to_thread(self._disk_lookup, key)
+        if vec is None:
+            vec = await self.inner.aembed_query(text)
+            entry = self._mem_put(key, vec)
+            if self._db is not None:
+                await asyncio.to_thread(self._disk_write, key, entry)
+        return vec
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.inner.embed_documents(texts)
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        return await self.inner.aembed_documents(texts)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            lookups = self._counters["hits"] + self._counters["disk_hits"] + self._counters["misses"]
+            return {
+                **self._counters,
+                "entries": len(self._mem),
+                "max_entries": self.max_entries,
+                "hit_rate": round((lookups - self._counters["misses"]) / lookups, 3) if lookups else 0.0,
+                "persistent": self._db is not None,
+            }
@@ -0,0 +1,162 @@
+# api/history_compactor.py
+"""
+Chat history for the answer prompt, kept under a token budget.
+
+Assistant answers are stored as the HTML the model produced; in the prompt
+they are reduced to plain text (tags dropped, headings and list items kept on
+their own lines), which roughly halves their size.
+
+In "summary" mode the last `keep_turns` turns stay verbatim and older ones are
+folded into a running per-session summary (SessionStore.set_summary) by a
+small LLM call. The fold runs as a background task scheduled after the answer
+has been sent, so it never sits on the request path; until it lands, the turns
+waiting for it are still rendered verbatim. "full" mode skips the summary.
+Either way, turns are added newest first until `budget_tokens` is used; the
+newest turn is cut down rather than dropped.
+"""
+import asyncio, html, re, time
+from typing import Callable, Dict, List
+
+from langchain_core.output_parsers import StrOutputParser
+from langchain_core.prompts import PromptTemplate
+
+_ITEM = re.compile(r"<\s*li\b[^>]*>", re.I)
+_BREAK = re.compile(r"<\s*(?:br|/p|/h[1-6]|/li|/ul|/ol|/div|/tr|/table)\b[^>]*>", re.I)
+_TAG = re.compile(r"<[^>]+>")
+
+SUMMARY_PROMPT = PromptTemplate.from_template(
+    "You keep a running summary of a chat between a visitor and Enatega's website assistant.\n"
+    "Update the summary with the new turns. Keep what the visitor wants (business type, region, apps, "
+    "features, budget, decisions) and the concrete facts the assistant gave them; drop greetings and "
+    "sales phrasing. Plain text, at most {max_words} words.\n\n"
+    "Current summary:\n{summary}\n\n"
+    "New turns:\n{turns}\n\n"
+    "Updated summary:"
+)
+
+
+def html_to_text(text: str) -> str:
+    """Plain text of an HTML answer: tags dropped, entities decoded, one line per block/list item."""
+    text = _ITEM.sub("\n- ", text or "")
+    text = _BREAK.sub("\n", text)
+    text = html.unescape(_TAG.sub("", text))
+    lines = (" ".join(line.split()) for line in text.splitlines())
+    return "\n".join(line for line in lines if line)
+
+
+def format_turn(question: str, answer: str) -> str:
+    return f"User: {question}\nAssistant: {html_to_text(answer)}"
+
+
+class HistoryCompactor:
+    def __init__(self, store, llm, count: Callable[[str], int], mode: str = "summary", keep_turns: int = 3,
+                 budget_tokens: int = 1200, summary_tokens: int = 300, fold_batch: int = 2):
+        self.store = store
+        self.count = count
+        self.mode = mode
+        self.keep_turns = max(1, keep_turns)
+        self.budget_tokens = budget_tokens
+        self.summary_tokens = summary_tokens
+        self.fold_batch = max(1, fold_batch)
+        self.chain = SUMMARY_PROMPT | llm.bind(max_tokens=summary_tokens) | StrOutputParser()
+        self._running: Dict[str, asyncio.Task] = {}
+        self._counters = {"renders": 0, "history_tokens": 0, "turns_dropped": 0, "turns_cut": 0,
+                          "folds": 0, "turns_folded": 0, "fold_errors": 0, "fold_ms": 0}
+
+    def _cut(self, text: str, budget: int) -> str:
+        """Shorten text from the end until it fits `budget` tokens (count() is all we have)."""
+        cost = self.count(text)
+        while text and cost > budget:
+            text = text[:max(0, int(len(text) * budget / cost) - 1)].rstrip()
+            cost = self.count(text)
+        return text
+
+    def render(self, hist) -> str:
+        """Prompt text for SessionHistory.get() output: summary first, then recent turns oldest to newest."""
+        if not hist:
+            return ""
+        summary = ""
+        turns, question = [], None
+        for m in hist:
+            if m.type == "summary":
+                summary = m.content
+            elif m.type == "human":
+                question = m.content
+            elif question is not None:
+                turns.append((question, m.content))
+                question = None
+
+        budget = self.budget_tokens
+        head = ""
+        if summary:
+            head = self._cut(f"Summary of the earlier conversation: {summary}", budget)
+            budget -= self.count(head)
+        picked: List[str] = []
+        for i, (question, answer) in enumerate(reversed(turns)):
+            block = format_turn(question, answer)
+            cost = self.count(block) + 1
+            if cost > budget:
+                if i == 0 and budget > 0:
+                    block = self._cut(block, budget - 1)
+                    self._counters["turns_cut"] += 1
+                    if block:
+                        picked.append(block)
+                        budget -= self.count(block) + 1
+                        continue
+                self._counters["turns_dropped"] += len(turns) - i
+                break
+            picked.append(block)
+            budget -= cost
+
+        text = "\n".join(([head] if head else []) + picked[::-1])
+        self._counters["renders"] += 1
+        self._counters["history_tokens"] += self.budget_tokens - budget
+        return text
+
+    def schedule(self, session_id: str):
+        """Fold older turns into the session summary in the background (no-op in "full" mode)."""
+        if self.mode != "summary" or session_id in self._running:
+            return
+        if self.store.fold_candidates(session_id, self.keep_turns, self.fold_batch) is None:
+            return
+        task = asyncio.create_task(self._fold(session_id))
+        self._running[session_id] = task
+        task.add_done_callback(lambda _: self._running.pop(session_id, None))
+
+    async def _fold(self, session_id: str):
+        pending = self.store.fold_candidates(session_id, self.keep_turns, self.fold_batch)
+        if pending is None:
+            return
+        summary, turns, covers = pending
+        t0 = time.perf_counter()
+        try:
+            new = await self.chain.ainvoke({
+                "summary": summary or "(none yet)",
+                "turns": "\n".join(format_turn(q, a) for q, a in turns),
+                "max_words": max(40, self.summary_tokens * 3 // 4),
+            })
+        except Exception as e:
+            self._counters["fold_errors"] += 1
+            print("History summary failed:", e)
+            return
+        self._counters["fold_ms"] += int((time.perf_counter() - t0) * 1000)
+        if new.strip() and self.store.set_summary(session_id, new.strip(), covers):
+            self._counters["folds"] += 1
+            self._counters["turns_folded"] += len(turns)
+
+    async def drain(self):
+        """Wait for folds in flight (shutdown)."""
+        if self._running:
+            await asyncio.gather(*self._running.values(), return_exceptions=True)
+
+    def stats(self) -> Dict:
+        c = self._counters
+        return {
+            **c,
+            "mode": self.mode,
+            "keep_turns": self.keep_turns,
+            "budget_tokens": self.budget_tokens,
+            "avg_history_tokens": round(c["history_tokens"] / c["renders"], 1) if c["renders"] else 0.0,
+            "avg_fold_ms": round(c["fold_ms"] / c["folds"], 1) if c["folds"] else 0.0,
+            "folds_running": len(self._running),
+        }
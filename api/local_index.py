@@ -0,0 +1,179 @@
+# api/local_index.py
+"""
+In-process vector index: every chunk vector in one contiguous float32 matrix,
+top-k answered with a single matrix-vector product. The knowledge base is a
+few hundred chunks, so this takes Qdrant off the request path entirely.
+
+Loads either by scrolling the Qdrant collection or straight from the
+embedding artifact written by ingest_qdrant.py (embedding_store.py), which
+needs no network and, for a float32 artifact, maps the vectors without a copy.
+
+Supports the same payload filters as query_qdrant.py (domain / is_active via
+qdrant Filter.must / must_not with MatchValue), or a plain {field: value} dict.
+"""
+import json, pathlib
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+from langchain_core.callbacks import CallbackManagerForRetrieverRun, AsyncCallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+from qdrant_client.http import models as qm
+
+CONTENT_KEY = "page_content"
+METADATA_KEY = "metadata"
+MAX_CACHED_MASKS = 64
+
+
+class LocalVectorIndex:
+    def __init__(self, ids: Sequence, texts: Sequence[str], metadatas: Sequence[Dict], vectors, source: str = "",
+                 normalized: bool = False):
+        mat = np.asarray(vectors, dtype=np.float32)
+        if not normalized:
+            norms = np.linalg.norm(mat, axis=1, keepdims=True)
+            norms[norms == 0] = 1.0
+            mat = mat / norms
+        self.matrix = np.ascontiguousarray(mat)
+        self.ids = list(ids)
+        self.texts = list(texts)
+        self.metadatas = [dict(m or {}) for m in metadatas]
+        self.source = source
+        self._masks: Dict[Tuple[str, Any], np.ndarray] = {}
+
+    def __len__(self):
+        return len(self.ids)
+
+    @classmethod
+    def from_qdrant(cls, client, collection: str, batch: int = 256) -> "LocalVectorIndex":
+        """Scroll every point (payload + vector) once, e.g. at startup."""
+        ids, texts, metas, vecs = [], [], [], []
+        offset = None
+        while True:
+            points, offset = client.scroll(
+                collection_name=collection, limit=batch, offset=offset,
+                with_payload=True, with_vectors=True,
+            )
+            for p in points:
+                payload = p.payload or {}
+                vec = p.vector.get("") if isinstance(p.vector, dict) else p.vector
+                if vec is None:
+                    continue
+                meta = dict(payload.get(METADATA_KEY) or {})
+                meta["_id"] = p.id
+                meta["_collection_name"] = collection
+                ids.append(p.id)
+                texts.append(payload.get(CONTENT_KEY, ""))
+                metas.append(meta)
+                vecs.append(vec)
+            if offset is None:
+                break
+        if not vecs:
+            raise RuntimeError(f"No vectors found in collection '{collection}'")
+        return cls(ids, texts, metas, vecs, source=f"qdrant:{collection}")
+
+    @classmethod
+    def from_artifact(cls, store, chunks_jsonl, collection: str = "") -> "LocalVectorIndex":
+        """
+        Build from an embedding_store.EmbeddingStore plus chunks_all.jsonl.
+        One entry per artifact row (unique chunk text); chunk IDs are the content hashes.
+        """
+        from embedding_store import chunk_hash
+
+        first_row: Dict[str, Dict] = {}
+        for line in pathlib.Path(chunks_jsonl).read_text(encoding="utf-8").splitlines():
+            if not line.strip():
+                continue
+            row = json.loads(line)
+            h = row.get("content_hash") or chunk_hash(row.get("text", ""))
+            first_row.setdefault(h, row)
+        missing = [h for h in store.hashes if h not in first_row]
+        if missing:
+            raise RuntimeError(f"{len(missing)} artifact rows have no chunk in {chunks_jsonl}")
+        texts, metas = [], []
+        for h in store.hashes:
+            row = first_row[h]
+            meta = {k: v for k, v in row.items() if k != "text"}
+            meta["content_hash"] = h
+            meta["_id"] = h
+            meta["_collection_name"] = collection
+            texts.append(row.get("text", ""))
+            metas.append(meta)
+        # OpenAI embeddings are unit length already
+        return cls(list(store.hashes), texts, metas, store.vectors, source=f"artifact:{chunks_jsonl}", normalized=True)
+
+    # ---- filters ----
+    @staticmethod
+    def _field(key: str) -> str:
+        return key[len(METADATA_KEY) + 1:] if key.startswith(METADATA_KEY + ".") else key
+
+    def _mask_for(self, key: str, value) -> np.ndarray:
+        cache_key = (key, value)
+        mask = self._masks.get(cache_key)
+        if mask is None:
+            mask = np.fromiter((m.get(key) == value for m in self.metadatas), dtype=bool, count=len(self.metadatas))
+            if len(self._masks) >= MAX_CACHED_MASKS:
+                self._masks.pop(next(iter(self._masks)))   # oldest first
+            self._masks[cache_key] = mask
+        return mask
+
+    def _condition_mask(self, cond) -> np.ndarray:
+        if not isinstance(cond, qm.FieldCondition) or not isinstance(cond.match, qm.MatchValue):
+            raise ValueError(f"Unsupported filter condition for local index: {cond!r}")
+        return self._mask_for(self._field(cond.key), cond.match.value)
+
+    def filter_mask(self, flt) -> Optional[np.ndarray]:
+        if flt is None:
+            return None
+        if isinstance(flt, dict):
+            mask = np.ones(len(self), dtype=bool)
+            for key, value in flt.items():
+                mask &= self._mask_for(self._field(key), value)
+            return mask
+        mask = np.ones(len(self), dtype=bool)
+        for cond in flt.must or []:
+            mask &= self._condition_mask(cond)
+        for cond in flt.must_not or []:
+            mask &= ~self._condition_mask(cond)
+        if flt.should:
+            any_mask = np.zeros(len(self), dtype=bool)
+            for cond in flt.should:
+                any_mask |= self._condition_mask(cond)
+            mask &= any_mask
+        return mask
+
+    # ---- search ----
+    def search(self, vector, k: int = 6, flt=None) -> List[Tuple[Document, float]]:
+        q = np.asarray(vector, dtype=np.float32)
+        n = float(np.linalg.norm(q))
+        if n:
+            q = q / n
+        scores = self.matrix @ q
+        mask = self.filter_mask(flt)
+        if mask is not None:
+            scores = np.where(mask, scores, -np.inf)
+        k = min(k, len(scores))
+        if k <= 0:
+            return []
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [
+            (Document(page_content=self.texts[i], metadata=dict(self.metadatas[i])), float(scores[i]))
+            for i in top if scores[i] != -np.inf
+        ]
+
+
+class LocalIndexRetriever(BaseRetriever):
+    """Drop-in for vs.as_retriever(): same invoke/ainvoke interface."""
+
+    index: Any
+    embeddings: Any
+    k: int = 6
+    filter: Any = None
+
+    def _get_relevant_documents(self, query: str, *, run_manager: CallbackManagerForRetrieverRun) -> List[Document]:
+        vector = self.embeddings.embed_query(query)
+        return [d for d, _ in self.index.search(vector, k=self.k, flt=self.filter)]
+
+    async def _aget_relevant_documents(self, query: str, *, run_manager: AsyncCallbackManagerForRetrieverRun) -> List[Document]:
+        vector = await self.embeddings.aembed_query(query)
+        return [d for d, _ in self.index.search(vector, k=self.k, flt=self.filter)]
@@ -0,0 +1,368 @@
+# api/session_store.py
+"""
+Bounded in-process chat history, one entry per session id.
+
+Replaces a plain dict of ConversationBufferMemory objects that grew with
+every visitor. Each session keeps only its last `max_turns` (question,
+answer) string pairs in a deque; sessions live in an LRU capped at
+`max_sessions` and are dropped once idle for `idle_ttl_s` (the transcript
+TTL, CHAT_TTL_DAYS). Expired sessions are swept from the LRU's cold end on
+every write, so there is no background task.
+
+A session can also carry a running summary of its older turns (see
+api/history_compactor.py): history() then returns the summary followed by
+the turns it does not cover yet. fold_candidates()/set_summary() track which
+turns are folded by an absolute turn count, so turns that roll out of the
+deque or arrive while a summary is being written are never double-counted.
+With `max_unsummarized` set, a turn the summary does not cover yet is kept
+past `max_turns` (up to that many extra turns) so a failed or slow fold does
+not lose it; the window shrinks back once a fold lands.
+
+SessionHistory puts a shared backend behind the store so a follow-up that
+lands on another worker or replica still has its history: on a local miss
+(or a local copy idle longer than `refresh_s`, which another worker may have
+moved past) the last turns are loaded from
+
+- MongoHistory: the transcript append_message already writes (through the
+  write-behind TranscriptWriter, so it can trail by one flush interval);
+  only the newest message buckets are read (api/chat_buckets.py), after
+  the tail of the header's embedded array for sessions not migrated yet.
+- RedisHistory: a capped list per session (redis.asyncio, optional import),
+  written through on every turn; any Redis-compatible server works.
+"""
+import asyncio, html, json, time, threading
+from collections import OrderedDict, deque, namedtuple
+from typing import Dict, List, Optional, Tuple
+
+from api.chat_buckets import BUCKET_SIZE, tail_query
+
+# Read like LangChain messages where history is formatted (m.type, m.content) without building them
+HistoryMessage = namedtuple("HistoryMessage", "type content")
+
+
+def _same_turn(question: str, answer: str) -> Tuple[str, str]:
+    """A turn as compared across stores: the transcript keeps the question HTML-escaped and both sides
+    stripped, so unescape and collapse whitespace before matching."""
+    return " ".join(html.unescape(question).split()), " ".join(answer.split())
+
+
+class _Session:
+    __slots__ = ("turns", "last_used", "total", "summary", "summarized")
+
+    def __init__(self, now: float):
+        self.turns: deque = deque()   # (question, answer); trimmed by SessionStore._trim
+        self.last_used = now
+        self.total = 0          # turns ever added; turns[i] is turn number total - len(turns) + i
+        self.summary = ""
+        self.summarized = 0     # turns covered by summary (absolute count)
+
+    def unsummarized(self) -> int:
+        """Index into turns of the first turn the summary does not cover."""
+        return min(len(self.turns), max(0, self.summarized - (self.total - len(self.turns))))
+
+
+class SessionStore:
+    def __init__(self, max_sessions: int = 10000, idle_ttl_s: float = 7 * 24 * 3600, max_turns: int = 8,
+                 max_unsummarized: int = 0, clock=time.monotonic):
+        self.max_sessions = max(1, max_sessions)
+        self.idle_ttl_s = idle_ttl_s
+        self.max_turns = max(1, max_turns)
+        self.max_unsummarized = max(0, max_unsummarized)
+        self._clock = clock
+        self._sessions: "OrderedDict[str, _Session]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._counters = {"hits": 0, "misses": 0, "turns_added": 0, "evicted_lru": 0, "expired": 0, "cleared": 0,
+                          "held_unsummarized": 0, "dropped_unsummarized": 0}
+
+    def _trim(self, s: _Session):
+        """Keep the last max_turns turns, plus older ones the summary does not cover yet (bounded)."""
+        hold = self.max_turns + self.max_unsummarized
+        while len(s.turns) > self.max_turns:
+            if self.max_unsummarized and s.unsummarized() == 0:
+                if len(s.turns) <= hold:
+                    return
+                self._counters["dropped_unsummarized"] += 1
+            s.turns.popleft()
+
+    def _sweep(self, now: float, limit: int = 64):
+        """Drop idle sessions from the cold end; bounded work per call."""
+        for _ in range(limit):
+            if not self._sessions:
+                return
+            sid, s = next(iter(self._sessions.items()))
+            if now - s.last_used <= self.idle_ttl_s:
+                return
+            del self._sessions[sid]
+            self._counters["expired"] += 1
+
+    def _live(self, session_id: str, now: float) -> Optional[_Session]:
+        s = self._sessions.get(session_id)
+        if s is not None and now - s.last_used > self.idle_ttl_s:
+            del self._sessions[session_id]
+            self._counters["expired"] += 1
+            return None
+        return s
+
+    def history(self, session_id: str) -> List[HistoryMessage]:
+        """Recent turns as alternating human/ai messages, after a ("summary", text) message when the
+        session has one (empty for an unknown session)."""
+        now = self._clock()
+        with self._lock:
+            s = self._live(session_id, now)
+            if s is None:
+                self._counters["misses"] += 1
+                return []
+            self._counters["hits"] += 1
+            s.last_used = now
+            self._sessions.move_to_end(session_id)
+            turns = list(s.turns)[s.unsummarized():]
+            summary = s.summary
+        out: List[HistoryMessage] = [HistoryMessage("summary", summary)] if summary else []
+        for question, answer in turns:
+            out.append(HistoryMessage("human", question))
+            out.append(HistoryMessage("ai", answer))
+        return out
+
+    def add_turn(self, session_id: str, question: str, answer: str):
+        now = self._clock()
+        with self._lock:
+            s = self._live(session_id, now)
+            if s is None:
+                s = self._sessions[session_id] = _Session(now)
+                while len(self._sessions) > self.max_sessions:
+                    self._sessions.popitem(last=False)
+                    self._counters["evicted_lru"] += 1
+            else:
+                self._sessions.move_to_end(session_id)
+            s.turns.append((question, answer))
+            s.total += 1
+            if len(s.turns) > self.max_turns and s.unsummarized() == 0 and self.max_unsummarized:
+                self._counters["held_unsummarized"] += 1
+            self._trim(s)
+            s.last_used = now
+            self._counters["turns_added"] += 1
+            self._sweep(now)
+
+    def replace(self, session_id: str, turns: List[Tuple[str, str]]):
+        """Install turns loaded from elsewhere (e.g. a shared backend) as this session's history.
+
+        When the loaded turns continue the local ones (another worker answered since), only the
+        new turns are appended and the summary is kept; otherwise the session starts over. Turns
+        match ignoring HTML escaping and whitespace (see _same_turn)."""
+        now = self._clock()
+        turns = list(turns)
+        with self._lock:
+            s = self._sessions.get(session_id)
+            if s is None:
+                s = self._sessions[session_id] = _Session(now)
+                while len(self._sessions) > self.max_sessions:
+                    self._sessions.popitem(last=False)
+                    self._counters["evicted_lru"] += 1
+            else:
+                self._sessions.move_to_end(session_id)
+            local = [_same_turn(q, a) for q, a in s.turns]
+            loaded = [_same_turn(q, a) for q, a in turns]
+            shared = next((k for k in range(min(len(local), len(loaded)), 0, -1)
+                           if local[len(local) - k:] == loaded[:k]), 0)
+            if not shared:
+                s.turns.clear()
+                s.total, s.summary, s.summarized = 0, "", 0
+            s.turns.extend(turns[shared:])
+            s.total += len(turns) - shared
+            self._trim(s)
+            s.last_used = now
+
+    def fold_candidates(self, session_id: str, keep_turns: int,
+                        min_batch: int = 1) -> Optional[Tuple[str, List[Tuple[str, str]], int]]:
+        """(summary, turns to fold into it, turn count the new summary covers) when at least
+        `min_batch` turns older than the last `keep_turns` are not summarized yet, else None."""
+        with self._lock:
+            s = self._sessions.get(session_id)
+            if s is None:
+                return None
+            start = s.unsummarized()
+            stop = max(start, len(s.turns) - keep_turns)
+            if stop - start < min_batch:
+                return None
+            return s.summary, list(s.turns)[start:stop], s.total - len(s.turns) + stop
+
+    def set_summary(self, session_id: str, summary: str, covers: int) -> bool:
+        """Store a summary covering the first `covers` turns; ignored if a newer one landed first."""
+        with self._lock:
+            s = self._sessions.get(session_id)
+            if s is None or covers <= s.summarized or covers > s.total:
+                return False
+            s.summary, s.summarized = summary, covers
+            self._trim(s)
+            return True
+
+    def idle_for(self, session_id: str) -> Optional[float]:
+        """Seconds since the session was last used here, None if it is not held (does not touch it)."""
+        with self._lock:
+            s = self._sessions.get(session_id)
+            return None if s is None else self._clock() - s.last_used
+
+    def clear(self, session_id: str) -> bool:
+        with self._lock:
+            if self._sessions.pop(session_id, None) is None:
+                return False
+            self._counters["cleared"] += 1
+            return True
+
+    def sweep(self) -> int:
+        """Drop every idle session now; returns how many went."""
+        with self._lock:
+            before = self._counters["expired"]
+            self._sweep(self._clock(), limit=len(self._sessions))
+            return self._counters["expired"] - before
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+    def __contains__(self, session_id: str) -> bool:
+        return session_id in self._sessions
+
+    def stats(self) -> Dict:
+        with self._lock:
+            total = self._counters["hits"] + self._counters["misses"]
+            return {
+                **self._counters,
+                "sessions": len(self._sessions),
+                "max_sessions": self.max_sessions,
+                "max_turns": self.max_turns,
+                "max_unsummarized": self.max_unsummarized,
+                "idle_ttl_s": self.idle_ttl_s,
+                "hit_rate": round(self._counters["hits"] / total, 4) if total else 0.0,
+            }
+
+
+# ---------- shared backends ----------
+def turns_from_messages(messages: List[Dict]) -> List[Tuple[str, str]]:
+    """Pair transcript messages ({role, html}) into (question, answer) turns; unanswered questions are skipped."""
+    turns, question = [], None
+    for m in messages or []:
+        if m.get("role") == "user":
+            question = html.unescape(m.get("html") or "")
+        elif question is not None:
+            turns.append((question, m.get("html") or ""))
+            question = None
+    return turns
+
+
+class MongoHistory:
+    """Reads the newest chat_messages buckets (motor collection); writes happen in append_message.
+
+    With `sessions` (the chat_sessions collection), a header that still embeds the old `messages`
+    array is read alongside, and that array's tail goes before the buckets."""
+    name = "mongo"
+
+    def __init__(self, collection, bucket_size: int = BUCKET_SIZE, sessions=None):
+        self.col = collection
+        self.bucket_size = bucket_size
+        self.sessions = sessions
+
+    async def _embedded(self, session_id: str, need: int) -> Tuple[List[Dict], Optional[int]]:
+        """(tail of an unmigrated header's array, its first_seq), or ([], None) once migrated."""
+        if self.sessions is None:
+            return [], None
+        doc = await self.sessions.find_one({"session_id": session_id},
+                                           {"_id": 0, "messages": {"$slice": -need}, "first_seq": 1})
+        if not doc or "messages" not in doc:
+            return [], None
+        return doc["messages"] or [], doc.get("first_seq", 0)
+
+    async def load(self, session_id: str, max_turns: int) -> List[Tuple[str, str]]:
+        # +2: the current question is usually already appended, and a tail may start on an answer
+        need = 2 * max_turns + 2
+        flt, n_buckets = tail_query(session_id, need, self.bucket_size)
+        cursor = self.col.find(flt, {"_id": 0, "messages": 1}).sort("bucket", -1).limit(n_buckets)
+        buckets, (legacy, first) = await asyncio.gather(cursor.to_list(n_buckets),
+                                                        self._embedded(session_id, need))
+        messages = sorted((m for b in buckets for m in b.get("messages", [])), key=lambda m: m.get("seq", 0))
+        if first is not None:
+            # skip copies an interrupted migration left below first_seq
+            messages = legacy + [m for m in messages if m.get("seq", 0) >= first]
+        return turns_from_messages(messages[-need:])[-max_turns:]
+
+    async def save_turn(self, session_id: str, question: str, answer: str):
+        pass
+
+    async def clear(self, session_id: str):
+        pass
+
+
+class RedisHistory:
+    """Capped list of JSON [question, answer] per session at `<prefix><session_id>`, expiring with the session."""
+    name = "redis"
+
+    def __init__(self, url: str, max_turns: int, ttl_s: int, prefix: str = "chat:hist:"):
+        import redis.asyncio as aioredis   # optional dependency: pip install redis
+        self.r = aioredis.from_url(url, decode_responses=True)
+        self.max_turns = max_turns
+        self.ttl_s = int(ttl_s)
+        self.prefix = prefix
+
+    async def load(self, session_id: str, max_turns: int) -> List[Tuple[str, str]]:
+        rows = await self.r.lrange(self.prefix + session_id, -max_turns, -1)
+        return [tuple(json.loads(row)) for row in rows]
+
+    async def save_turn(self, session_id: str, question: str, answer: str):
+        key = self.prefix + session_id
+        async with self.r.pipeline(transaction=True) as pipe:
+            pipe.rpush(key, json.dumps([question, answer], ensure_ascii=False))
+            pipe.ltrim(key, -self.max_turns, -1)
+            pipe.expire(key, self.ttl_s)
+            await pipe.execute()
+
+    async def clear(self, session_id: str):
+        await self.r.delete(self.prefix + session_id)
+
+
+class SessionHistory:
+    """SessionStore as a read-through / write-through cache over an optional shared backend."""
+
+    def __init__(self, store: SessionStore, backend=None, refresh_s: float = 30.0):
+        self.store = store
+        self.backend = backend
+        self.refresh_s = refresh_s
+        self._counters = {"rehydrated": 0, "backend_empty": 0, "backend_errors": 0}
+
+    async def get(self, session_id: str) -> List[HistoryMessage]:
+        if self.backend is not None:
+            idle = self.store.idle_for(session_id)
+            if idle is None or (self.refresh_s and idle > self.refresh_s):
+                try:
+                    turns = await self.backend.load(session_id, self.store.max_turns)
+                except Exception as e:
+                    self._counters["backend_errors"] += 1
+                    print("History backend load failed:", e)
+                else:
+                    if turns:
+                        self.store.replace(session_id, turns)
+                        self._counters["rehydrated"] += 1
+                    else:
+                        # cleared (or expired) elsewhere: a stale local copy must not outlive it
+                        self.store.clear(session_id)
+                        self._counters["backend_empty"] += 1
+        return self.store.history(session_id)
+
+    async def add_turn(self, session_id: str, question: str, answer: str):
+        self.store.add_turn(session_id, question, answer)
+        if self.backend is not None:
+            try:
+                await self.backend.save_turn(session_id, question, answer)
+            except Exception as e:
+                self._counters["backend_errors"] += 1
+                print("History backend save failed:", e)
+
+    async def clear(self, session_id: str):
+        self.store.clear(session_id)
+        if self.backend is not None:
+            try:
+                await self.backend.clear(session_id)
+            except Exception as e:
+                print("History backend clear failed:", e)
+
+    def stats(self) -> Dict:
+        return {**self.store.stats(), **self._counters,
+                "backend": getattr(self.backend, "name", None), "refresh_s": self.refresh_s}
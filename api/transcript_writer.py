@@ -0,0 +1,286 @@
+# api/transcript_writer.py
+"""
+Write-behind logging of chat transcripts to Mongo.
+
+Handlers enqueue events (session touch, message, clear) and return; one
+background task drains the queue and writes each batch in three sequential
+steps (header bulk_write, concurrent header updates, bucket bulk_write),
+whatever its size. A batch is flushed when `batch_size` events are
+waiting or the oldest has waited `flush_interval_s`.
+
+Messages go to the bucketed layout in api/chat_buckets.py. Within a batch
+a session's events are merged into one header update: $set for activity,
+expiry and user details, and $addToSet for page urls. Sessions that have
+new messages run that update as a find_one_and_update with $inc on
+message_count, which reserves their sequence numbers; these calls go out
+concurrently. The messages are then appended to their buckets with one
+bulk_write. A touch-only session is an ordinary upsert in the header
+bulk_write. A clear drops the session's pending update and deletes its
+header and buckets. Events for the same session after a clear go into a
+second write, so a delete and an upsert never race in one unordered write.
+A clear flushes its batch at once and clear() waits (up to
+`clear_timeout_s`) until it is written, so once /clear returns no worker
+can reload the old transcript; messages queued before it in the same
+batch are dropped with the rest.
+
+The queue is bounded: when it is full a handler waits up to `put_timeout_s`
+for room and then drops the event (counted) rather than stalling chat on a
+Mongo outage. A write that fails as a whole (network, failover) is retried
+with backoff, then dropped; per-document write errors are counted, not
+retried, so messages that did land are not pushed twice.
+close() flushes everything queued before shutdown.
+"""
+import asyncio, time
+from collections import deque
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional
+
+from pymongo import DeleteMany, DeleteOne, ReturnDocument, UpdateOne
+from pymongo.errors import BulkWriteError
+
+from api.chat_buckets import BUCKET_SIZE, bucket_updates
+
+_STOP = object()
+
+
+class TranscriptWriter:
+    def __init__(self, collection, messages_collection, ttl_days: int = 7, bucket_size: int = BUCKET_SIZE,
+                 max_queue: int = 10000, batch_size: int = 200, flush_interval_s: float = 0.5,
+                 put_timeout_s: float = 1.0, max_retries: int = 3, clear_timeout_s: float = 5.0):
+        self.col = collection
+        self.msg_col = messages_collection
+        self.bucket_size = max(1, bucket_size)
+        self.ttl = timedelta(days=ttl_days)
+        self.batch_size = max(1, batch_size)
+        self.flush_interval_s = flush_interval_s
+        self.put_timeout_s = put_timeout_s
+        self.max_retries = max_retries
+        self.clear_timeout_s = clear_timeout_s
+        self.max_queue = max(1, max_queue)
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+        self._flush_ms: deque = deque(maxlen=512)
+        self._counters = {"enqueued": 0, "written": 0, "batches": 0, "ops": 0, "retries": 0,
+                          "dropped_full": 0, "dropped_failed": 0, "waited_full": 0, "write_errors": 0}
+        self._last_error = None
+
+    # ---------- producer side ----------
+    def _start(self):
+        if self._task is None:
+            self._queue = asyncio.Queue(maxsize=self.max_queue)
+            self._task = asyncio.create_task(self._run())
+
+    async def _put(self, event: tuple) -> bool:
+        if self.col is None or self.msg_col is None or not event[1]:
+            return False
+        self._start()
+        try:
+            self._queue.put_nowait(event)
+        except asyncio.QueueFull:
+            self._counters["waited_full"] += 1
+            try:
+                await asyncio.wait_for(self._queue.put(event), self.put_timeout_s)
+            except asyncio.TimeoutError:
+                self._counters["dropped_full"] += 1
+                return False
+        self._counters["enqueued"] += 1
+        return True
+
+    async def touch(self, session_id: str, page_url: Optional[str] = None, user_details: Optional[Dict] = None):
+        """Create the session document if needed and mark it active."""
+        await self._put(("touch", session_id, datetime.now(timezone.utc), page_url, user_details))
+
+    async def append(self, session_id: str, role: str, html_text: str, user_details: Optional[Dict] = None):
+        message = {
+            "role": "assistant" if role == "assistant" else "user",
+            "html": (html_text or "").strip(),
+            "ts": datetime.now(timezone.utc),
+        }
+        # Add user details to user messages
+        if role == "user" and user_details:
+            message["user_details"] = user_details
+        await self._put(("message", session_id, message["ts"], message, None))
+
+    async def clear(self, session_id: str) -> bool:
+        """Delete the session's transcript; returns once that is written (False if it failed or timed out)."""
+        if self.col is None or self.msg_col is None:
+            return True
+        done = asyncio.get_running_loop().create_future()
+        if not await self._put(("clear", session_id, datetime.now(timezone.utc), done, None)):
+            return False
+        try:
+            return await asyncio.wait_for(asyncio.shield(done), self.clear_timeout_s)
+        except asyncio.TimeoutError:
+            print(f"Transcript clear for {session_id} not written after {self.clear_timeout_s}s")
+            return False
+
+    # ---------- consumer side ----------
+    async def _next_batch(self) -> tuple:
+        """(events, stop): waits for one event, then collects until batch_size or the flush interval."""
+        loop = asyncio.get_running_loop()
+        first = await self._queue.get()
+        if first is _STOP:
+            return [], True
+        batch = [first]
+        deadline = loop.time() + self.flush_interval_s
+        # a clear has a caller waiting on it: flush without waiting for more
+        while len(batch) < self.batch_size and batch[-1][0] != "clear":
+            try:
+                item = self._queue.get_nowait()
+            except asyncio.QueueEmpty:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    item = await asyncio.wait_for(self._queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+            if item is _STOP:
+                return batch, True
+            batch.append(item)
+        return batch, False
+
+    def _ops(self, events: List[tuple]) -> tuple:
+        """Coalesce events per session; returns (cleared ids -> their waiters, updates by session,
+        events used, events left over)."""
+        updates: Dict[str, dict] = {}
+        deleted: Dict[str, list] = {}
+        for n, (kind, sid, ts, data, user_details) in enumerate(events):
+            if kind == "clear":
+                updates.pop(sid, None)
+                deleted.setdefault(sid, []).append(data)
+                continue
+            if sid in deleted:
+                return deleted, updates, n, events[n:]
+            u = updates.setdefault(sid, {"messages": [], "page_urls": [], "user_details": None,
+                                         "first": ts, "last": ts, "events": 0})
+            u["last"] = ts
+            u["events"] += 1
+            if kind == "message":
+                u["messages"].append(data)
+            elif data and data not in u["page_urls"]:
+                u["page_urls"].append(data)
+            if user_details:
+                u["user_details"] = user_details
+        return deleted, updates, len(events), []
+
+    def _header_update(self, sid: str, u: dict) -> dict:
+        update = {
+            "$setOnInsert": {"session_id": sid, "started_at": u["first"], "first_seq": 0},
+            "$set": {"last_active": u["last"], "expireAt": u["last"] + self.ttl},
+        }
+        if u["messages"]:
+            # reserves seqs message_count-n .. message_count-1 for this batch's messages
+            update["$inc"] = {"message_count": len(u["messages"])}
+        else:
+            update["$setOnInsert"]["message_count"] = 0
+        if u["page_urls"]:
+            update["$addToSet"] = {"page_urls": {"$each": u["page_urls"]}}
+        if u["user_details"]:
+            # Store user details (e.g., user_id, email, etc. from token)
+            update["$set"]["user_details"] = u["user_details"]
+        return update
+
+    async def _call(self, fn, *args, **kwargs) -> tuple:
+        """(ok, result) of a Mongo call, retried with backoff on whole-call failures."""
+        for attempt in range(self.max_retries + 1):
+            try:
+                return True, await fn(*args, **kwargs)
+            except BulkWriteError as e:
+                errors = e.details.get("writeErrors") or []
+                self._counters["write_errors"] += len(errors)
+                self._last_error = str(errors[0].get("errmsg") if errors else e)[:300]
+                print("Transcript write errors:", self._last_error)
+                return True, None
+            except Exception as e:
+                self._last_error = f"{type(e).__name__}: {e}"[:300]
+                if attempt == self.max_retries:
+                    print("Transcript write failed, dropping:", e)
+                    return False, None
+                self._counters["retries"] += 1
+                await asyncio.sleep(min(5.0, 0.2 * 2 ** attempt))
+
+    async def _write(self, deleted: Dict[str, list], updates: Dict[str, dict], n_events: int):
+        t0 = time.perf_counter()
+        header_ops = [DeleteOne({"session_id": sid}) for sid in deleted]
+        bucket_ops = [DeleteMany({"session_id": sid}) for sid in deleted]
+        appends = []
+        for sid, u in updates.items():
+            if u["messages"]:
+                appends.append((sid, u))
+            else:
+                header_ops.append(UpdateOne({"session_id": sid}, self._header_update(sid, u), upsert=True))
+        failed = 0
+        cleared = True
+
+        if header_ops:
+            ok, _ = await self._call(self.col.bulk_write, header_ops, ordered=False)
+            if not ok:
+                cleared = False
+                failed += len(deleted) + sum(u["events"] for u in updates.values() if not u["messages"])
+        # Sessions with messages: one header round trip each (run together) to reserve sequence numbers
+        results = await asyncio.gather(*(
+            self._call(self.col.find_one_and_update, {"session_id": sid}, self._header_update(sid, u),
+                       projection={"_id": 0, "message_count": 1}, upsert=True,
+                       return_document=ReturnDocument.AFTER)
+            for sid, u in appends
+        ))
+        pending = 0
+        for (sid, u), (ok, doc) in zip(appends, results):
+            if not ok or not doc:
+                failed += u["events"]
+                continue
+            first = doc["message_count"] - len(u["messages"])
+            bucket_ops += bucket_updates(sid, first, u["messages"], u["last"] + self.ttl, self.bucket_size)
+            pending += u["events"]
+        if bucket_ops:
+            ok, _ = await self._call(self.msg_col.bulk_write, bucket_ops, ordered=False)
+            if not ok:
+                cleared = False
+                failed += pending
+        for waiters in deleted.values():
+            for done in waiters:
+                if not done.done():
+                    done.set_result(cleared)
+
+        self._flush_ms.append((time.perf_counter() - t0) * 1000)
+        self._counters["written"] += n_events - failed
+        self._counters["dropped_failed"] += failed
+        self._counters["batches"] += 1
+        self._counters["ops"] += len(header_ops) + len(appends) + len(bucket_ops)
+
+    async def _run(self):
+        stop = False
+        while not stop:
+            events, stop = await self._next_batch()
+            while events:
+                # a session cleared mid-batch splits it: the rest goes in a second write
+                deleted, updates, used, events = self._ops(events)
+                await self._write(deleted, updates, used)
+
+    async def close(self, timeout_s: float = 10.0):
+        """Flush everything queued, then stop the writer (shutdown)."""
+        if self._task is None:
+            return
+        await self._queue.put(_STOP)
+        try:
+            await asyncio.wait_for(self._task, timeout_s)
+        except asyncio.TimeoutError:
+            self._task.cancel()
+            print(f"Transcript writer: {self._queue.qsize()} events not flushed at shutdown")
+        self._task = None
+
+    def stats(self) -> Dict:
+        lat = sorted(self._flush_ms)
+        c = self._counters
+        return {
+            **c,
+            "queue_depth": self._queue.qsize() if self._queue else 0,
+            "max_queue": self.max_queue,
+            "avg_batch_events": round(c["written"] / c["batches"], 1) if c["batches"] else 0.0,
+            "flush_ms_p50": round(lat[len(lat) // 2], 1) if lat else 0.0,
+            "flush_ms_p95": round(lat[min(len(lat) - 1, int(0.95 * len(lat)))], 1) if lat else 0.0,
+            "flush_ms_max": round(lat[-1], 1) if lat else 0.0,
+            "running": self._task is not None and not self._task.done(),
+            "last_error": self._last_error,
+        }
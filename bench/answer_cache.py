@@ -0,0 +1,68 @@
+# bench/answer_cache.py
+"""
+Replay benchmark for the semantic answer cache.
+
+Sends first-turn questions (each on a fresh session) to /chat_stream with a
+skewed distribution, the way widget traffic repeats a few openers, and
+reports the cache hit rate plus p50/p95 time to full response.
+
+Run from the repo root:
+    python -m bench.answer_cache [--requests 300] [--threshold 0.95]
+"""
+import argparse, asyncio, os, random, time, uuid
+
+from bench.stubs import start_stubs
+
+QUESTIONS = [
+    "What is Enatega?", "what is enatega", "What is Enatega ?", "pricing", "Pricing?",
+    "How much does Enatega cost?", "Do you offer lifetime updates?", "What apps are included?",
+    "Share some case studies.", "Does Enatega support non-food delivery?",
+    "Who can deploy for me if I don't have a dev team?", "How fast can I launch?",
+    "What tech stack do you use?", "Is the source code included?", "Which payment gateways are supported?",
+]
+
+
+def pct(values, q):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+async def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--requests", type=int, default=300)
+    ap.add_argument("--concurrency", type=int, default=10)
+    ap.add_argument("--threshold", type=float, default=None)
+    ap.add_argument("--seed", type=int, default=7)
+    args = ap.parse_args()
+
+    if args.threshold is not None:
+        os.environ["ANSWER_CACHE_THRESHOLD"] = str(args.threshold)
+    start_stubs()
+    import httpx
+    from api.main import app
+
+    rng = random.Random(args.seed)
+    # Zipf-like: the first few openers dominate
+    weights = [1 / (i + 1) for i in range(len(QUESTIONS))]
+    plan = rng.choices(QUESTIONS, weights=weights, k=args.requests)
+    latencies = []
+    sem = asyncio.Semaphore(args.concurrency)
+
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench", timeout=120) as client:
+        async def one(q):
+            async with sem:
+                t = time.perf_counter()
+                r = await client.post("/chat_stream", json={"session_id": uuid.uuid4().hex, "message": q})
+                r.raise_for_status()
+                latencies.append((time.perf_counter() - t) * 1000)
+
+        await asyncio.gather(*(one(q) for q in plan))
+        stats = (await client.get("/healthz")).json()["answer_cache"]
+
+    print(f"requests: {len(latencies)}  threshold: {stats['threshold']}")
+    print(f"answer cache: hit rate {stats['hit_rate']:.1%} ({stats['hits']} hits, {stats['stores']} stores)")
+    print(f"latency: p50 {pct(latencies, 0.5):.0f} ms, p95 {pct(latencies, 0.95):.0f} ms")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
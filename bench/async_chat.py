@@ -0,0 +1,60 @@
+# bench/async_chat.py
+"""
+Load benchmark for /chat against stubbed OpenAI/Qdrant servers.
+
+Fires batches of concurrent /chat requests through the ASGI app and reports
+throughput and latency per concurrency level. With the async pipeline the
+throughput keeps scaling past the 40-thread Starlette pool.
+
+Run from the repo root:
+    python -m bench.async_chat --concurrency 1 10 40 100 200
+"""
+import argparse, asyncio, statistics, time, uuid
+
+from bench.stubs import start_stubs
+
+
+def pct(values, q):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+async def run_level(client, concurrency: int, rounds: int, message: str):
+    latencies = []
+
+    async def one():
+        t = time.perf_counter()
+        r = await client.post("/chat", json={"session_id": uuid.uuid4().hex, "message": message})
+        r.raise_for_status()
+        latencies.append((time.perf_counter() - t) * 1000)
+
+    t0 = time.perf_counter()
+    for _ in range(rounds):
+        await asyncio.gather(*(one() for _ in range(concurrency)))
+    wall = time.perf_counter() - t0
+    return len(latencies) / wall, statistics.median(latencies), pct(latencies, 0.95)
+
+
+async def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--concurrency", type=int, nargs="+", default=[1, 10, 40, 100, 200])
+    ap.add_argument("--rounds", type=int, default=3)
+    ap.add_argument("--chat-ms", type=int, default=400, help="stub LLM latency")
+    ap.add_argument("--message", default="What is Enatega?")
+    args = ap.parse_args()
+
+    calls = start_stubs(chat_ms=args.chat_ms)
+    import httpx
+    from api.main import app
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=120) as client:
+        print(f"{'conc':>6} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8}")
+        for c in args.concurrency:
+            rps, p50, p95 = await run_level(client, c, args.rounds, args.message)
+            print(f"{c:>6} {rps:>8.1f} {p50:>8.0f} {p95:>8.0f}")
+    print("upstream calls:", calls)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
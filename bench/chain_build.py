@@ -0,0 +1,74 @@
+# bench/chain_build.py
+"""
+Micro-benchmark of per-request chain construction in /chat.
+
+Compares building ConversationalRetrievalChain.from_llm per request (the
+original /chat, with its session's ConversationBufferMemory), building a stuff-documents chain per request, and reusing
+the prebuilt api.main.ANSWER_CHAIN. Reports time and tracemalloc allocations
+per request.
+
+Run from the repo root:
+    python -m bench.chain_build [--n 300]
+"""
+import argparse, time, tracemalloc
+
+from bench.stubs import start_stubs
+
+
+def measure(label: str, build, n: int):
+    build()  # warm imports/caches
+    t = time.perf_counter()
+    for _ in range(n):
+        build()
+    per_call_us = (time.perf_counter() - t) / n * 1e6
+
+    tracemalloc.start()
+    snap0 = tracemalloc.take_snapshot()
+    keep = [build() for _ in range(n)]
+    snap1 = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    stats = snap1.compare_to(snap0, "filename")
+    size = sum(s.size_diff for s in stats) / n
+    blocks = sum(s.count_diff for s in stats) / n
+    del keep
+    print(f"{label:<38} {per_call_us:>10.1f} us {size / 1024:>10.1f} KiB {blocks:>9.0f} blocks")
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--n", type=int, default=300)
+    args = ap.parse_args()
+
+    start_stubs()
+    from langchain.chains import ConversationalRetrievalChain
+    from langchain.chains.combine_documents import create_stuff_documents_chain
+    from langchain.memory import ConversationBufferMemory
+    from api import main as m
+
+    # the per-session memory the original /chat kept in SESSION_MEM (api.main no longer has one)
+    memory = ConversationBufferMemory(memory_key="chat_history", return_messages=True,
+                                      input_key="question", output_key="answer")
+
+    def legacy():
+        return ConversationalRetrievalChain.from_llm(
+            llm=m.llm,
+            retriever=m.make_retriever(),
+            memory=memory,
+            return_source_documents=True,
+            combine_docs_chain_kwargs={"prompt": m.RAG_PROMPT},
+        )
+
+    def per_request_stuff():
+        return create_stuff_documents_chain(m.llm, m.RAG_PROMPT)
+
+    def prebuilt():
+        return m.ANSWER_CHAIN
+
+    print(f"{'per request':<38} {'time':>13} {'retained':>14} {'':>16}")
+    measure("ConversationalRetrievalChain.from_llm", legacy, args.n)
+    measure("create_stuff_documents_chain", per_request_stuff, args.n)
+    measure("prebuilt ANSWER_CHAIN", prebuilt, args.n)
+
+
+if __name__ == "__main__":
+    main()
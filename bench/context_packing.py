@@ -0,0 +1,100 @@
+# bench/context_packing.py
+"""
+Context size per question: the old `docs[:4]` concatenation vs ContextPacker
+at a few token budgets, over the real chunks in data/clean/chunks_all.jsonl.
+
+Retrieval uses the stub's hashed bag-of-tokens embeddings (bench/stubs.py),
+which is lexical but picks neighbouring chunks of the same page often enough
+to show the overlap trimming. Token counts use the chat model's encoding.
+
+Before measuring, merge_adjacent is checked on small hand-made cases
+(overlap, contained chunk, gap, repeated chunk); the run exits 1 if any
+page text would reach the prompt twice.
+
+Run from the repo root:
+    python -m bench.context_packing [--k 6] [--budgets 1200 2000 3000]
+"""
+import argparse, json, pathlib, statistics, time
+
+import numpy as np
+from langchain_core.documents import Document
+
+from api.context_packer import ContextPacker, merge_adjacent
+from bench.answer_cache import QUESTIONS
+from bench.stubs import dense, sparse_embedding
+
+CHUNKS = pathlib.Path("data/clean/chunks_all.jsonl")
+
+MORE_QUESTIONS = [
+    "How do I set up the backend API locally?", "How do I deploy the admin dashboard?",
+    "What does the rider app do?", "How is Enatega different from Yelo?", "Tell me about grocery delivery",
+    "What is Lumi?", "How do I configure Google Maps API keys?", "What did Yalla Delivery build with Enatega?",
+]
+
+
+PAGE = "".join(f"sentence {i:03d} of the page. " for i in range(20))
+
+
+def _chunk(start: int, end: int) -> Document:
+    return Document(page_content=PAGE[start:end], metadata={"slug": "page", "start_index": start})
+
+
+MERGE_CASES = [
+    # (chunks in rank order, expected page texts after merging)
+    ([_chunk(0, 100), _chunk(60, 160)], [PAGE[0:160]]),
+    ([_chunk(0, 100), _chunk(10, 50)], [PAGE[0:100]]),
+    ([_chunk(10, 50), _chunk(0, 100), _chunk(80, 200)], [PAGE[0:200]]),
+    ([_chunk(0, 100), _chunk(150, 250)], [PAGE[0:100], PAGE[150:250]]),
+    ([_chunk(0, 100), _chunk(0, 100)], [PAGE[0:100]]),
+]
+
+
+def check_merge_cases() -> int:
+    failed = 0
+    for chunks, want in MERGE_CASES:
+        got = [d.page_content for d in merge_adjacent(chunks)]
+        if got != want:
+            failed += 1
+            spans = [(d.metadata["start_index"], d.metadata["start_index"] + len(d.page_content)) for d in chunks]
+            print(f"  merge_adjacent{spans}: {len(got)} docs, expected {len(want)}")
+    return failed
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--k", type=int, default=6)
+    ap.add_argument("--budgets", type=int, nargs="+", default=[1200, 2000, 3000])
+    args = ap.parse_args()
+
+    if check_merge_cases():
+        raise SystemExit("merge_adjacent would send page text twice")
+
+    rows = [json.loads(l) for l in CHUNKS.read_text(encoding="utf-8").splitlines() if l.strip()]
+    docs = [Document(page_content=r["text"], metadata={k: v for k, v in r.items() if k != "text"}) for r in rows]
+    matrix = np.asarray([dense(sparse_embedding(d.page_content)) for d in docs], dtype=np.float32)
+    questions = list(dict.fromkeys(QUESTIONS + MORE_QUESTIONS))
+
+    retrieved = []
+    for q in questions:
+        scores = matrix @ np.asarray(dense(sparse_embedding(q)), dtype=np.float32)
+        retrieved.append([docs[i] for i in np.argsort(-scores)[:args.k]])
+
+    packers = {b: ContextPacker(budget_tokens=b) for b in args.budgets}
+    count = next(iter(packers.values())).count
+    old = [count("\n\n".join(d.page_content.strip() for d in hits[:4])) for hits in retrieved]
+
+    print(f"{len(questions)} questions, top-{args.k} from {len(docs)} chunks")
+    print(f"{'method':<22} {'mean tok':>9} {'max tok':>8} {'chunks':>7} {'overlap trimmed':>16} {'pack ms':>8}")
+    print(f"{'docs[:4] (old)':<22} {statistics.mean(old):>9.0f} {max(old):>8} {4:>7} {'-':>16} {'-':>8}")
+    for budget, packer in packers.items():
+        t = time.perf_counter()
+        packed = [packer.pack(hits) for hits in retrieved]
+        ms = (time.perf_counter() - t) * 1000 / len(retrieved)
+        toks = [p.stats["context_tokens"] for p in packed]
+        print(f"{'packer ' + str(budget):<22} {statistics.mean(toks):>9.0f} {max(toks):>8} "
+              f"{statistics.mean(p.stats['chunks_used'] for p in packed):>7.1f} "
+              f"{sum(p.stats['overlap_tokens_trimmed'] for p in packed):>16} {ms:>8.2f}")
+
+
+if __name__ == "__main__":
+    main()
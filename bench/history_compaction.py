@@ -0,0 +1,90 @@
+# bench/history_compaction.py
+"""
+History tokens in the answer prompt per turn of a long conversation: the old
+formatting (every kept turn with its full HTML answer) vs HistoryCompactor in
+"full" and "summary" mode.
+
+Answers are built from real chunks in data/clean/chunks_all.jsonl wrapped in
+the HTML the model writes. The summarizer is a stand-in that returns
+`--summary-tokens` worth of text, so this measures prompt size, not summary
+quality. Token counts use the chat model's encoding.
+
+Run from the repo root:
+    python -m bench.history_compaction [--turns 12] [--budget 1200] [--keep 3]
+"""
+import argparse, asyncio, json, pathlib, random
+
+from langchain_core.runnables import RunnableLambda
+
+from api.context_packer import ContextPacker
+from api.history_compactor import HistoryCompactor
+from api.session_store import SessionStore
+
+CHUNKS = pathlib.Path("data/clean/chunks_all.jsonl")
+MAX_TURNS = 8
+
+
+def answer_html(text: str) -> str:
+    sentences = [s.strip() for s in text.split(". ") if s.strip()]
+    items = "".join(f"<li>{s}</li>" for s in sentences[3:9])
+    return f"<h2>Here is what I found</h2><p>{'. '.join(sentences[:3])}.</p><ul>{items}</ul><p>Anything else?</p>"
+
+
+def old_format(hist) -> str:
+    return "\n".join(("User: " if m.type == "human" else "Assistant: ") + m.content for m in hist)
+
+
+class _FakeSummarizer:
+    """bind() -> runnable returning a summary of about `words` words."""
+    def __init__(self, words: int):
+        self.words = words
+
+    def bind(self, **kwargs):
+        return RunnableLambda(lambda _: " ".join(["visitor-detail"] * self.words))
+
+
+async def run(args):
+    rows = [json.loads(l) for l in CHUNKS.read_text(encoding="utf-8").splitlines() if l.strip()]
+    rng = random.Random(3)
+    packer = ContextPacker(model="gpt-4o-mini")
+    modes = {}
+    for mode in ("full", "summary"):
+        store = SessionStore(max_turns=MAX_TURNS)
+        modes[mode] = (store, HistoryCompactor(store, _FakeSummarizer(args.summary_tokens * 3 // 4),
+                                               count=packer.count, mode=mode, keep_turns=args.keep,
+                                               budget_tokens=args.budget, summary_tokens=args.summary_tokens))
+    old_store = SessionStore(max_turns=MAX_TURNS)
+
+    print(f"{'turn':>4} {'old (HTML, 8 turns)':>20} {'full':>6} {'summary':>8}")
+    for turn in range(1, args.turns + 1):
+        old = packer.count(old_format(old_store.history("s")))
+        row = [old]
+        for store, compactor in modes.values():
+            row.append(packer.count(compactor.render(store.history("s"))))
+        print(f"{turn:>4} {row[0]:>20} {row[1]:>6} {row[2]:>8}")
+
+        question = f"Follow-up question {turn} about {rng.choice(rows)['title']}?"
+        answer = answer_html(rng.choice(rows)["text"])
+        old_store.add_turn("s", question, answer)
+        for store, compactor in modes.values():
+            store.add_turn("s", question, answer)
+            compactor.schedule("s")
+            await compactor.drain()
+
+    for mode, (_, compactor) in modes.items():
+        st = compactor.stats()
+        print(f"{mode}: avg {st['avg_history_tokens']} history tokens/turn, {st['folds']} folds, "
+              f"{st['turns_dropped']} turns dropped, {st['turns_cut']} cut")
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--turns", type=int, default=12)
+    ap.add_argument("--budget", type=int, default=1200)
+    ap.add_argument("--keep", type=int, default=3)
+    ap.add_argument("--summary-tokens", type=int, default=300)
+    asyncio.run(run(ap.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+# bench/intent_prefilter.py
+"""
+Offline accuracy/latency harness for the zero-LLM demo-intent pre-filter.
+
+Replays labelled messages ({"message", "demo"} per line) through
+api.main.might_want_demo and reports how many demo requests would be lost
+(must be zero; each is listed and the run exits 1) and how many router LLM
+calls are skipped. Two sets by default: bench/intent_messages.jsonl, which
+the word lists were written against, and bench/intent_heldout.jsonl,
+paraphrases written without looking at them. Only recall on the held-out
+set says anything about messages nobody wrote down.
+
+Run from the repo root:
+    python -m bench.intent_prefilter [--labels a.jsonl b.jsonl]
+"""
+import argparse, json, pathlib, statistics, time
+
+from bench.stubs import start_stubs
+
+LABELS = [str(pathlib.Path(__file__).with_name(n)) for n in ("intent_messages.jsonl", "intent_heldout.jsonl")]
+
+
+def replay(might_want_demo, path: str, repeat: int) -> int:
+    """Print the report for one labelled file; returns how many demo requests it missed."""
+    rows = [json.loads(l) for l in pathlib.Path(path).read_text(encoding="utf-8").splitlines() if l.strip()]
+    missed, passed_other, timings = [], [], []
+    for row in rows:
+        t = time.perf_counter()
+        for _ in range(repeat):
+            hit = might_want_demo(row["message"])
+        timings.append((time.perf_counter() - t) / repeat * 1e6)
+        if row["demo"] and not hit:
+            missed.append(row["message"])
+        if not row["demo"] and hit:
+            passed_other.append(row["message"])
+
+    n_demo = sum(1 for r in rows if r["demo"])
+    n_other = len(rows) - n_demo
+    correct = len(rows) - len(missed) - len(passed_other)
+    print(f"{pathlib.Path(path).name}: {len(rows)} messages ({n_demo} demo, {n_other} other)")
+    print(f"accuracy: {correct / len(rows):.1%}")
+    print(f"demo recall: {(n_demo - len(missed)) / max(1, n_demo):.1%}  (missed {len(missed)})")
+    print(f"router calls skipped on non-demo: {(n_other - len(passed_other)) / max(1, n_other):.1%}")
+    print(f"latency: mean {statistics.mean(timings):.1f} us, max {max(timings):.1f} us")
+    for m in missed:
+        print("  MISSED:", m)
+    for m in passed_other:
+        print("  sent to router:", m)
+    return len(missed)
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--labels", nargs="+", default=LABELS)
+    ap.add_argument("--repeat", type=int, default=200, help="timing repetitions per message")
+    args = ap.parse_args()
+
+    start_stubs()
+    from api.main import might_want_demo
+
+    missed = 0
+    for path in args.labels:
+        missed += replay(might_want_demo, path, args.repeat)
+        print()
+    if missed:
+        raise SystemExit(f"{missed} demo request(s) would skip the router")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+# bench/local_index.py
+"""
+Compare top-k search through Qdrant with the in-process LocalVectorIndex.
+
+Loads the chunk payloads from data/clean/chunks_all.jsonl with random unit
+vectors (real ones are not needed for timing). By default they go into an
+in-memory Qdrant (`:memory:`), which has no network; pass --qdrant-url to
+measure a real server including the round trip.
+
+Run from the repo root:
+    python -m bench.local_index [--queries 500] [--scale 1] [--qdrant-url http://localhost:6333]
+"""
+import argparse, json, pathlib, statistics, time, uuid
+
+import numpy as np
+from qdrant_client import QdrantClient
+from qdrant_client.http import models as qm
+
+from api.local_index import LocalVectorIndex
+
+CHUNKS = pathlib.Path("data/clean/chunks_all.jsonl")
+DIM = 1536
+
+
+def timed(fn, queries):
+    out = []
+    for q in queries:
+        t = time.perf_counter()
+        fn(q)
+        out.append((time.perf_counter() - t) * 1e6)
+    out.sort()
+    return statistics.mean(out), out[int(0.95 * (len(out) - 1))]
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--queries", type=int, default=500)
+    ap.add_argument("--scale", type=int, default=1, help="replicate the corpus N times")
+    ap.add_argument("--k", type=int, default=6)
+    ap.add_argument("--qdrant-url", default=None)
+    args = ap.parse_args()
+
+    rows = [json.loads(l) for l in CHUNKS.read_text(encoding="utf-8").splitlines() if l.strip()] * args.scale
+    rng = np.random.default_rng(0)
+    vectors = rng.standard_normal((len(rows), DIM)).astype(np.float32)
+    queries = rng.standard_normal((args.queries, DIM)).astype(np.float32)
+
+    client = QdrantClient(url=args.qdrant_url) if args.qdrant_url else QdrantClient(location=":memory:")
+    collection = f"bench_{uuid.uuid4().hex[:8]}"
+    client.create_collection(collection, vectors_config=qm.VectorParams(size=DIM, distance=qm.Distance.COSINE))
+    ids = [str(uuid.uuid4()) for _ in rows]
+    payloads = [{"page_content": r.get("text", ""), "metadata": {k: v for k, v in r.items() if k != "text"}} for r in rows]
+    client.upsert(collection, points=[
+        qm.PointStruct(id=i, vector=v.tolist(), payload=p) for i, v, p in zip(ids, vectors, payloads)
+    ])
+
+    t = time.perf_counter()
+    index = LocalVectorIndex.from_qdrant(client, collection)
+    load_ms = (time.perf_counter() - t) * 1000
+
+    filt = qm.Filter(must=[
+        qm.FieldCondition(key="metadata.domain", match=qm.MatchValue(value="enatega.com")),
+        qm.FieldCondition(key="metadata.is_active", match=qm.MatchValue(value=True)),
+    ])
+    qlist = [q.tolist() for q in queries]
+
+    cases = {
+        "qdrant": lambda q: client.query_points(collection, query=q, limit=args.k, with_payload=True),
+        "qdrant + filter": lambda q: client.query_points(collection, query=q, limit=args.k, with_payload=True, query_filter=filt),
+        "local": lambda q: index.search(q, k=args.k),
+        "local + filter": lambda q: index.search(q, k=args.k, flt=filt),
+    }
+
+    # Same top-k from both paths
+    a = [str(p.id) for p in client.query_points(collection, query=qlist[0], limit=args.k).points]
+    b = [str(d.metadata["_id"]) for d, _ in index.search(qlist[0], k=args.k)]
+    print(f"chunks: {len(index)}  matrix: {index.matrix.nbytes / 1024:.0f} KiB  load: {load_ms:.0f} ms  "
+          f"top-{args.k} agree: {a == b}")
+    print(f"{'backend':<18} {'mean us':>10} {'p95 us':>10}")
+    for name, fn in cases.items():
+        mean, p95 = timed(fn, qlist)
+        print(f"{name:<18} {mean:>10.1f} {p95:>10.1f}")
+    client.delete_collection(collection)
+
+
+if __name__ == "__main__":
+    main()
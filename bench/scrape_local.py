@@ -0,0 +1,89 @@
+# bench/scrape_local.py
+"""
+Run web_scraping.scrape_all against fixture pages on a local http.server:
+no network needed beyond the Playwright Chromium install.
+
+Each fixture page references an image and a web font (blocked by the
+scraper) and appends a lazy section when scrolled to the bottom, so the
+output also shows that DOM-stable scrolling picks up late content.
+
+Run from the repo root:
+    python -m bench.scrape_local [--pages 12] [--concurrency 1 4]
+"""
+import argparse, asyncio, functools, pathlib, tempfile, threading, time
+from http.server import ThreadingHTTPServer, SimpleHTTPRequestHandler
+
+from web_scraping import scrape_all
+
+PAGE = """<!doctype html>
+<html><head><title>Fixture page {i}</title>
+<meta name="description" content="fixture {i}">
+<link rel="preload" href="/font.woff2" as="font" crossorigin>
+</head><body>
+<main><h1>Fixture page {i}</h1>
+<img src="/img.png" width="800" height="600">
+{paragraphs}
+<div style="height: 3000px"></div>
+<div id="lazy"></div>
+</main>
+<script>
+  let loaded = false;
+  window.addEventListener("scroll", () => {{
+    if (loaded || window.scrollY + window.innerHeight < document.body.scrollHeight - 10) return;
+    loaded = true;
+    setTimeout(() => {{
+      document.getElementById("lazy").innerHTML = "<p>LAZY-SECTION-{i} arrived after scrolling to the bottom.</p>";
+    }}, 150);
+  }});
+</script>
+</body></html>
+"""
+
+
+class _Quiet(SimpleHTTPRequestHandler):
+    def log_message(self, *args):
+        pass
+
+
+def write_fixtures(root: pathlib.Path, pages: int) -> None:
+    para = " ".join(f"word{j}" for j in range(120))
+    for i in range(pages):
+        d = root / f"page-{i}"
+        d.mkdir(parents=True)
+        (d / "index.html").write_text(PAGE.format(i=i, paragraphs=f"<p>{para}</p>" * 3), encoding="utf-8")
+    (root / "img.png").write_bytes(b"\x89PNG\r\n\x1a\n" + b"\0" * 200_000)
+    (root / "font.woff2").write_bytes(b"\0" * 100_000)
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--pages", type=int, default=12)
+    ap.add_argument("--concurrency", type=int, nargs="+", default=[1, 4])
+    args = ap.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        root = pathlib.Path(tmp) / "site"
+        write_fixtures(root, args.pages)
+        srv = ThreadingHTTPServer(("127.0.0.1", 0), functools.partial(_Quiet, directory=str(root)))
+        threading.Thread(target=srv.serve_forever, daemon=True).start()
+        urls = [f"http://127.0.0.1:{srv.server_address[1]}/page-{i}/" for i in range(args.pages)]
+
+        rows = []
+        for c in args.concurrency:
+            out = pathlib.Path(tmp) / f"out-{c}"
+            t = time.perf_counter()
+            results = asyncio.run(scrape_all(urls, c, out / "raw", out / "clean"))
+            wall = time.perf_counter() - t
+            lazy = sum("LAZY-SECTION" in (out / "clean" / f"{r['slug']}.txt").read_text(encoding="utf-8")
+                       for r in results if r["ok"])
+            renders = sorted(r["render_ms"] for r in results if r["ok"])
+            rows.append((c, wall, renders[len(renders) // 2] if renders else 0, lazy, len(results)))
+        srv.shutdown()
+
+    print(f"\n{'concurrency':>11} {'wall s':>8} {'p50 render ms':>14} {'lazy content':>13}")
+    for c, wall, p50, lazy, n in rows:
+        print(f"{c:>11} {wall:>8.2f} {p50:>14.0f} {lazy:>9}/{n}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,207 @@
+# bench/session_rehydrate.py
+"""
+Checks for SessionHistory refreshing a session from the Mongo transcript
+(api/session_store.py): the turns it loads must line up with the ones held
+locally, so a refresh keeps the running summary instead of starting over.
+
+The transcript is built the way api.main writes it (question HTML-escaped,
+both sides stripped) in in-memory stand-ins for the Mongo collections
+(bench/transcript_writer.py's, plus the reads MongoHistory makes). Also
+checks that /clear leaves nothing another worker could reload, that a
+session not migrated to buckets yet loads its embedded messages too, and
+that turns are not lost while summary folds fail (api/history_compactor.py).
+Exits 1 if any check fails.
+
+Run from the repo root:
+    python -m bench.session_rehydrate
+"""
+import asyncio, html, sys
+
+from langchain_core.runnables import RunnableLambda
+
+from api.chat_buckets import bucket_of
+from api.history_compactor import HistoryCompactor
+from api.session_store import MongoHistory, SessionHistory, SessionStore
+from api.transcript_writer import TranscriptWriter
+from bench.transcript_writer import SimulatedCollection
+
+
+class _Cursor:
+    def __init__(self, docs):
+        self.docs = docs
+
+    def sort(self, key, direction):
+        self.docs.sort(key=lambda d: d.get(key, 0), reverse=direction < 0)
+        return self
+
+    def limit(self, n):
+        self.docs = self.docs[:n]
+        return self
+
+    async def to_list(self, n):
+        return self.docs[:n]
+
+
+class FakeBuckets(SimulatedCollection):
+    """A chat_messages collection TranscriptWriter can write and MongoHistory can read."""
+    def __init__(self, size: int = 4):
+        super().__init__(rtt_s=0)
+        self.size = size
+
+    def log(self, session_id: str, seq: int, role: str, text: str):
+        doc = self.docs.setdefault((session_id, bucket_of(seq, self.size)), {"messages": []})
+        doc["messages"].append({"role": role, "html": text.strip(), "seq": seq})
+
+    def find(self, flt, projection=None):
+        return _Cursor([{**d, "session_id": sid, "bucket": b}
+                        for (sid, b), d in self.docs.items() if sid == flt["session_id"]])
+
+
+class FakeHeaders(SimulatedCollection):
+    """A chat_sessions collection with the find_one MongoHistory makes ($slice on messages)."""
+    def __init__(self):
+        super().__init__(rtt_s=0)
+
+    async def find_one(self, flt, projection=None):
+        doc = self.docs.get((flt["session_id"], None))
+        if doc is None:
+            return None
+        doc = dict(doc)
+        n = ((projection or {}).get("messages") or {}).get("$slice")
+        if n and "messages" in doc:
+            doc["messages"] = doc["messages"][n:]
+        return doc
+
+
+class _Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+async def check_escaped_tail_keeps_summary() -> str:
+    """A refreshed tail equal to the local turns apart from escaping/stripping keeps the summary."""
+    clock, buckets = _Clock(), FakeBuckets()
+    store = SessionStore(max_turns=4, clock=clock)
+    hist = SessionHistory(store, MongoHistory(buckets, bucket_size=buckets.size), refresh_s=30)
+    turns = [("What's the price of <b>Enatega</b>? ", "<p>It depends.</p>\n"),
+             ("Can I see a demo  ", "<p>Here are the demo links.</p>"),
+             ("Do you have an app & a dashboard?", "<p>Yes.</p>")]
+    for i, (q, a) in enumerate(turns):
+        await hist.add_turn("s", q, a)
+        buckets.log("s", 2 * i, "user", html.escape(q))
+        buckets.log("s", 2 * i + 1, "assistant", a)
+    store.set_summary("s", "Visitor asked about pricing.", 1)
+
+    clock.now += 60                      # idle past refresh_s: the next get reloads from Mongo
+    got = await hist.get("s")
+    if not got or got[0].type != "summary":
+        return "summary dropped on refresh"
+    if [m.content for m in got[1:]] != [x for q, a in turns[1:] for x in (q, a)]:
+        return f"turns changed on refresh: {got[1:]}"
+    return ""
+
+
+async def check_clear_reaches_other_workers() -> str:
+    """After /clear returns, a worker holding an idle copy of the session reloads nothing."""
+    clock, headers, buckets = _Clock(), SimulatedCollection(rtt_s=0), FakeBuckets()
+    writer = TranscriptWriter(headers, buckets, bucket_size=buckets.size, flush_interval_s=60)
+    workers = [SessionHistory(SessionStore(clock=clock), MongoHistory(buckets, bucket_size=buckets.size))
+               for _ in range(2)]
+    for turn in range(3):
+        q, a = f"question {turn}", f"<p>answer {turn}</p>"
+        await workers[0].add_turn("s", q, a)
+        await workers[1].add_turn("s", q, a)
+        await writer.append("s", "user", html.escape(q))
+        await writer.append("s", "assistant", a)
+
+    await workers[0].clear("s")
+    ok = await writer.clear("s")          # has to be written now, not after the 60 s flush interval
+    clock.now += 60
+    got = await workers[1].get("s")
+    await writer.close()
+    if not ok:
+        return "clear not confirmed"
+    if got:
+        return f"other worker still has {len(got)} messages"
+    return ""
+
+
+async def check_unmigrated_session_loads_both() -> str:
+    """A header still embedding the old array, plus buckets written since deploy, loads as one history."""
+    headers, buckets = FakeHeaders(), FakeBuckets()
+    old = [("old question 0", "<p>old answer 0</p>"), ("old question 1", "<p>old answer 1</p>")]
+    headers.docs[("s", None)] = {"session_id": "s", "message_count": 2,
+                                 "messages": [{"role": r, "html": t} for q, a in old
+                                              for r, t in (("user", html.escape(q)), ("assistant", a))]}
+    # an interrupted migration left copies of the array below first_seq (0)
+    for i, (q, a) in enumerate(old):
+        buckets.log("s", 2 * i - 4, "user", html.escape(q))
+        buckets.log("s", 2 * i - 3, "assistant", a)
+    buckets.log("s", 0, "user", "new question")
+    buckets.log("s", 1, "assistant", "<p>new answer</p>")
+
+    got = await MongoHistory(buckets, bucket_size=buckets.size, sessions=headers).load("s", 8)
+    want = old + [("new question", "<p>new answer</p>")]
+    return "" if got == want else f"loaded {got}"
+
+
+class _FlakySummarizer:
+    """bind() -> runnable that fails while `down` is set, else returns the turns it was given."""
+    def __init__(self):
+        self.down = True
+
+    def _summarize(self, prompt):
+        if self.down:
+            raise RuntimeError("summarizer unavailable")
+        return prompt.to_string().split("New turns:\n", 1)[1].split("\n\nUpdated summary:")[0]
+
+    def bind(self, **kwargs):
+        return RunnableLambda(self._summarize)
+
+
+async def check_failed_folds_keep_turns() -> str:
+    """Turns that roll past max_turns while folds fail are still folded once the summarizer is back."""
+    store = SessionStore(max_turns=4, max_unsummarized=4)
+    llm = _FlakySummarizer()
+    compactor = HistoryCompactor(store, llm, count=len, keep_turns=2, fold_batch=1)
+    for turn in range(7):
+        store.add_turn("s", f"question {turn}", f"answer {turn}")
+        compactor.schedule("s")
+        await compactor.drain()
+    llm.down = False
+    store.add_turn("s", "question 7", "answer 7")
+    compactor.schedule("s")
+    await compactor.drain()
+
+    hist = store.history("s")
+    text = " ".join(m.content for m in hist)
+    lost = [turn for turn in range(8) if f"question {turn}" not in text]
+    if lost:
+        return f"turns {lost} lost"
+    if len(store._sessions["s"].turns) > store.max_turns:
+        return "window not trimmed after the fold"
+    return ""
+
+
+CHECKS = [check_escaped_tail_keeps_summary, check_clear_reaches_other_workers,
+          check_unmigrated_session_loads_both, check_failed_folds_keep_turns]
+
+
+async def run() -> int:
+    failed = 0
+    for check in CHECKS:
+        err = await check()
+        print(f"{'FAIL' if err else 'ok':<5} {check.__name__}" + (f": {err}" if err else ""))
+        failed += bool(err)
+    return failed
+
+
+def main():
+    sys.exit(1 if asyncio.run(run()) else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+# bench/session_store.py
+"""
+Soak test for api.session_store.SessionStore: N distinct sessions (default
+100k) arrive over a simulated period, each sending a few turns with HTML-sized
+answers. A fake clock advances with the traffic so idle-TTL expiry happens as
+it would over days of uptime.
+
+Reports retained sessions, eviction counters, traced memory and per-call
+latency. --compare-old runs the same traffic through the old unbounded
+dict of ConversationBufferMemory (on fewer sessions; it is slow and large).
+
+Run from the repo root:
+    python -m bench.session_store [--sessions 100000] [--max-sessions 10000] [--days 30] [--compare-old 10000]
+"""
+import argparse, random, statistics, time, tracemalloc
+
+from api.session_store import SessionStore
+
+ANSWER = "<h2>Enatega</h2><p>" + "Enatega is a white-label multi-vendor delivery platform. " * 24 + "</p>"
+
+
+def traffic(n_sessions: int, days: float, seed: int = 7):
+    """(t, session_id, question, answer) in time order; 1-6 turns per session, turns minutes apart."""
+    rng = random.Random(seed)
+    span = days * 86400
+    events = []
+    for i in range(n_sessions):
+        t = rng.random() * span
+        for turn in range(rng.choice([1, 1, 2, 2, 3, 4, 6])):
+            t += rng.uniform(10, 300)
+            events.append((t, f"s{i:07d}", f"question {turn} from visitor {i}", f"{ANSWER}<!-- {i}.{turn} -->"))
+    events.sort()
+    return events
+
+
+class _Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def measured(play):
+    """Latency from an untraced run, memory from a second run under tracemalloc. Returns (state, lat, current, peak)."""
+    _, lat = play()
+    tracemalloc.start()
+    state, _ = play()
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return state, lat, current, peak
+
+
+def run_store(events, max_sessions: int, ttl_s: float, max_turns: int):
+    def play():
+        clock = _Clock()
+        store = SessionStore(max_sessions=max_sessions, idle_ttl_s=ttl_s, max_turns=max_turns, clock=clock)
+        lat = []
+        for t, sid, q, a in events:
+            clock.now = t
+            t0 = time.perf_counter()
+            store.history(sid)
+            store.add_turn(sid, q, a)
+            lat.append((time.perf_counter() - t0) * 1e6)
+        return store, lat
+    return measured(play)
+
+
+def run_old(events, max_turns: int):
+    from langchain.memory import ConversationBufferMemory
+
+    def play():
+        mem, lat = {}, []
+        for _, sid, q, a in events:
+            t0 = time.perf_counter()
+            m = mem.get(sid)
+            if not m:
+                m = mem[sid] = ConversationBufferMemory(memory_key="chat_history", return_messages=True,
+                                                        input_key="question", output_key="answer")
+            m.buffer[:] = m.buffer[-(2 * max_turns):]
+            m.load_memory_variables({})
+            m.save_context({"question": q}, {"answer": a})
+            lat.append((time.perf_counter() - t0) * 1e6)
+        return mem, lat
+    return measured(play)
+
+
+def pct(values, q):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--sessions", type=int, default=100_000)
+    ap.add_argument("--max-sessions", type=int, default=10_000)
+    ap.add_argument("--days", type=float, default=30)
+    ap.add_argument("--ttl-days", type=float, default=7)
+    ap.add_argument("--max-turns", type=int, default=8)
+    ap.add_argument("--compare-old", type=int, default=0, help="also run the old dict on this many sessions")
+    args = ap.parse_args()
+
+    events = traffic(args.sessions, args.days)
+    store, lat, current, peak = run_store(events, args.max_sessions, args.ttl_days * 86400, args.max_turns)
+    st = store.stats()
+    print(f"{args.sessions} sessions, {len(events)} turns over {args.days:g} days "
+          f"(cap {args.max_sessions}, idle TTL {args.ttl_days:g} d)")
+    print(f"retained: {st['sessions']}  evicted (LRU): {st['evicted_lru']}  expired (idle): {st['expired']}  "
+          f"history hit rate: {st['hit_rate']:.2%}")
+    print(f"{'store':<30} {'retained MB':>12} {'peak MB':>9} {'p50 us':>8} {'p99 us':>8}")
+    print(f"{'SessionStore':<30} {current / 1e6:>12.1f} {peak / 1e6:>9.1f} "
+          f"{statistics.median(lat):>8.1f} {pct(lat, 0.99):>8.1f}")
+
+    if args.compare_old:
+        old_events = traffic(args.compare_old, args.days)
+        mem, lat, current, peak = run_old(old_events, args.max_turns)
+        label = f"dict+BufferMemory ({args.compare_old})"
+        print(f"{label:<30} {current / 1e6:>12.1f} {peak / 1e6:>9.1f} "
+              f"{statistics.median(lat):>8.1f} {pct(lat, 0.99):>8.1f}   ({len(mem)} sessions, never evicted)")
+
+
+if __name__ == "__main__":
+    main()
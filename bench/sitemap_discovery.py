@@ -0,0 +1,98 @@
+# bench/sitemap_discovery.py
+"""
+Run url_discovery against fixture sitemaps on a local http.server: a sitemap
+index with a nested index, a gzipped child, a missing child and a self-reference,
+and page URLs with www / tracking-param / fragment / no-slash duplicates plus
+pages the default EXCLUDE patterns should drop. Checks the result against the
+expected list and prints the ordered queue.
+
+Run from the repo root:
+    python -m bench.sitemap_discovery
+"""
+import asyncio, functools, gzip, pathlib, tempfile, threading, time
+from http.server import ThreadingHTTPServer, SimpleHTTPRequestHandler
+
+from url_discovery import discover
+
+URLSET = '<?xml version="1.0" encoding="UTF-8"?>\n<urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">\n{}\n</urlset>\n'
+INDEX = '<?xml version="1.0" encoding="UTF-8"?>\n<sitemapindex xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">\n{}\n</sitemapindex>\n'
+
+PAGES = [
+    ("https://enatega.com/", "2025-09-01"),
+    ("https://www.enatega.com/yalla-delivery", "2025-06-01"),
+    ("https://enatega.com/yalla-delivery/?utm_source=x#top", "2025-07-01"),   # dup, newer lastmod wins
+    ("https://enatega.com/grocery-delivery-solution/", "2025-05-01"),
+    ("https://enatega.com/enatega-vs-yelo/", "2025-04-01"),
+    ("https://enatega.com/multi-vendor-features/", "2025-03-01"),
+    ("https://enatega.com/tag/delivery/", ""),                                # excluded
+    ("https://enatega.com/blog/some-post/", ""),                              # excluded
+    ("https://enatega.com/case-studies/page/2/", ""),                         # excluded
+    ("https://enatega.com/wp-content/uploads/brochure.pdf", ""),              # excluded
+    ("https://example.com/elsewhere/", ""),                                   # off-site
+]
+DOCS = [
+    ("https://enatega.com/multi-vendor-doc/introduction/", "2025-08-01"),
+    ("https://enatega.com/multi-vendor-doc/faqs/", "2025-08-02"),
+    ("https://enatega.com//multi-vendor-doc/faqs", ""),                       # dup
+]
+EXPECTED = [
+    "https://enatega.com/",
+    "https://enatega.com/grocery-delivery-solution/",
+    "https://enatega.com/multi-vendor-features/",
+    "https://enatega.com/enatega-vs-yelo/",
+    "https://enatega.com/multi-vendor-doc/faqs/",
+    "https://enatega.com/multi-vendor-doc/introduction/",
+    "https://enatega.com/yalla-delivery/",
+]
+
+
+class _Quiet(SimpleHTTPRequestHandler):
+    def log_message(self, *args):
+        pass
+
+
+def urls(entries) -> str:
+    return "\n".join(f"<url><loc>{u.replace('&', '&amp;')}</loc>" + (f"<lastmod>{m}</lastmod>" if m else "") + "</url>"
+                     for u, m in entries)
+
+
+def write_fixtures(root: pathlib.Path, base: str):
+    sm = lambda names: "\n".join(f"<sitemap><loc>{base}/{n}</loc></sitemap>" for n in names)
+    (root / "sitemap_index.xml").write_text(INDEX.format(sm([
+        "page-sitemap.xml", "case-sitemap.xml.gz", "missing-sitemap.xml", "docs_index.xml", "sitemap_index.xml",
+    ])), encoding="utf-8")
+    (root / "docs_index.xml").write_text(INDEX.format(sm(["doc-sitemap.xml", "page-sitemap.xml"])), encoding="utf-8")
+    (root / "page-sitemap.xml").write_text(URLSET.format(urls(PAGES[:2] + PAGES[3:])), encoding="utf-8")
+    (root / "case-sitemap.xml.gz").write_bytes(gzip.compress(URLSET.format(urls(PAGES[1:3])).encode()))
+    (root / "doc-sitemap.xml").write_text(URLSET.format(urls(DOCS)), encoding="utf-8")
+
+
+def main():
+    with tempfile.TemporaryDirectory() as tmp:
+        root = pathlib.Path(tmp)
+        srv = ThreadingHTTPServer(("127.0.0.1", 0), functools.partial(_Quiet, directory=str(root)))
+        threading.Thread(target=srv.serve_forever, daemon=True).start()
+        base = f"http://127.0.0.1:{srv.server_address[1]}"
+        write_fixtures(root, base)
+
+        t = time.perf_counter()
+        entries = asyncio.run(discover([f"{base}/sitemap_index.xml"]))
+        ms = (time.perf_counter() - t) * 1000
+        srv.shutdown()
+
+    for e in entries:
+        print(f"{e.priority:.1f}  {e.lastmod[:10]:<10}  {e.url}")
+    got = [e.url for e in entries]
+    print(f"\n{len(entries)} pages in {ms:.0f} ms; matches expected: {got == EXPECTED}")
+    if got != EXPECTED:
+        for u in EXPECTED:
+            if u not in got:
+                print("  missing:", u)
+        for u in got:
+            if u not in EXPECTED:
+                print("  unexpected:", u)
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,274 @@
+# bench/stubs.py
+"""
+Stub OpenAI and Qdrant HTTP servers so api.main can be imported and driven
+offline. Latencies are configurable so benchmarks see realistic round trips.
+
+Usage:
+    from bench.stubs import start_stubs
+    start_stubs()          # sets env vars, must run before importing api.main
+    from api import main
+"""
+import os, json, time, math, base64, struct, hashlib, pathlib, threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional
+
+from qdrant_client.http import models as qm
+
+DIM = 1536
+COLLECTION = "stub_collection"
+CHUNKS_JSONL = pathlib.Path("data/clean/chunks_all.jsonl")
+
+# Words that make the stub router answer with a tool call
+DEMO_WORDS = ("demo", "prototype", "figma")
+
+try:
+    import tiktoken
+    _enc = tiktoken.get_encoding("cl100k_base")
+except Exception:
+    _enc = None
+
+
+def _features(item) -> List:
+    # OpenAIEmbeddings sends token ids; plain strings are tokenized the same way
+    if isinstance(item, list):
+        return item
+    text = str(item)
+    return _enc.encode(text) if _enc else text.lower().split()
+
+
+def sparse_embedding(item) -> Dict[int, float]:
+    """Hashed bag-of-tokens vector: inputs sharing tokens get similar vectors."""
+    vec: Dict[int, float] = {}
+    for f in _features(item):
+        h = int(hashlib.md5(str(f).encode("utf-8")).hexdigest()[:8], 16)
+        idx = h % DIM
+        vec[idx] = vec.get(idx, 0.0) + (1.0 if (h >> 20) & 1 else -1.0)
+    norm = math.sqrt(sum(v * v for v in vec.values())) or 1.0
+    return {i: v / norm for i, v in vec.items()}
+
+
+def dense(vec: Dict[int, float]) -> List[float]:
+    out = [0.0] * DIM
+    for i, v in vec.items():
+        out[i] = v
+    return out
+
+
+def load_points(path: pathlib.Path = CHUNKS_JSONL) -> List[Dict]:
+    points = []
+    if not path.exists():
+        return points
+    with path.open(encoding="utf-8") as f:
+        for i, line in enumerate(f):
+            row = json.loads(line)
+            text = row.pop("text", "")
+            points.append({
+                "id": i + 1,
+                "payload": {"page_content": text, "metadata": row},
+                "vector": sparse_embedding(text),
+            })
+    return points
+
+
+def _collection_info(points_count: int) -> Dict:
+    info = qm.CollectionInfo(
+        status=qm.CollectionStatus.GREEN,
+        optimizer_status=qm.OptimizersStatusOneOf.OK,
+        points_count=points_count,
+        indexed_vectors_count=points_count,
+        segments_count=1,
+        config=qm.CollectionConfig(
+            params=qm.CollectionParams(vectors=qm.VectorParams(size=DIM, distance=qm.Distance.COSINE)),
+            hnsw_config=qm.HnswConfig(m=16, ef_construct=100, full_scan_threshold=10000),
+            optimizer_config=qm.OptimizersConfig(
+                deleted_threshold=0.2, vacuum_min_vector_number=1000,
+                default_segment_number=0, flush_interval_sec=5,
+            ),
+        ),
+        payload_schema={},
+    )
+    return info.model_dump(mode="json", exclude_none=True)
+
+
+class _Handler(BaseHTTPRequestHandler):
+    server_version = "stub/1.0"
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args):
+        pass
+
+    def _body(self) -> Dict:
+        n = int(self.headers.get("Content-Length") or 0)
+        return json.loads(self.rfile.read(n) or b"{}") if n else {}
+
+    def _send(self, obj, status: int = 200, headers: Optional[Dict] = None):
+        data = json.dumps(obj).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for k, v in (headers or {}).items():
+            self.send_header(k, str(v))
+        self.end_headers()
+        self.wfile.write(data)
+
+
+class _OpenAIHandler(_Handler):
+    def _rate_limit(self):
+        """Sliding window (embed_window_s, default a minute) when embed_rpm is set. Returns (allowed, headers)."""
+        rpm = self.server.cfg.get("embed_rpm") or 0
+        span = self.server.cfg.get("embed_window_s") or 60
+        if not rpm:
+            return True, {}
+        with self.server.lock:
+            now = time.time()
+            window = self.server.window = [t for t in self.server.window if now - t < span]
+            allowed = len(window) < rpm
+            if allowed:
+                window.append(now)
+            else:
+                self.server.calls["rate_limited"] = self.server.calls.get("rate_limited", 0) + 1
+            reset_ms = int((span - (now - window[0])) * 1000) + 1
+        headers = {"x-ratelimit-limit-requests": rpm, "x-ratelimit-remaining-requests": rpm - len(window),
+                   "x-ratelimit-reset-requests": f"{reset_ms}ms"}
+        if not allowed:
+            headers["retry-after-ms"] = reset_ms
+        return allowed, headers
+
+    def do_POST(self):
+        body = self._body()
+        cfg = self.server.cfg
+        if self.path.endswith("/embeddings"):
+            time.sleep(cfg["embed_ms"] / 1000)
+            allowed, limit_headers = self._rate_limit()
+            if not allowed:
+                return self._send({"error": {"message": "Rate limit reached", "type": "requests",
+                                             "code": "rate_limit_exceeded"}}, 429, limit_headers)
+            self.server.calls["embeddings"] += 1
+            inputs = body.get("input")
+            if isinstance(inputs, str) or (isinstance(inputs, list) and inputs and isinstance(inputs[0], int)):
+                inputs = [inputs]
+            data = []
+            for i, item in enumerate(inputs or []):
+                vec = dense(sparse_embedding(item))
+                if body.get("encoding_format") == "base64":
+                    vec = base64.b64encode(struct.pack(f"<{DIM}f", *vec)).decode("ascii")
+                data.append({"object": "embedding", "index": i, "embedding": vec})
+            return self._send({
+                "object": "list", "data": data, "model": body.get("model"),
+                "usage": {"prompt_tokens": 1, "total_tokens": 1},
+            }, headers=limit_headers)
+        if self.path.endswith("/chat/completions"):
+            time.sleep(cfg["chat_ms"] / 1000)
+            self.server.calls["chat"] += 1
+            return self._chat(body)
+        self._send({"error": "not found"}, 404)
+
+    def _chat(self, body: Dict):
+        last = (body.get("messages") or [{}])[-1].get("content") or ""
+        base = {"id": "chatcmpl-stub", "created": int(time.time()), "model": body.get("model")}
+        if body.get("tools"):
+            message = {"role": "assistant", "content": None}
+            if any(w in str(last).lower() for w in DEMO_WORDS):
+                message["tool_calls"] = [{
+                    "id": "call_stub", "type": "function",
+                    "function": {"name": "get_demo_links", "arguments": "{}"},
+                }]
+            else:
+                message["content"] = ""
+            return self._send({**base, "object": "chat.completion", "choices": [
+                {"index": 0, "message": message, "finish_reason": "tool_calls" if message.get("tool_calls") else "stop"}
+            ]})
+        answer = self.server.cfg["answer"]
+        if not body.get("stream"):
+            return self._send({**base, "object": "chat.completion", "choices": [
+                {"index": 0, "message": {"role": "assistant", "content": answer}, "finish_reason": "stop"}
+            ], "usage": {"prompt_tokens": 1, "completion_tokens": 1, "total_tokens": 2}})
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        for word in answer.split(" "):
+            chunk = {**base, "object": "chat.completion.chunk", "choices": [
+                {"index": 0, "delta": {"content": word + " "}, "finish_reason": None}
+            ]}
+            self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode("utf-8"))
+            time.sleep(self.server.cfg["token_ms"] / 1000)
+        self.wfile.write(b"data: [DONE]\n\n")
+        self.close_connection = True
+
+
+class _QdrantHandler(_Handler):
+    def _result(self, result):
+        self._send({"result": result, "status": "ok", "time": 0.0})
+
+    def do_GET(self):
+        if self.path in ("/", ""):
+            return self._send({"title": "qdrant - vector search engine", "version": "1.15.1"})
+        parts = self.path.strip("/").split("/")
+        if parts[:1] == ["collections"] and len(parts) == 2:
+            return self._result(_collection_info(len(self.server.points)))
+        if parts[:1] == ["collections"] and parts[-1] == "exists":
+            return self._result({"exists": True})
+        if parts[-1] == "aliases":
+            return self._result({"aliases": []})
+        self._send({"status": {"error": "not found"}}, 404)
+
+    def do_POST(self):
+        body = self._body()
+        time.sleep(self.server.cfg["qdrant_ms"] / 1000)
+        self.server.calls["qdrant"] += 1
+        if self.path.endswith("/points/count"):
+            return self._result({"count": len(self.server.points)})
+        if self.path.endswith("/points/query"):
+            query = body.get("query") or []
+            if isinstance(query, dict):
+                query = query.get("nearest") or []
+            limit = int(body.get("limit") or 10)
+            scored = []
+            for p in self.server.points:
+                score = sum(v * query[i] for i, v in p["vector"].items()) if query else 0.0
+                scored.append((score, p))
+            scored.sort(key=lambda x: -x[0])
+            return self._result({"points": [
+                {"id": p["id"], "version": 0, "score": s, "payload": p["payload"]}
+                for s, p in scored[:limit]
+            ]})
+        if self.path.endswith("/points/scroll"):
+            with_vectors = bool(body.get("with_vector") or body.get("with_vectors"))
+            return self._result({"points": [
+                {"id": p["id"], "payload": p["payload"], **({"vector": dense(p["vector"])} if with_vectors else {})}
+                for p in self.server.points
+            ], "next_page_offset": None})
+        self._send({"status": {"error": "not found"}}, 404)
+
+
+def _serve(handler, cfg: Dict, calls: Dict, points: Optional[List[Dict]] = None) -> str:
+    srv = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    srv.daemon_threads = True
+    srv.cfg, srv.calls, srv.points = cfg, calls, points or []
+    srv.lock, srv.window = threading.Lock(), []
+    threading.Thread(target=srv.serve_forever, daemon=True).start()
+    return f"http://127.0.0.1:{srv.server_address[1]}"
+
+
+def start_stubs(chat_ms: int = 400, embed_ms: int = 80, qdrant_ms: int = 30, token_ms: int = 5,
+                answer: str = "<p>Enatega is a white-label delivery platform.</p>", embed_rpm: int = 0,
+                embed_window_s: int = 60) -> Dict:
+    """Start both stub servers and point the app's env vars at them. Returns call counters.
+
+    embed_rpm > 0 makes /embeddings answer 429 (with retry-after-ms) past that many requests per
+    embed_window_s seconds.
+    """
+    cfg = {"chat_ms": chat_ms, "embed_ms": embed_ms, "qdrant_ms": qdrant_ms, "token_ms": token_ms, "answer": answer,
+           "embed_rpm": embed_rpm, "embed_window_s": embed_window_s}
+    calls = {"embeddings": 0, "chat": 0, "qdrant": 0}
+    openai_url = _serve(_OpenAIHandler, cfg, calls)
+    qdrant_url = _serve(_QdrantHandler, cfg, calls, load_points())
+
+    os.environ["OPENAI_API_KEY"] = "sk-stub"
+    os.environ["OPENAI_BASE_URL"] = f"{openai_url}/v1"
+    os.environ["QDRANT_URL"] = qdrant_url
+    os.environ["COLLECTION_NAME"] = COLLECTION
+    os.environ["MONGO_URI"] = ""  # keep transcripts out of benchmarks
+    os.environ.pop("QDRANT_API_KEY", None)
+    return calls
@@ -0,0 +1,68 @@
+# bench/title_extract.py
+"""
+Title extraction over the real data/raw corpus: the old full BeautifulSoup
+(lxml) parse vs the streaming <head> parser in chunk_engine vs a warm
+titles.json manifest (stat only). Also checks both parsers agree.
+
+Run from the repo root:
+    python -m bench.title_extract [--repeat 3]
+"""
+import argparse, json, pathlib, tempfile, time
+
+from bs4 import BeautifulSoup
+
+import chunk_engine
+from chunk_engine import RAW_DIR, read_head_meta, refresh_titles
+
+
+def bs4_title(path: pathlib.Path) -> str:
+    soup = BeautifulSoup(path.read_text(encoding="utf-8"), "lxml")
+    t = soup.title.string if soup.title and soup.title.string else ""
+    return (t or "").strip()
+
+
+def best_of(fn, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        t = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t)
+    return best * 1000
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--repeat", type=int, default=3)
+    args = ap.parse_args()
+
+    files = sorted(RAW_DIR.glob("*.html"))
+    if not files:
+        print("No raw HTML in data/raw. Run web_scraping.py first.")
+        return
+    mb = sum(f.stat().st_size for f in files) / 1e6
+
+    old = {f.stem: bs4_title(f) for f in files}
+    new = {f.stem: read_head_meta(f)["title"] for f in files}
+    diff = [s for s in old if old[s] != new[s]]
+
+    slugs = [f.stem for f in files]
+    with tempfile.TemporaryDirectory() as tmp:
+        chunk_engine.TITLES_PATH = pathlib.Path(tmp) / "titles.json"   # don't touch the real manifest
+        cold_ms = best_of(lambda: (chunk_engine.TITLES_PATH.unlink(missing_ok=True), refresh_titles(slugs)), args.repeat)
+        warm_ms = best_of(lambda: refresh_titles(slugs), args.repeat)
+
+    print(f"files: {len(files)}  ({mb:.1f} MB)  titles agree: {len(files) - len(diff)}/{len(files)}")
+    for s in diff:
+        print(f"  differs: {s}: {json.dumps(old[s])} vs {json.dumps(new[s])}")
+    print(f"{'method':<28} {'total ms':>10} {'per file ms':>12}")
+    for name, ms in [
+        ("BeautifulSoup(lxml) full", best_of(lambda: [bs4_title(f) for f in files], args.repeat)),
+        ("streaming <head> parser", best_of(lambda: [read_head_meta(f) for f in files], args.repeat)),
+        ("manifest, cold (parse+save)", cold_ms),
+        ("manifest, warm (stat only)", warm_ms),
+    ]:
+        print(f"{name:<28} {ms:>10.1f} {ms / len(files):>12.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,134 @@
+# bench/transcript_writer.py
+"""
+Time spent on the request path logging transcripts: the old inline awaits
+(ensure_session_doc + user append_message + assistant append_message, one
+update_one round trip each) vs TranscriptWriter's enqueue.
+
+Mongo is simulated by collections whose calls sleep for an RTT (plus a
+small per-op cost for bulk writes) and then apply the update to a dict, so
+the final transcripts (the embedded array for inline, the message buckets
+for the writer) can be checked for lost or duplicated messages. Concurrent
+sessions each run a few turns.
+
+Run from the repo root:
+    python -m bench.transcript_writer [--sessions 500] [--turns 4] [--rtt-ms 20]
+"""
+import argparse, asyncio, statistics, time
+
+from api.transcript_writer import TranscriptWriter
+
+
+class SimulatedCollection:
+    def __init__(self, rtt_s: float, per_op_s: float = 0.00005):
+        self.rtt_s = rtt_s
+        self.per_op_s = per_op_s
+        self.docs = {}
+        self.round_trips = 0
+
+    def _apply(self, key, update):
+        doc = self.docs.get(key)
+        if doc is None:
+            doc = self.docs[key] = dict(update.get("$setOnInsert") or {})
+        doc.update(update.get("$set") or {})
+        for field, n in (update.get("$inc") or {}).items():
+            doc[field] = doc.get(field, 0) + n
+        push = (update.get("$push") or {}).get("messages")
+        if push is not None:
+            doc.setdefault("messages", []).extend(push["$each"] if "$each" in push else [push])
+        return doc
+
+    @staticmethod
+    def _key(flt):
+        return (flt["session_id"], flt.get("bucket"))
+
+    async def update_one(self, flt, update, upsert=False):
+        self.round_trips += 1
+        await asyncio.sleep(self.rtt_s)
+        self._apply(self._key(flt), update)
+
+    async def find_one_and_update(self, flt, update, **kwargs):
+        self.round_trips += 1
+        await asyncio.sleep(self.rtt_s)
+        return dict(self._apply(self._key(flt), update))
+
+    async def bulk_write(self, ops, ordered=True):
+        self.round_trips += 1
+        await asyncio.sleep(self.rtt_s + self.per_op_s * len(ops))
+        for op in ops:
+            if type(op).__name__ in ("DeleteOne", "DeleteMany"):
+                for key in [k for k in self.docs if k[0] == op._filter["session_id"]]:
+                    del self.docs[key]
+            else:
+                self._apply(self._key(op._filter), op._doc)
+
+
+async def inline_turn(col, sid, turn):
+    """The old path: three awaited round trips per turn."""
+    await col.update_one({"session_id": sid}, {"$setOnInsert": {"session_id": sid, "messages": []},
+                                               "$set": {"last_active": turn}}, upsert=True)
+    await col.update_one({"session_id": sid}, {"$push": {"messages": {"role": "user", "html": f"q{turn}"}}}, upsert=True)
+    await col.update_one({"session_id": sid}, {"$push": {"messages": {"role": "assistant", "html": f"a{turn}"}}}, upsert=True)
+
+
+async def writer_turn(writer, sid, turn):
+    await writer.touch(sid)
+    await writer.append(sid, "user", f"q{turn}")
+    await writer.append(sid, "assistant", f"a{turn}")
+
+
+async def play(turn_fn, target, sessions: int, turns: int):
+    lat = []
+
+    async def session(i):
+        for t in range(turns):
+            t0 = time.perf_counter()
+            await turn_fn(target, f"s{i:05d}", t)
+            lat.append((time.perf_counter() - t0) * 1000)
+            await asyncio.sleep(0.001)   # the LLM call would be here
+
+    t0 = time.perf_counter()
+    await asyncio.gather(*(session(i) for i in range(sessions)))
+    return lat, time.perf_counter() - t0
+
+
+def check(col, sessions, turns) -> str:
+    per_session = {}
+    for (sid, _), d in col.docs.items():
+        per_session.setdefault(sid, []).extend(m.get("seq", i) for i, m in enumerate(d.get("messages", [])))
+    bad = [sid for sid, seqs in per_session.items() if sorted(seqs) != list(range(2 * turns))]
+    return "ok" if len(per_session) == sessions and not bad else f"{len(bad)} wrong / {len(per_session)} sessions"
+
+
+async def run(args):
+    rtt = args.rtt_ms / 1000
+    print(f"{args.sessions} sessions x {args.turns} turns, simulated RTT {args.rtt_ms} ms")
+    print(f"{'method':<12} {'p50 ms/turn':>12} {'p99 ms/turn':>12} {'round trips':>12} {'transcripts':>12}")
+
+    col = SimulatedCollection(rtt)
+    lat, _ = await play(inline_turn, col, args.sessions, args.turns)
+    print(f"{'inline':<12} {statistics.median(lat):>12.2f} {sorted(lat)[int(0.99 * len(lat))]:>12.2f} "
+          f"{col.round_trips:>12} {check(col, args.sessions, args.turns):>12}")
+
+    col, msg_col = SimulatedCollection(rtt), SimulatedCollection(rtt)
+    writer = TranscriptWriter(col, msg_col, batch_size=args.batch, flush_interval_s=args.flush_ms / 1000)
+    lat, _ = await play(writer_turn, writer, args.sessions, args.turns)
+    await writer.close()
+    st = writer.stats()
+    print(f"{'writer':<12} {statistics.median(lat):>12.3f} {sorted(lat)[int(0.99 * len(lat))]:>12.3f} "
+          f"{col.round_trips + msg_col.round_trips:>12} {check(msg_col, args.sessions, args.turns):>12}")
+    print(f"writer: {st['batches']} batches, {st['avg_batch_events']} events/batch, {st['ops']} ops, "
+          f"flush p50 {st['flush_ms_p50']} ms / p95 {st['flush_ms_p95']} ms, waited on full queue {st['waited_full']}")
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--sessions", type=int, default=500)
+    ap.add_argument("--turns", type=int, default=4)
+    ap.add_argument("--rtt-ms", type=float, default=20)
+    ap.add_argument("--batch", type=int, default=200)
+    ap.add_argument("--flush-ms", type=int, default=500)
+    asyncio.run(run(ap.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -3,6 +3,8 @@ import os
 from dotenv import load_dotenv
 from qdrant_client import QdrantClient
 
+from qdrant_aliases import resolve_target
+
 load_dotenv()
 
 client = QdrantClient(
@@ -21,10 +23,13 @@ print(f"\nAvailable collections: {[c.name for c in collections]}")
 # Check expected collection
 expected = os.getenv("COLLECTION_NAME")
 print(f"\nExpected collection name: {expected}")
+target = resolve_target(client, expected)
+if target != expected:
+    print(f"Alias '{expected}' → {target}")
 
-if any(c.name == expected for c in collections):
-    count = client.count(collection_name=expected, exact=True).count
-    print(f"✓ Collection '{expected}' exists with {count} points")
+if any(c.name == target for c in collections):
+    count = client.count(collection_name=target, exact=True).count
+    print(f"✓ Collection '{target}' exists with {count} points")
     
     if count == 0:
         print("\n⚠️  WARNING: Collection is empty!")
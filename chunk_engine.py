@@ -0,0 +1,345 @@
+# chunk_engine.py
+"""
+Chunking shared by chunking.py and ingest_qdrant.py.
+
+Per-file cache in data/clean/.chunk_cache.json: a file whose text hash and
+splitter settings match its cache entry reuses its previous chunks without
+re-tokenizing. Cold runs can split files in a process pool (jobs > 1).
+
+Each chunk records its ordinal (chunk_index) and character offset in the page
+text (start_index) so retrieval can stitch neighbouring chunks back together.
+
+Page titles come from data/raw/titles.json, a sidecar manifest refreshed
+from the raw HTML by a streaming parser that stops at </head>.
+"""
+import re, json, codecs, hashlib, pathlib
+from concurrent.futures import ProcessPoolExecutor
+from html.parser import HTMLParser
+from typing import Dict, List, Optional, Tuple
+
+from langchain.text_splitter import RecursiveCharacterTextSplitter
+from langchain.schema import Document
+
+from embedding_store import chunk_hash
+
+# --- CONFIG ---
+BASE_DOMAIN = "enatega.com"
+BASE_URL = f"https://{BASE_DOMAIN}/"
+
+CLEAN_DIR = pathlib.Path("data/clean")
+RAW_DIR = pathlib.Path("data/raw")
+
+OUT_TXT = CLEAN_DIR / "chunks_all.txt"
+OUT_JSONL = CLEAN_DIR / "chunks_all.jsonl"
+CACHE_PATH = CLEAN_DIR / ".chunk_cache.json"
+TITLES_PATH = RAW_DIR / "titles.json"
+
+USE_TOKENS = True
+TOKEN_CHUNK_SIZE = 700
+TOKEN_CHUNK_OVERLAP = 150
+
+CHAR_CHUNK_SIZE = 4000
+CHAR_CHUNK_OVERLAP = 500
+
+# optional: skip empty or tiny pages
+MIN_WORDS = 20
+
+
+# --- HELPERS ---
+def slug_to_url(slug: str) -> str:
+    if slug in {"home", "home_rendered"}:
+        return BASE_URL
+    return f"{BASE_URL}{slug.strip('/')}/"
+
+
+class _HeadDone(Exception):
+    pass
+
+
+class _HeadParser(HTMLParser):
+    """Collects <title>, meta description and canonical link; raises _HeadDone at </head> or <body>."""
+
+    def __init__(self):
+        super().__init__()
+        self.meta = {"title": "", "description": "", "canonical": ""}
+        self._in_title = False
+        self._title_parts: List[str] = []
+
+    def handle_starttag(self, tag, attrs):
+        a = dict(attrs)
+        if tag == "title" and not self.meta["title"]:
+            self._in_title = True
+        elif tag == "meta" and (a.get("name") or "").lower() == "description" and not self.meta["description"]:
+            self.meta["description"] = (a.get("content") or "").strip()
+        elif tag == "link" and "canonical" in (a.get("rel") or "").lower().split():
+            self.meta["canonical"] = (a.get("href") or "").strip()
+        elif tag == "body":
+            raise _HeadDone
+
+    def handle_endtag(self, tag):
+        if tag == "title" and self._in_title:
+            self._in_title = False
+            self.meta["title"] = "".join(self._title_parts).strip()
+        elif tag == "head":
+            raise _HeadDone
+
+    def handle_data(self, data):
+        if self._in_title:
+            self._title_parts.append(data)
+
+
+def read_head_meta(path: pathlib.Path, block: int = 16384) -> Dict[str, str]:
+    """Stream the file until </head>; never reads or parses the body."""
+    parser = _HeadParser()
+    decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+    try:
+        with path.open("rb") as f:
+            while True:
+                data = f.read(block)
+                if not data:
+                    parser.feed(decoder.decode(b"", final=True))
+                    parser.close()
+                    break
+                parser.feed(decoder.decode(data))
+    except _HeadDone:
+        pass
+    return parser.meta
+
+
+def parse_head_meta(html: str) -> Dict[str, str]:
+    """Same as read_head_meta for HTML already in memory."""
+    parser = _HeadParser()
+    try:
+        parser.feed(html)
+        parser.close()
+    except _HeadDone:
+        pass
+    return parser.meta
+
+
+def load_titles() -> Dict[str, Dict]:
+    try:
+        return json.loads(TITLES_PATH.read_text(encoding="utf-8"))
+    except Exception:
+        return {}
+
+
+def refresh_titles(slugs: List[str], manifest: Optional[Dict[str, Dict]] = None) -> Dict[str, Dict]:
+    """Bring the manifest entries for these slugs up to date (keyed on raw HTML mtime + size); saves if changed."""
+    manifest = load_titles() if manifest is None else manifest
+    changed = False
+    for slug in slugs:
+        path = RAW_DIR / f"{slug}.html"
+        try:
+            st = path.stat()
+        except OSError:
+            if manifest.pop(slug, None) is not None:
+                changed = True
+            continue
+        entry = manifest.get(slug)
+        if entry and entry.get("mtime_ns") == st.st_mtime_ns and entry.get("size") == st.st_size:
+            continue
+        try:
+            meta = read_head_meta(path)
+        except Exception as e:
+            print(f"Title read failed for {path.name}:", e)
+            meta = {"title": "", "description": "", "canonical": ""}
+        manifest[slug] = {"mtime_ns": st.st_mtime_ns, "size": st.st_size, **meta}
+        changed = True
+    if changed and RAW_DIR.exists():
+        tmp = TITLES_PATH.with_name(TITLES_PATH.name + ".tmp")
+        tmp.write_text(json.dumps(manifest, ensure_ascii=False, indent=1, sort_keys=True), encoding="utf-8")
+        tmp.replace(TITLES_PATH)
+    return manifest
+
+
+def guess_title(slug: str, manifest: Optional[Dict[str, Dict]] = None) -> str:
+    manifest = refresh_titles([slug]) if manifest is None else manifest
+    t = ((manifest.get(slug) or {}).get("title") or "").strip()
+    if t:
+        return t
+    # fallback from slug
+    nice = re.sub(r"[-_]+", " ", slug).strip().title()
+    if slug in {"home", "home_rendered"}:
+        return "Enatega — Homepage"
+    return f"Enatega — {nice}"
+
+
+def get_splitter():
+    if USE_TOKENS:
+        return RecursiveCharacterTextSplitter.from_tiktoken_encoder(
+            encoding_name="cl100k_base",
+            chunk_size=TOKEN_CHUNK_SIZE,
+            chunk_overlap=TOKEN_CHUNK_OVERLAP,
+            separators=["\n\n", "\n", ". ", " ", ""],
+        )
+    else:
+        return RecursiveCharacterTextSplitter(
+            chunk_size=CHAR_CHUNK_SIZE,
+            chunk_overlap=CHAR_CHUNK_OVERLAP,
+            separators=["\n\n", "\n", ". ", " ", ""],
+        )
+
+
+def chunker_settings() -> dict:
+    """Recorded in the chunk cache and the embedding artifact; a change here invalidates both."""
+    if USE_TOKENS:
+        return {"splitter": "token", "encoding": "cl100k_base", "size": TOKEN_CHUNK_SIZE, "overlap": TOKEN_CHUNK_OVERLAP}
+    return {"splitter": "char", "size": CHAR_CHUNK_SIZE, "overlap": CHAR_CHUNK_OVERLAP}
+
+
+def collect_clean_files() -> list[pathlib.Path]:
+    CLEAN_DIR.mkdir(parents=True, exist_ok=True)
+    return sorted(
+        p for p in CLEAN_DIR.glob("*.txt")
+        if p.name not in {OUT_TXT.name, OUT_JSONL.name}
+    )
+
+
+def load_text(p: pathlib.Path) -> str:
+    txt = p.read_text(encoding="utf-8")
+    # light cleanup to avoid stray placeholders
+    return txt.replace("[countdown_timer]", " ").strip()
+
+
+# --- CACHE ---
+def _settings_key() -> str:
+    return hashlib.sha256(json.dumps(chunker_settings(), sort_keys=True).encode()).hexdigest()[:16]
+
+
+def load_cache() -> Dict:
+    try:
+        cache = json.loads(CACHE_PATH.read_text(encoding="utf-8"))
+        if cache.get("settings") == _settings_key():
+            return cache
+    except Exception:
+        pass
+    return {"settings": _settings_key(), "files": {}}
+
+
+def save_cache(cache: Dict):
+    tmp = CACHE_PATH.with_name(CACHE_PATH.name + ".tmp")
+    tmp.write_text(json.dumps(cache, ensure_ascii=False), encoding="utf-8")
+    tmp.replace(CACHE_PATH)
+
+
+# --- SPLITTING ---
+_worker_splitter = None
+
+
+def chunk_offsets(text: str, chunks: List[str]) -> List[int]:
+    """Character offset of each chunk in `text` (-1 if not found); chunks are in order and may overlap."""
+    offsets, pos = [], 0
+    for chunk in chunks:
+        start = text.find(chunk, pos)
+        offsets.append(start)
+        if start != -1:
+            pos = start + 1
+    return offsets
+
+
+def _split_text(text: str) -> List[str]:
+    """Process-pool entry point: one splitter (and tiktoken encoding) per worker."""
+    global _worker_splitter
+    if _worker_splitter is None:
+        _worker_splitter = get_splitter()
+    return _worker_splitter.split_text(text)
+
+
+def build_chunks(jobs: int = 1, use_cache: bool = True) -> Tuple[List[Document], List[Tuple[str, int, int]], Dict]:
+    """
+    Chunk every clean file. Returns (docs, per_file_counts, stats);
+    per_file_counts holds (file name, chunks, words) for the summary printout.
+    """
+    cache = load_cache() if use_cache else {"settings": _settings_key(), "files": {}}
+    fresh: Dict[str, Dict] = {}
+    todo: List[Tuple[str, str]] = []             # (slug, text) that need splitting
+    pages = []                                   # (file, slug, words, text)
+    stats = {"files": 0, "cached": 0, "split": 0, "skipped": 0}
+    files = collect_clean_files()
+    titles = refresh_titles([f.stem for f in files])
+
+    for f in files:
+        slug = f.stem
+        text = load_text(f)
+        words = len(text.split())
+        if words < MIN_WORDS:
+            print(f"Skip {f.name}: too few words ({words}).")
+            stats["skipped"] += 1
+            continue
+        stats["files"] += 1
+        text_hash = chunk_hash(text)
+        entry = cache["files"].get(slug)
+        if entry and entry.get("text_hash") == text_hash:
+            stats["cached"] += 1
+            fresh[slug] = entry
+        else:
+            fresh[slug] = {"text_hash": text_hash, "chunks": None}
+            todo.append((slug, text))
+        pages.append((f, slug, words, text))
+
+    if todo:
+        stats["split"] = len(todo)
+        texts = [t for _, t in todo]
+        if jobs > 1 and len(todo) > 1:
+            with ProcessPoolExecutor(max_workers=min(jobs, len(todo))) as pool:
+                results = list(pool.map(_split_text, texts, chunksize=max(1, len(todo) // (jobs * 4))))
+        else:
+            results = [_split_text(t) for t in texts]
+        for (slug, _), chunks in zip(todo, results):
+            fresh[slug]["chunks"] = chunks
+
+    all_docs: List[Document] = []
+    per_file_counts = []
+    for f, slug, words, text in pages:
+        entry = fresh[slug]
+        for i, (chunk, start) in enumerate(zip(entry["chunks"], chunk_offsets(text, entry["chunks"]))):
+            all_docs.append(Document(page_content=chunk, metadata={
+                "url": slug_to_url(slug),
+                "title": guess_title(slug, titles),
+                "slug": slug,
+                "domain": BASE_DOMAIN,
+                "is_active": True,
+                "source": "web",
+                "content_hash": chunk_hash(chunk),
+                "chunk_index": i,
+                "start_index": start,
+            }))
+        per_file_counts.append((f.name, len(entry["chunks"]), words))
+
+    if use_cache:
+        save_cache({"settings": _settings_key(), "files": fresh})
+    return all_docs, per_file_counts, stats
+
+
+# --- OUTPUT ---
+def write_outputs(all_docs: List[Document]):
+    OUT_TXT.parent.mkdir(parents=True, exist_ok=True)
+    with OUT_TXT.open("w", encoding="utf-8") as ftxt:
+        ftxt.write(f"# chunks from {BASE_URL} and related pages\n")
+        ftxt.write(f"# splitter = {'token' if USE_TOKENS else 'char'} | "
+                   f"size={TOKEN_CHUNK_SIZE if USE_TOKENS else CHAR_CHUNK_SIZE} | "
+                   f"overlap={TOKEN_CHUNK_OVERLAP if USE_TOKENS else CHAR_CHUNK_OVERLAP}\n\n")
+        for i, d in enumerate(all_docs, start=1):
+            meta = d.metadata
+            content = d.page_content
+            ftxt.write(f"----- chunk {i}/{len(all_docs)} -----\n")
+            ftxt.write(f"url: {meta.get('url')} | title: {meta.get('title')}\n")
+            ftxt.write(f"slug: {meta.get('slug')} | chars: {len(content)}\n\n")
+            ftxt.write(content + "\n\n")
+
+    with OUT_JSONL.open("w", encoding="utf-8") as jf:
+        for d in all_docs:
+            meta = d.metadata
+            jf.write(json.dumps({
+                "url": meta.get("url"),
+                "title": meta.get("title"),
+                "slug": meta.get("slug"),
+                "domain": meta.get("domain"),
+                "is_active": meta.get("is_active"),
+                "source": meta.get("source"),
+                "content_hash": meta.get("content_hash"),
+                "chunk_index": meta.get("chunk_index"),
+                "start_index": meta.get("start_index"),
+                "text": d.page_content,
+            }, ensure_ascii=False) + "\n")
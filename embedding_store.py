@@ -0,0 +1,93 @@
+# embedding_store.py
+"""
+Chunk-embedding artifact written next to chunks_all.jsonl.
+
+    data/clean/chunks_all.emb.npy    (n, dim) float32|float16, np.load(mmap_mode="r")
+    data/clean/chunks_all.emb.json   header + row index: content hash per row
+
+Rows are unique chunk texts (keyed by content hash), so identical chunks are
+embedded once. The header records the embedding model and chunker settings;
+an artifact built with different settings is ignored by load_embeddings().
+"""
+import json, hashlib, pathlib
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+
+FORMAT_VERSION = 1
+CLEAN_DIR = pathlib.Path("data/clean")
+EMB_NPY = CLEAN_DIR / "chunks_all.emb.npy"
+EMB_INDEX = CLEAN_DIR / "chunks_all.emb.json"
+
+
+def chunk_hash(text: str) -> str:
+    return hashlib.sha256((text or "").encode("utf-8")).hexdigest()[:32]
+
+
+class EmbeddingStore:
+    def __init__(self, vectors: np.ndarray, hashes: List[str], header: Dict):
+        self.vectors = vectors            # memmap when loaded from disk
+        self.hashes = hashes
+        self.header = header
+        self.row_of = {h: i for i, h in enumerate(hashes)}
+
+    def __len__(self):
+        return len(self.hashes)
+
+    def __contains__(self, h: str) -> bool:
+        return h in self.row_of
+
+    def get(self, h: str) -> Optional[np.ndarray]:
+        row = self.row_of.get(h)
+        return None if row is None else self.vectors[row]
+
+    def rows(self, hashes: Iterable[str]) -> np.ndarray:
+        """Vectors for hashes in order (fancy indexing: one copy of just those rows)."""
+        return self.vectors[[self.row_of[h] for h in hashes]]
+
+
+def _header(model: str, chunker: Dict, dim: int, dtype: str, count: int) -> Dict:
+    return {"version": FORMAT_VERSION, "model": model, "chunker": chunker, "dim": dim, "dtype": dtype, "count": count}
+
+
+def save_embeddings(hashes: List[str], vectors, model: str, chunker: Dict,
+                    dtype: str = "float32", npy_path: pathlib.Path = EMB_NPY,
+                    index_path: pathlib.Path = EMB_INDEX) -> EmbeddingStore:
+    arr = np.ascontiguousarray(np.asarray(vectors, dtype=dtype))
+    if arr.ndim != 2 or arr.shape[0] != len(hashes):
+        raise ValueError(f"expected ({len(hashes)}, dim) vectors, got {arr.shape}")
+    header = _header(model, chunker, int(arr.shape[1]), dtype, len(hashes))
+    npy_path.parent.mkdir(parents=True, exist_ok=True)
+    # write-then-rename so readers never mmap a half-written file
+    tmp_npy = npy_path.with_name(npy_path.name + ".tmp")
+    with tmp_npy.open("wb") as f:
+        np.save(f, arr)
+    tmp_idx = index_path.with_name(index_path.name + ".tmp")
+    tmp_idx.write_text(json.dumps({**header, "hashes": list(hashes)}), encoding="utf-8")
+    tmp_npy.replace(npy_path)
+    tmp_idx.replace(index_path)
+    return EmbeddingStore(arr, list(hashes), header)
+
+
+def load_embeddings(model: Optional[str] = None, chunker: Optional[Dict] = None,
+                    npy_path: pathlib.Path = EMB_NPY,
+                    index_path: pathlib.Path = EMB_INDEX) -> Optional[EmbeddingStore]:
+    """Memory-map the artifact. Returns None if missing or built with other model/chunker settings."""
+    if not npy_path.exists() or not index_path.exists():
+        return None
+    try:
+        index = json.loads(index_path.read_text(encoding="utf-8"))
+    except Exception:
+        return None
+    if index.get("version") != FORMAT_VERSION:
+        return None
+    if model is not None and index.get("model") != model:
+        return None
+    if chunker is not None and index.get("chunker") != chunker:
+        return None
+    vectors = np.load(npy_path, mmap_mode="r")
+    hashes = index.get("hashes") or []
+    if vectors.shape[0] != len(hashes):
+        return None
+    header = {k: v for k, v in index.items() if k != "hashes"}
+    return EmbeddingStore(vectors, hashes, header)
@@ -4,12 +4,15 @@ from dotenv import load_dotenv
 from qdrant_client import QdrantClient
 from qdrant_client.http import models as qm
 
+from qdrant_aliases import resolve_target
+
 load_dotenv()
 QDRANT_URL = os.getenv("QDRANT_URL")
 QDRANT_API_KEY = os.getenv("QDRANT_API_KEY")
 COLLECTION = os.getenv("COLLECTION_NAME", "enatega_home")
 
 client = QdrantClient(url=QDRANT_URL, api_key=QDRANT_API_KEY)
+COLLECTION = resolve_target(client, COLLECTION)  # indexes live on the versioned collection behind the alias
 
 # Create keyword index for 'domain'
 try:
@@ -12,6 +12,8 @@ from dotenv import load_dotenv
 from typing import Optional, Dict, Any, List, Tuple
 import html
 
+from api.chat_buckets import embedded_messages
+
 # Load environment variables
 load_dotenv()
 
@@ -19,6 +21,7 @@ load_dotenv()
 MONGO_URI = os.getenv("MONGO_URI")
 MONGO_DB = os.getenv("MONGO_DB", "enatega")
 MONGO_COL = os.getenv("MONGO_COL", "chat_sessions")
+MONGO_MSG_COL = os.getenv("MONGO_MSG_COL", "chat_messages")
 
 if not MONGO_URI:
     print("Error: MONGO_URI environment variable is not set")
@@ -61,6 +64,19 @@ def get_last_conversation() -> Optional[Dict]:
             sort=[("last_active", -1)]
         )
         
+        # Messages live in bucket documents (chat_messages); unmigrated sessions still embed the
+        # older ones, which come first
+        if last_session:
+            legacy, first = embedded_messages(last_session)
+            buckets = db[MONGO_MSG_COL].find(
+                {"session_id": last_session.get("session_id")},
+                {"_id": 0, "messages": 1},
+            ).sort("bucket", 1)
+            from_buckets = [m for b in buckets for m in b.get("messages", [])]
+            if legacy:
+                from_buckets = [m for m in from_buckets if m.get("seq", 0) >= first]
+            last_session["messages"] = legacy + from_buckets
+        
         client.close()
         return last_session
     except Exception as e:
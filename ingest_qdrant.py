@@ -1,228 +1,369 @@
 # ingest_qdrant.py
-import os, re, json, pathlib, argparse
+import os, json, time, uuid, argparse, threading
+from collections import defaultdict, deque
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import tiktoken
 from dotenv import load_dotenv
-from bs4 import BeautifulSoup
 from typing import List
-from langchain.text_splitter import RecursiveCharacterTextSplitter
-from langchain_openai import OpenAIEmbeddings
-from langchain_qdrant import QdrantVectorStore
+from openai import OpenAI, RateLimitError, APIConnectionError, APITimeoutError, InternalServerError
 from langchain.schema import Document
 from qdrant_client import QdrantClient
 from qdrant_client.http import models as qm
 
-# --- CONFIG ---
-BASE_DOMAIN = "enatega.com"
-BASE_URL = f"https://{BASE_DOMAIN}/"
-
-CLEAN_DIR = pathlib.Path("data/clean")
-RAW_DIR = pathlib.Path("data/raw")
+from chunk_engine import CLEAN_DIR, OUT_TXT, OUT_JSONL, chunker_settings, build_chunks, write_outputs
+from embedding_store import EMB_NPY, chunk_hash, load_embeddings, save_embeddings
+from qdrant_aliases import version_name, resolve_alias, list_versions, swap_alias, prune_versions
+from openai_limits import RateGate, retry_delay
 
-OUT_TXT = CLEAN_DIR / "chunks_all.txt"
-OUT_JSONL = CLEAN_DIR / "chunks_all.jsonl"
-
-USE_TOKENS = True
-TOKEN_CHUNK_SIZE = 700
-TOKEN_CHUNK_OVERLAP = 150
+# --- CONFIG ---
+EMBED_MODEL = "text-embedding-3-small"
+VECTOR_SIZE = 1536
+POINT_NAMESPACE = uuid.UUID("5b0f3c1e-6d2a-4f4e-9a57-3f2d8c1e7a10")
 
-CHAR_CHUNK_SIZE = 4000
-CHAR_CHUNK_OVERLAP = 500
-MIN_WORDS = 20
+EMBED_MAX_INPUTS = 2048        # OpenAI /embeddings limits per request
+EMBED_MAX_TOKENS = 300_000
+UPSERT_BATCH = 64
+MAX_RETRIES = 8
+CHECKPOINT = CLEAN_DIR / ".ingest_checkpoint.json"
 
 # --- ENV ---
 load_dotenv()
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
 QDRANT_URL = os.getenv("QDRANT_URL")
 QDRANT_API_KEY = os.getenv("QDRANT_API_KEY")
-COLLECTION = os.getenv("COLLECTION_NAME")
+COLLECTION = os.getenv("COLLECTION_NAME")   # an alias; versions are COLLECTION_v<timestamp>
+KEEP_VERSIONS = int(os.getenv("KEEP_VERSIONS", "3"))
 
 
 # --- HELPERS ---
-def slug_to_url(slug: str) -> str:
-    if slug in {"home", "home_rendered"}:
-        return BASE_URL
-    return f"{BASE_URL}{slug.strip('/')}/"
-
-
-def guess_title(slug: str) -> str:
-    raw_html = RAW_DIR / f"{slug}.html"
-    if raw_html.exists():
-        try:
-            soup = BeautifulSoup(raw_html.read_text(encoding="utf-8"), "lxml")
-            t = soup.title.string if soup.title and soup.title.string else ""
-            t = (t or "").strip()
-            if t:
-                return t
-        except Exception:
-            pass
-    return f"Enatega — {re.sub(r'[-_]+', ' ', slug).strip().title()}"
-
-
-def get_splitter():
-    if USE_TOKENS:
-        return RecursiveCharacterTextSplitter.from_tiktoken_encoder(
-            encoding_name="cl100k_base",
-            chunk_size=TOKEN_CHUNK_SIZE,
-            chunk_overlap=TOKEN_CHUNK_OVERLAP,
-            separators=["\n\n", "\n", ". ", " ", ""],
-        )
-    else:
-        return RecursiveCharacterTextSplitter(
-            chunk_size=CHAR_CHUNK_SIZE,
-            chunk_overlap=CHAR_CHUNK_OVERLAP,
-            separators=["\n\n", "\n", ". ", " ", ""],
+def point_id(slug: str, content_hash: str) -> str:
+    """Deterministic Qdrant ID: the same chunk text on the same page keeps its point across ingests."""
+    return str(uuid.uuid5(POINT_NAMESPACE, f"{slug}:{content_hash}"))
+
+
+def scroll_existing(client: QdrantClient, collection: str, with_vectors: bool = True) -> dict:
+    """All points currently in the collection: id -> (payload, vector); vector is None without with_vectors."""
+    out, offset = {}, None
+    while True:
+        points, offset = client.scroll(
+            collection_name=collection, limit=256, offset=offset,
+            with_payload=True, with_vectors=with_vectors,
         )
+        for p in points:
+            vec = p.vector.get("") if isinstance(p.vector, dict) else p.vector
+            if not with_vectors:
+                vec = None
+            out[str(p.id)] = (p.payload or {}, vec)
+        if offset is None:
+            return out
+
+
+def create_version(client: QdrantClient, name: str):
+    client.create_collection(
+        collection_name=name,
+        vectors_config=qm.VectorParams(size=VECTOR_SIZE, distance=qm.Distance.COSINE),
+    )
+    # same payload indexes as ensure_indexes.py, in place before the alias moves
+    client.create_payload_index(collection_name=name, field_name="domain", field_schema=qm.PayloadSchemaType.KEYWORD)
+    client.create_payload_index(collection_name=name, field_name="is_active", field_schema=qm.PayloadSchemaType.BOOL)
+
+
+def rollback(client: QdrantClient) -> bool:
+    live = resolve_alias(client, COLLECTION)
+    older = [v for v in list_versions(client, COLLECTION) if live is None or v < live]
+    if not older:
+        print(f"No older version of '{COLLECTION}' to roll back to (live: {live}).")
+        return False
+    swap_alias(client, COLLECTION, older[-1])
+    print(f"✓ Alias '{COLLECTION}' now points at {older[-1]} (was {live}).")
+    return True
+
+
+# --- UPLOAD PIPELINE ---
+def token_batches(items: list, enc) -> list:
+    """Pack (hash, text) pairs into requests up to the API's input and token limits."""
+    batches, cur, cur_tokens = [], [], 0
+    for h, text in items:
+        n = len(enc.encode(text, disallowed_special=()))
+        if cur and (len(cur) >= EMBED_MAX_INPUTS or cur_tokens + n > EMBED_MAX_TOKENS):
+            batches.append(cur)
+            cur, cur_tokens = [], 0
+        cur.append((h, text))
+        cur_tokens += n
+    if cur:
+        batches.append(cur)
+    return batches
+
+
+def embed_texts(oai: OpenAI, gate: RateGate, texts: List[str]) -> List[List[float]]:
+    for attempt in range(MAX_RETRIES):
+        gate.wait()
+        try:
+            raw = oai.embeddings.with_raw_response.create(model=EMBED_MODEL, input=texts)
+            gate.observe(raw.headers)
+            return [d.embedding for d in raw.parse().data]
+        except RateLimitError as e:
+            delay = retry_delay(e.response.headers, attempt)
+            gate.hold(delay)
+            print(f"  ⏳ 429 from embeddings, backing off {delay:.1f}s (attempt {attempt+1}/{MAX_RETRIES})")
+        except (APIConnectionError, APITimeoutError, InternalServerError) as e:
+            delay = retry_delay(None, attempt)
+            print(f"  ⚠ Embedding request failed ({type(e).__name__}), retrying in {delay:.1f}s")
+            time.sleep(delay)
+    raise RuntimeError(f"Embedding request failed after {MAX_RETRIES} attempts")
+
+
+def with_retries(fn, label: str):
+    for attempt in range(MAX_RETRIES):
+        try:
+            return fn()
+        except Exception as e:
+            if attempt == MAX_RETRIES - 1:
+                raise RuntimeError(f"{label} failed after {MAX_RETRIES} attempts: {e}") from e
+            delay = retry_delay(None, attempt)
+            print(f"  ⚠ {label} failed (attempt {attempt+1}/{MAX_RETRIES}), retrying in {delay:.1f}s...")
+            time.sleep(delay)
 
 
-def collect_clean_files() -> list[pathlib.Path]:
-    CLEAN_DIR.mkdir(parents=True, exist_ok=True)
-    return sorted(
-        p for p in CLEAN_DIR.glob("*.txt")
-        if p.name not in {OUT_TXT.name, OUT_JSONL.name}
-    )
+def read_checkpoint() -> dict:
+    try:
+        return json.loads(CHECKPOINT.read_text(encoding="utf-8"))
+    except Exception:
+        return {}
 
 
-def load_text(p: pathlib.Path) -> str:
-    txt = p.read_text(encoding="utf-8")
-    return txt.replace("[countdown_timer]", " ").strip()
+def write_checkpoint(state: dict):
+    tmp = CHECKPOINT.with_name(CHECKPOINT.name + ".tmp")
+    tmp.write_text(json.dumps({**state, "updated": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())}),
+                   encoding="utf-8")
+    tmp.replace(CHECKPOINT)
 
 
 # --- MAIN ---
 def main():
     ap = argparse.ArgumentParser()
-    ap.add_argument("--recreate", action="store_true", help="Recreate collection in Qdrant")
+    ap.add_argument("--recreate", action="store_true",
+                    help="Full rebuild: re-embed every chunk instead of reusing stored vectors")
+    ap.add_argument("--in-place", action="store_true",
+                    help="Sync the live collection directly instead of building a new version")
+    ap.add_argument("--keep", type=int, default=KEEP_VERSIONS,
+                    help="Versioned collections to keep after a swap (for rollback)")
+    ap.add_argument("--rollback", action="store_true",
+                    help="Point the alias at the previous version and exit")
+    ap.add_argument("--emb-dtype", choices=["float32", "float16"], default="float32",
+                    help="dtype of the stored embedding artifact (float16 halves the file)")
+    ap.add_argument("--resume", action="store_true",
+                    help="Continue the build recorded in the checkpoint after a failed run")
+    ap.add_argument("--workers", type=int, default=4, help="Worker threads for embedding + upsert requests")
+    ap.add_argument("--embed-concurrency", type=int, default=2, help="Embedding requests in flight at once")
+    ap.add_argument("--jobs", type=int, default=1, help="Split uncached files in N worker processes")
     args = ap.parse_args()
 
+    if args.rollback:
+        client = QdrantClient(url=QDRANT_URL, api_key=QDRANT_API_KEY, timeout=120)
+        if not rollback(client):
+            raise SystemExit(1)
+        return
+
     if not OPENAI_API_KEY:
         raise RuntimeError("OPENAI_API_KEY missing in .env")
 
-    files = collect_clean_files()
-    if not files:
+    # Step 1: Chunk all files (unchanged files come from the chunk cache)
+    all_docs, per_file_counts, stats = build_chunks(jobs=args.jobs)
+    if not per_file_counts and not stats["skipped"]:
         print("No clean .txt files in data/clean. Run web_scraping.py first.")
         return
-
-    splitter = get_splitter()
-    all_docs: List[Document] = []
-    per_file_counts = []
-
-    # Step 1: Chunk all files
-    for f in files:
-        slug = f.stem
-        url = slug_to_url(slug)
-        title = guess_title(slug)
-
-        text = load_text(f)
-        if len(text.split()) < MIN_WORDS:
-            print(f"Skip {f.name}: too few words ({len(text.split())}).")
-            continue
-
-        docs = splitter.create_documents(
-            [text],
-            metadatas=[{
-                "url": url,
-                "title": title,
-                "slug": slug,
-                "domain": BASE_DOMAIN,
-                "is_active": True,
-                "source": "web",
-            }],
-        )
-        all_docs.extend(docs)
-        per_file_counts.append((f.name, len(docs), len(text.split())))
-
     if not all_docs:
         print("No chunks produced. Check your cleaned files.")
         return
 
     # Step 2: Write chunks to disk
-    with OUT_TXT.open("w", encoding="utf-8") as ftxt:
-        ftxt.write(f"# chunks from {BASE_URL} and related pages\n")
-        ftxt.write(f"# splitter = {'token' if USE_TOKENS else 'char'} | "
-                   f"size={TOKEN_CHUNK_SIZE if USE_TOKENS else CHAR_CHUNK_SIZE} | "
-                   f"overlap={TOKEN_CHUNK_OVERLAP if USE_TOKENS else CHAR_CHUNK_OVERLAP}\n\n")
-        for i, d in enumerate(all_docs, start=1):
-            meta = d.metadata
-            content = d.page_content
-            ftxt.write(f"----- chunk {i}/{len(all_docs)} -----\n")
-            ftxt.write(f"url: {meta.get('url')} | title: {meta.get('title')}\n")
-            ftxt.write(f"slug: {meta.get('slug')} | chars: {len(content)}\n\n")
-            ftxt.write(content + "\n\n")
-
-    with OUT_JSONL.open("w", encoding="utf-8") as jf:
-        for d in all_docs:
-            meta = d.metadata
-            jf.write(json.dumps({
-                "url": meta.get("url"),
-                "title": meta.get("title"),
-                "slug": meta.get("slug"),
-                "domain": meta.get("domain"),
-                "is_active": meta.get("is_active"),
-                "source": meta.get("source"),
-                "text": d.page_content,
-            }, ensure_ascii=False) + "\n")
-
+    write_outputs(all_docs)
     print(f"Wrote {len(all_docs)} chunks → {OUT_TXT.resolve()}")
     print(f"Also JSONL → {OUT_JSONL.resolve()}")
+    print(f"Files: {stats['files']} ({stats['cached']} from cache, {stats['split']} split)")
     for name, n_chunks, words in per_file_counts:
         print(f" - {name}: {words} words → {n_chunks} chunks")
 
-    # Step 3: Push to Qdrant
+    # Step 3: Prepare the Qdrant collection and read what's already there
     client = QdrantClient(
         url=QDRANT_URL, 
         api_key=QDRANT_API_KEY,
         timeout=120
     )
 
-    if args.recreate:
-        try:
-            client.delete_collection(COLLECTION)
-        except Exception:
-            pass
-        client.recreate_collection(
-            collection_name=COLLECTION,
-            vectors_config=qm.VectorParams(size=1536, distance=qm.Distance.COSINE),
-        )
+    live = resolve_alias(client, COLLECTION)
+    if live is None and client.collection_exists(COLLECTION):
+        live = COLLECTION                        # legacy plain collection, replaced by an alias on swap
+    # vectors already stored in the live collection can be reused (not for --recreate)
+    existing_live = scroll_existing(client, live) if live and not args.recreate else {}
+
+    ckpt = read_checkpoint()
+    if ckpt.get("alias") != COLLECTION:
+        ckpt = {}
+    if args.resume and ckpt and client.collection_exists(ckpt["target"]):
+        target = ckpt["target"]
+        existing = scroll_existing(client, target)
+        print(f"\nResuming '{target}' from checkpoint: {len(existing)} points already confirmed.")
     else:
-        collections = [c.name for c in client.get_collections().collections]
-        if COLLECTION not in collections:
-            client.create_collection(
-                collection_name=COLLECTION,
-                vectors_config=qm.VectorParams(size=1536, distance=qm.Distance.COSINE),
+        if ckpt and ckpt["target"] != live and client.collection_exists(ckpt["target"]):
+            print(f"Dropping unfinished build '{ckpt['target']}' (use --resume to continue it instead).")
+            client.delete_collection(ckpt["target"])
+        if args.in_place and live:
+            target = live
+            # what is live decides the orphans even with --recreate (its vectors are just not reused)
+            existing = existing_live if not args.recreate else scroll_existing(client, live, with_vectors=False)
+            print(f"\nSyncing live collection '{target}' in place.")
+        else:
+            target = version_name(COLLECTION)
+            create_version(client, target)
+            existing = {}
+            print(f"\nBuilding new version '{target}' (live: {live or 'none'}).")
+
+    # Desired state: one point per (slug, chunk text)
+    desired = {}
+    for d in all_docs:
+        desired.setdefault(point_id(d.metadata["slug"], d.metadata["content_hash"]), d)
+
+    def payload_of(d: Document) -> dict:
+        return {"page_content": d.page_content, "metadata": d.metadata}
+
+    # --recreate re-embeds and rewrites every point, including ones already in an in-place target
+    new_ids = [pid for pid in desired if args.recreate or pid not in existing]
+    changed_ids = [] if args.recreate else [
+        pid for pid in desired if pid in existing and existing[pid][0] != payload_of(desired[pid])
+    ]
+    orphan_ids = [pid for pid in existing if pid not in desired]
+    print(f"Sync: {len(new_ids)} new, {len(changed_ids)} metadata changes, "
+          f"{len(desired) - len(new_ids) - len(changed_ids)} unchanged, {len(orphan_ids)} orphaned.")
+
+    # Step 4: Vectors we already have (artifact, then existing points); embed only the rest
+    store = None if args.recreate else load_embeddings(model=EMBED_MODEL, chunker=chunker_settings())
+    from_qdrant = {}
+    for payload, vec in list(existing_live.values()) + list(existing.values()):
+        if vec is not None:
+            from_qdrant.setdefault(chunk_hash(payload.get("page_content", "")), vec)
+
+    vectors = {}                                 # content_hash -> vector, unique texts only
+    texts_by_hash = {}
+    reused_artifact = reused_qdrant = 0
+    for d in desired.values():
+        h = d.metadata["content_hash"]
+        if h in vectors or h in texts_by_hash:
+            continue
+        if store is not None and h in store:
+            vectors[h] = store.get(h)
+            reused_artifact += 1
+        elif h in from_qdrant:
+            vectors[h] = from_qdrant[h]
+            reused_qdrant += 1
+        else:
+            texts_by_hash[h] = d.page_content
+    print(f"Embeddings: {reused_artifact} from artifact, {reused_qdrant} from Qdrant, "
+          f"{len(texts_by_hash)} to embed ({len(all_docs)} chunks, {len(vectors) + len(texts_by_hash)} unique).")
+
+    def save_artifact():
+        order = [h for h in dict.fromkeys(d.metadata["content_hash"] for d in all_docs) if h in vectors]
+        if order:
+            save_embeddings(order, np.stack([vectors[h] for h in order]), EMBED_MODEL, chunker_settings(),
+                            dtype=args.emb_dtype)
+
+    # Step 5: Pipeline: embedding requests and Qdrant upserts overlap on one bounded pool.
+    # Points whose vectors are known go out immediately; the rest follow each embedding batch.
+    state = {"alias": COLLECTION, "target": target, "live": live, "total": len(new_ids), "confirmed": 0}
+    write_checkpoint(state)
+    state_lock = threading.Lock()
+
+    def upsert(pids: List[str]):
+        points = [
+            qm.PointStruct(
+                id=pid,
+                vector=np.asarray(vectors[desired[pid].metadata["content_hash"]], dtype=np.float32).tolist(),
+                payload=payload_of(desired[pid]),
             )
-
-    emb = OpenAIEmbeddings(model="text-embedding-3-small", api_key=OPENAI_API_KEY)
-    vs = QdrantVectorStore(client=client, collection_name=COLLECTION, embedding=emb)
-    
-    # Upload in batches with retry logic
-    batch_size = 10
-    print(f"\nUploading {len(all_docs)} chunks in batches of {batch_size}...")
-    
-    import time
-    for i in range(0, len(all_docs), batch_size):
-        batch = all_docs[i:i+batch_size]
-        batch_num = i//batch_size + 1
-        total_batches = (len(all_docs)-1)//batch_size + 1
-        
-        max_retries = 3
-        for attempt in range(max_retries):
+            for pid in pids
+        ]
+        with_retries(lambda: client.upsert(collection_name=target, points=points, wait=True),
+                     f"Upsert of {len(points)} points")
+        with state_lock:
+            state["confirmed"] += len(pids)
+            write_checkpoint(state)
+            print(f"  ✓ Upserted {state['confirmed']}/{state['total']} points")
+
+    pids_by_hash = defaultdict(list)
+    for pid in new_ids:
+        pids_by_hash[desired[pid].metadata["content_hash"]].append(pid)
+
+    oai = OpenAI(api_key=OPENAI_API_KEY, max_retries=0, timeout=120)
+    gate = RateGate()
+    batches = token_batches(list(texts_by_hash.items()), tiktoken.get_encoding("cl100k_base"))
+    upserts, in_flight = [], deque()
+    failure = None
+    t0 = time.time()
+
+    with ThreadPoolExecutor(max_workers=max(2, args.workers)) as pool:
+        def queue_upserts(pids: List[str]):
+            for i in range(0, len(pids), UPSERT_BATCH):
+                upserts.append(pool.submit(upsert, pids[i:i+UPSERT_BATCH]))
+
+        def collect(future, batch):
+            out = future.result()
+            for (h, _), v in zip(batch, out):
+                vectors[h] = v
+            print(f"  ✓ Embedded {len(batch)} chunks")
+            queue_upserts([pid for h, _ in batch for pid in pids_by_hash[h]])
+
+        queue_upserts([pid for pid in new_ids if desired[pid].metadata["content_hash"] in vectors])
+        try:
+            for batch in batches:
+                while len(in_flight) >= max(1, args.embed_concurrency):
+                    collect(*in_flight.popleft())
+                in_flight.append((pool.submit(embed_texts, oai, gate, [t for _, t in batch]), batch))
+            while in_flight:
+                collect(*in_flight.popleft())
+        except Exception as e:
+            failure = e
+            for future, _ in in_flight:
+                future.cancel()
+        for future in upserts:
             try:
-                vs.add_documents(batch)
-                print(f"  ✓ Batch {batch_num}/{total_batches} ({len(batch)} chunks)")
-                time.sleep(2)
-                break
+                future.result()
             except Exception as e:
-                if attempt < max_retries - 1:
-                    print(f"  ⚠ Batch {batch_num} failed (attempt {attempt+1}/{max_retries}), retrying in 5s...")
-                    time.sleep(5)
-                else:
-                    print(f"  ✗ Batch {batch_num} failed after {max_retries} attempts: {e}")
-                    print(f"\n⚠️  Partial upload completed. {i} chunks uploaded successfully.")
-                    print(f"Run the script again WITHOUT --recreate to continue.")
-                    return
-
-    cnt = client.count(collection_name=COLLECTION, exact=True).count
-    print(f"\n✓ Successfully uploaded {len(all_docs)} chunks. Collection '{COLLECTION}' now has {cnt} points.")
+                failure = failure or e
+
+    save_artifact()   # keep every vector we paid for, even on failure
+    print(f"Embeddings artifact → {EMB_NPY.resolve()} ({args.emb_dtype})")
+    if failure is not None:
+        print(f"\n✗ {failure}")
+        print(f"⚠️  {state['confirmed']}/{state['total']} points confirmed in '{target}'. The alias was not moved.")
+        print("Run again with --resume to continue from the checkpoint.")
+        raise SystemExit(1)
+    print(f"Uploaded {len(new_ids)} points in {time.time() - t0:.1f}s.")
+
+    for pid in changed_ids:
+        with_retries(lambda: client.overwrite_payload(collection_name=target, payload=payload_of(desired[pid]),
+                                                      points=[pid]),
+                     f"Payload update {pid}")
+
+    for i in range(0, len(orphan_ids), 256):
+        batch = orphan_ids[i:i+256]
+        with_retries(lambda: client.delete(collection_name=target, points_selector=qm.PointIdsList(points=batch)),
+                     f"Delete {len(batch)} orphans")
+
+    cnt = client.count(collection_name=target, exact=True).count
+    if cnt != len(desired):
+        print(f"\n✗ '{target}' has {cnt} points, expected {len(desired)}. Alias not moved.")
+        raise SystemExit(1)
+    if target != live:
+        swap_alias(client, COLLECTION, target)
+        print(f"\n✓ Alias '{COLLECTION}' → {target} (was {live or 'none'}).")
+        pruned = prune_versions(client, COLLECTION, args.keep)
+        if pruned:
+            print(f"Pruned old versions: {', '.join(pruned)}")
+    CHECKPOINT.unlink(missing_ok=True)
+    print(f"\n✓ Synced {len(desired)} chunks. '{COLLECTION}' → '{target}' now has {cnt} points.")
     print("Sample metadata:", all_docs[0].metadata)
 
-
 if __name__ == "__main__":
     main()
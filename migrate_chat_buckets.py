@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+"""
+Move transcripts from the old layout (one `messages` array per chat_sessions
+document) to session headers + chat_messages buckets (api/chat_buckets.py).
+
+For each session that still has a `messages` array:
+  1. its m messages are numbered first_seq-m .. first_seq-1, so they sort
+     before anything the new code has already written for the session;
+  2. any copies a previous interrupted run left in those buckets are pulled,
+     then the messages are pushed (so re-running is safe);
+  3. the header drops `messages` and gets the new first_seq, but only if the
+     array is still the one that was copied (otherwise it is retried).
+
+Run after deploying the API that writes buckets; safe to run again.
+
+    python migrate_chat_buckets.py [--dry-run] [--limit N] [--bucket-size 50]
+"""
+import os
+import argparse
+from datetime import datetime, timedelta, timezone
+
+from dotenv import load_dotenv
+from pymongo import MongoClient, UpdateOne
+
+from api.chat_buckets import BUCKET_SIZE, bucket_of, bucket_updates, ensure_bucket_indexes
+
+load_dotenv()
+
+MONGO_URI = os.getenv("MONGO_URI")
+MONGO_DB = os.getenv("MONGO_DB", "enatega")
+MONGO_COL = os.getenv("MONGO_COL", "chat_sessions")
+MONGO_MSG_COL = os.getenv("MONGO_MSG_COL", "chat_messages")
+TTL_DAYS = int(os.getenv("CHAT_TTL_DAYS", "7"))
+
+MAX_ATTEMPTS = 5
+
+
+def migrate_session(sessions, buckets, session_id: str, bucket_size: int, dry_run: bool) -> int:
+    """Move one session's messages into buckets; returns how many were moved (-1 if it kept changing)."""
+    for _ in range(MAX_ATTEMPTS):
+        doc = sessions.find_one({"session_id": session_id}, {"messages": 1, "first_seq": 1, "expireAt": 1})
+        if not doc or "messages" not in doc:
+            return 0
+        messages = doc["messages"] or []
+        old_first = doc.get("first_seq", 0)
+        first = old_first - len(messages)
+        if dry_run:
+            return len(messages)
+
+        if messages:
+            expire_at = doc.get("expireAt") or datetime.now(timezone.utc) + timedelta(days=TTL_DAYS)
+            span = {"$gte": first, "$lt": old_first}
+            cleanup = [
+                UpdateOne({"session_id": session_id, "bucket": b}, {"$pull": {"messages": {"seq": span}}})
+                for b in range(bucket_of(first, bucket_size), bucket_of(old_first - 1, bucket_size) + 1)
+            ]
+            buckets.bulk_write(cleanup, ordered=True)
+            buckets.bulk_write(bucket_updates(session_id, first, messages, expire_at, bucket_size), ordered=True)
+
+        res = sessions.update_one(
+            {"_id": doc["_id"], "messages": {"$size": len(messages)}, "first_seq": doc.get("first_seq")},
+            {"$unset": {"messages": ""}, "$set": {"first_seq": first}, "$max": {"message_count": 0}},
+        )
+        if res.modified_count:
+            return len(messages)
+        # The array changed under us (an old API instance still writing): the copies are pulled next round
+    return -1
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Migrate chat_sessions message arrays to bucket documents")
+    ap.add_argument("--dry-run", action="store_true", help="only count what would move")
+    ap.add_argument("--limit", type=int, default=0, help="stop after this many sessions")
+    ap.add_argument("--bucket-size", type=int, default=int(os.getenv("CHAT_BUCKET_SIZE", str(BUCKET_SIZE))))
+    args = ap.parse_args()
+
+    if not MONGO_URI:
+        print("Error: MONGO_URI environment variable is not set")
+        exit(1)
+
+    client = MongoClient(MONGO_URI)
+    db = client[MONGO_DB]
+    sessions, buckets = db[MONGO_COL], db[MONGO_MSG_COL]
+    if not args.dry_run:
+        ensure_bucket_indexes(buckets)
+
+    legacy = sessions.find({"messages": {"$exists": True}}, {"_id": 0, "session_id": 1})
+    if args.limit:
+        legacy = legacy.limit(args.limit)
+
+    done = moved = stuck = 0
+    for row in legacy:
+        n = migrate_session(sessions, buckets, row["session_id"], args.bucket_size, args.dry_run)
+        if n < 0:
+            stuck += 1
+            print(f"  {row['session_id']}: still changing after {MAX_ATTEMPTS} attempts, skipped")
+            continue
+        done += 1
+        moved += n
+        if done % 500 == 0:
+            print(f"  {done} sessions, {moved} messages")
+
+    verb = "would move" if args.dry_run else "moved"
+    print(f"{done} sessions, {verb} {moved} messages into {MONGO_MSG_COL} (bucket size {args.bucket_size})"
+          + (f"; {stuck} skipped" if stuck else ""))
+    client.close()
+
+
+if __name__ == "__main__":
+    main()
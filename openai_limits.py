@@ -0,0 +1,61 @@
+# openai_limits.py
+"""
+Rate-limit handling shared by the OpenAI callers (ingest_qdrant.py embeddings,
+rewrite_texts.py chat completions): server-advised retry delays and a gate that
+makes every worker thread pause after a 429 or an exhausted quota.
+"""
+import re, time, random, threading
+
+
+def parse_duration(value) -> float:
+    """Seconds from OpenAI rate-limit headers: '20ms', '1s', '6m0s', '1h2m3.5s', or a bare number."""
+    if value is None:
+        return 0.0
+    value = str(value).strip()
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    units = {"h": 3600, "m": 60, "s": 1, "ms": 0.001}
+    return sum(float(n) * units[u] for n, u in re.findall(r"(\d+(?:\.\d+)?)(ms|h|m|s)", value))
+
+
+def retry_delay(headers, attempt: int) -> float:
+    """Server-advised wait if present, else exponential backoff with jitter."""
+    headers = headers or {}
+    if headers.get("retry-after-ms"):
+        return float(headers["retry-after-ms"]) / 1000
+    if headers.get("retry-after"):
+        return parse_duration(headers["retry-after"])
+    reset = max(parse_duration(headers.get("x-ratelimit-reset-requests")),
+                parse_duration(headers.get("x-ratelimit-reset-tokens")))
+    if reset:
+        return reset
+    return min(60.0, 2 ** attempt) * (0.5 + random.random() / 2)
+
+
+class RateGate:
+    """Shared by the request workers: after a 429 or an exhausted quota everybody waits."""
+
+    def __init__(self):
+        self._until = 0.0
+        self._lock = threading.Lock()
+
+    def wait(self):
+        while True:
+            with self._lock:
+                delay = self._until - time.monotonic()
+            if delay <= 0:
+                return
+            time.sleep(delay)
+
+    def hold(self, seconds: float):
+        with self._lock:
+            self._until = max(self._until, time.monotonic() + seconds)
+
+    def observe(self, headers):
+        """Pause before the next request when the response says the quota is used up."""
+        for kind in ("requests", "tokens"):
+            remaining = headers.get(f"x-ratelimit-remaining-{kind}")
+            if remaining is not None and remaining.strip() in {"0", "0.0"}:
+                self.hold(parse_duration(headers.get(f"x-ratelimit-reset-{kind}")))
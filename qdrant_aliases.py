@@ -0,0 +1,64 @@
+# qdrant_aliases.py
+"""
+Blue/green collections behind a Qdrant alias.
+
+COLLECTION_NAME is an alias. Each ingest builds `<alias>_v<YYYYmmddHHMMSS>` and
+then repoints the alias in one update_collection_aliases call, so queries
+never see a half-filled collection. Older versions are kept for rollback.
+"""
+import time
+from typing import List, Optional
+
+from qdrant_client import QdrantClient
+from qdrant_client.http import models as qm
+
+
+def version_name(alias: str) -> str:
+    return f"{alias}_v{time.strftime('%Y%m%d%H%M%S', time.gmtime())}"
+
+
+def resolve_alias(client: QdrantClient, alias: str) -> Optional[str]:
+    """Collection the alias points at, or None if `alias` is not an alias."""
+    for a in client.get_aliases().aliases:
+        if a.alias_name == alias:
+            return a.collection_name
+    return None
+
+
+def resolve_target(client: QdrantClient, name: str) -> str:
+    """Concrete collection behind `name` (itself if it's a plain collection or unknown)."""
+    try:
+        return resolve_alias(client, name) or name
+    except Exception:
+        return name
+
+
+def list_versions(client: QdrantClient, alias: str) -> List[str]:
+    """Versioned collections for this alias, oldest first (the timestamp suffix sorts)."""
+    prefix = f"{alias}_v"
+    return sorted(c.name for c in client.get_collections().collections
+                  if c.name.startswith(prefix) and c.name[len(prefix):].isdigit())
+
+
+def swap_alias(client: QdrantClient, alias: str, collection: str):
+    """Atomically point `alias` at `collection`. A legacy plain collection named `alias` is dropped first."""
+    current = resolve_alias(client, alias)
+    if current is None and client.collection_exists(alias):
+        print(f"'{alias}' is a plain collection; replacing it with an alias (brief gap while it is dropped)")
+        client.delete_collection(alias)
+    ops = []
+    if current is not None:
+        ops.append(qm.DeleteAliasOperation(delete_alias=qm.DeleteAlias(alias_name=alias)))
+    ops.append(qm.CreateAliasOperation(create_alias=qm.CreateAlias(collection_name=collection, alias_name=alias)))
+    client.update_collection_aliases(change_aliases_operations=ops)
+    return current
+
+
+def prune_versions(client: QdrantClient, alias: str, keep: int) -> List[str]:
+    """Delete all but the newest `keep` versions; never the one the alias points at."""
+    live = resolve_alias(client, alias)
+    versions = list_versions(client, alias)
+    doomed = [v for v in versions[:-keep] if v != live] if keep > 0 else [v for v in versions if v != live]
+    for name in doomed:
+        client.delete_collection(name)
+    return doomed
@@ -1,19 +1,42 @@
 # rewrite_texts.py
-import os, pathlib
+"""
+Restructure scraped page text (data/scraped/<slug>.txt, written by web_scraping.py)
+into headings + paragraphs for chunking (data/clean/<slug>.txt). Inputs are never
+modified; outputs are replaced atomically.
+
+Results are cached in data/clean/.rewrite_cache.json by (input hash, PROMPT_VERSION,
+model), so re-runs only pay for pages whose text, prompt or model changed.
+Requests run in a small thread pool with server-advised backoff on 429s.
+
+    python rewrite_texts.py [--only-changed] [--workers 4] [--dry-run]
+"""
+import os, json, time, hashlib, pathlib, argparse
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import tiktoken
 from dotenv import load_dotenv
-from openai import OpenAI
+from openai import OpenAI, RateLimitError, APIConnectionError, APITimeoutError, InternalServerError
+
+from openai_limits import RateGate, retry_delay
 
 # Load environment variables
 load_dotenv()
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
+REWRITE_MODEL = os.getenv("REWRITE_MODEL", "gpt-4o-mini")
 
-client = OpenAI(api_key=OPENAI_API_KEY)
+SRC_DIR = pathlib.Path("data/scraped")                # web_scraping.py output
+OUT_DIR = pathlib.Path("data/clean")                  # chunking / ingest input
+CACHE_PATH = OUT_DIR / ".rewrite_cache.json"
+CHANGED = pathlib.Path("data/raw/changed_slugs.json")   # written by web_scraping.py
+SKIP = {"chunks_all.txt", "chunks_enatega_home.txt"}
+MAX_RETRIES = 6
 
-CLEAN_DIR = pathlib.Path("data/clean")
+# USD per 1M tokens (input, output), for --dry-run only
+PRICES = {"gpt-4o-mini": (0.15, 0.60), "gpt-4o": (2.50, 10.00), "gpt-4.1-mini": (0.40, 1.60)}
 
-def rewrite_text(text: str, filename: str) -> str:
-    """Send text to OpenAI for structured rewriting (headings + paragraphs)."""
-    prompt = f"""
+# Bump PROMPT_VERSION whenever SYSTEM_PROMPT / PROMPT change: cached rewrites are then redone.
+PROMPT_VERSION = "1"
+SYSTEM_PROMPT = "You are a precise rewriting assistant."
+PROMPT = """
 You are a careful rewriting assistant.
 Your task is to restructure the following text into clean headings and paragraphs.
 
@@ -31,34 +54,144 @@ Here is the text (from {filename}):
 {text}
     """
 
-    resp = client.chat.completions.create(
-        model="gpt-4o-mini",
-        temperature=0.0,
-        messages=[
-            {"role": "system", "content": "You are a precise rewriting assistant."},
-            {"role": "user", "content": prompt}
-        ]
-    )
-    return resp.choices[0].message.content.strip()
+
+def cache_key(text: str, filename: str, model: str = REWRITE_MODEL) -> str:
+    input_hash = hashlib.sha256(f"{filename}\n{text}".encode("utf-8")).hexdigest()
+    return hashlib.sha256(f"{input_hash}:{PROMPT_VERSION}:{model}".encode()).hexdigest()[:32]
+
+
+def load_cache() -> dict:
+    try:
+        return json.loads(CACHE_PATH.read_text(encoding="utf-8"))
+    except Exception:
+        return {}
+
+
+def write_atomic(path: pathlib.Path, text: str):
+    tmp = path.with_name(path.name + ".tmp")
+    tmp.write_text(text, encoding="utf-8")
+    tmp.replace(path)
+
+
+def rewrite_text(client: OpenAI, gate: RateGate, text: str, filename: str) -> str:
+    """Send text to OpenAI for structured rewriting (headings + paragraphs)."""
+    for attempt in range(MAX_RETRIES):
+        gate.wait()
+        try:
+            raw = client.chat.completions.with_raw_response.create(
+                model=REWRITE_MODEL,
+                temperature=0.0,
+                messages=[
+                    {"role": "system", "content": SYSTEM_PROMPT},
+                    {"role": "user", "content": PROMPT.format(filename=filename, text=text)}
+                ]
+            )
+            gate.observe(raw.headers)
+            return raw.parse().choices[0].message.content.strip()
+        except RateLimitError as e:
+            delay = retry_delay(e.response.headers, attempt)
+            gate.hold(delay)
+            print(f"  ⏳ 429 on {filename}, backing off {delay:.1f}s (attempt {attempt+1}/{MAX_RETRIES})")
+        except (APIConnectionError, APITimeoutError, InternalServerError) as e:
+            delay = retry_delay(None, attempt)
+            print(f"  ⚠ {filename}: {type(e).__name__}, retrying in {delay:.1f}s")
+            time.sleep(delay)
+    raise RuntimeError(f"Rewrite of {filename} failed after {MAX_RETRIES} attempts")
+
+
+def estimate_cost(todo: list):
+    """Token counts with tiktoken; output is assumed to be about as long as the input text."""
+    try:
+        enc = tiktoken.encoding_for_model(REWRITE_MODEL)
+    except KeyError:
+        enc = tiktoken.get_encoding("o200k_base")
+    count = lambda s: len(enc.encode(s, disallowed_special=()))
+    overhead = count(SYSTEM_PROMPT) + count(PROMPT.format(filename="", text="")) + 11   # + chat framing
+    price_in, price_out = PRICES.get(REWRITE_MODEL, (0.0, 0.0))
+
+    total_in = total_out = 0
+    print(f"{'file':<50} {'in tok':>8} {'~out tok':>9}")
+    for f, text, _ in todo:
+        n_in, n_out = overhead + count(f.name) + count(text), count(text)
+        total_in += n_in
+        total_out += n_out
+        print(f"{f.name[:50]:<50} {n_in:>8} {n_out:>9}")
+    cost = total_in / 1e6 * price_in + total_out / 1e6 * price_out
+    print(f"\n{len(todo)} request(s) to {REWRITE_MODEL}: {total_in} input + ~{total_out} output tokens"
+          + (f" ≈ ${cost:.4f}" if REWRITE_MODEL in PRICES else " (no price on file for this model)"))
+
 
 def main():
-    files = sorted(
-        p for p in CLEAN_DIR.glob("*.txt")
-        if p.name not in {"chunks_all.txt", "chunks_enatega_home.txt"}
-    )
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--only-changed", action="store_true",
+                    help=f"Rewrite only the slugs the last scrape changed ({CHANGED})")
+    ap.add_argument("--workers", type=int, default=4, help="Concurrent rewrite requests")
+    ap.add_argument("--dry-run", action="store_true", help="Estimate tokens and cost of the uncached rewrites; no API calls")
+    args = ap.parse_args()
+
+    files = sorted(p for p in SRC_DIR.glob("*.txt") if p.name not in SKIP)
+    if not files:
+        print(f"No scraped .txt files in {SRC_DIR}. Run web_scraping.py first.")
+        return
+    if args.only_changed:
+        try:
+            changed = set(json.loads(CHANGED.read_text(encoding="utf-8")).get("changed") or [])
+        except FileNotFoundError:
+            print(f"{CHANGED} not found; rewriting everything.")
+        else:
+            files = [f for f in files if f.stem in changed]
+            print(f"{len(files)} changed file(s) to rewrite.")
 
+    cache = load_cache()
+    todo, hits = [], []
     for f in files:
         text = f.read_text(encoding="utf-8").strip()
         if not text:
             print(f"Skip {f.name}: empty file.")
             continue
+        key = cache_key(text, f.name)
+        if key in cache:
+            hits.append((f, key))
+        else:
+            todo.append((f, text, key))
+    print(f"{len(hits)} file(s) from cache, {len(todo)} to rewrite with {REWRITE_MODEL}.")
+
+    if args.dry_run:
+        estimate_cost(todo)
+        return
+
+    OUT_DIR.mkdir(parents=True, exist_ok=True)
+    for f, key in hits:
+        out = OUT_DIR / f.name
+        if not out.exists() or out.read_text(encoding="utf-8") != cache[key]["text"]:
+            write_atomic(out, cache[key]["text"])
+    if not todo:
+        return
 
-        print(f"Rewriting {f.name} …")
-        rewritten = rewrite_text(text, f.name)
+    client = OpenAI(api_key=OPENAI_API_KEY)
+    gate = RateGate()
+    failed = []
+    with ThreadPoolExecutor(max_workers=max(1, args.workers)) as pool:
+        futures = {pool.submit(rewrite_text, client, gate, text, f.name): (f, key) for f, text, key in todo}
+        for fut in as_completed(futures):
+            f, key = futures[fut]
+            try:
+                rewritten = fut.result()
+            except Exception as e:
+                print(f"Rewrite failed for {f.name}:", e)
+                failed.append(f.name)
+                continue
+            write_atomic(OUT_DIR / f.name, rewritten)
+            cache[key] = {"slug": f.stem, "text": rewritten}
+            # keep only the newest entry per page; saved as we go so an interrupted run keeps its work
+            for k in [k for k, v in cache.items() if v["slug"] == f.stem and k != key]:
+                del cache[k]
+            write_atomic(CACHE_PATH, json.dumps(cache, ensure_ascii=False, indent=1, sort_keys=True))
+            print(f" → Wrote {OUT_DIR / f.name}")
 
-        # Overwrite the same file
-        f.write_text(rewritten, encoding="utf-8")
-        print(f" → Updated {f.name} with rewritten version.")
+    if failed:
+        print(f"{len(failed)} file(s) failed: {', '.join(sorted(failed))}")
+        raise SystemExit(1)
 
 if __name__ == "__main__":
     main()
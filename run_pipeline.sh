@@ -1,17 +1,17 @@
 #!/usr/bin/env bash
 set -euo pipefail
 
-echo "1) Scrape"
+echo "1) Scrape (unchanged pages are skipped; see data/raw/changed_slugs.json)"
 python web_scraping.py
 
-echo "2) Rewrite (overwrite files)"
+echo "2) Rewrite scraped text into data/clean (cached rewrites are reused)"
 python rewrite_texts.py
 
 echo "3) Chunk (writes chunks_all.*)"
 python chunking.py
 
 echo "4) Ingest to Qdrant Cloud"
-python ingest_qdrant.py --recreate
+python ingest_qdrant.py
 
 echo "5) Ensure Qdrant payload indexes"
 python ensure_indexes.py
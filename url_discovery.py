@@ -0,0 +1,179 @@
+# url_discovery.py
+"""
+Discover pages to scrape from the site's sitemaps instead of a hand-kept URL list.
+
+Reads sitemap.xml / sitemap-index files (nested, .xml.gz ok), canonicalizes and
+de-duplicates the URLs, applies include/exclude patterns and orders the result
+by per-section priority (then newest lastmod first). web_scraping.py feeds the
+list to its render workers in that order.
+
+    python url_discovery.py [--sitemap URL ...] [--include RE] [--exclude RE]
+"""
+import re, gzip, argparse, asyncio
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional, Tuple
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
+from xml.etree import ElementTree as ET
+
+import httpx
+
+BASE_DOMAIN = "enatega.com"
+SITEMAPS = [f"https://{BASE_DOMAIN}/sitemap_index.xml"]
+
+# a URL is kept if it matches any INCLUDE pattern and no EXCLUDE pattern (regex on the path)
+INCLUDE = [r".*"]
+EXCLUDE = [
+    r"^/(blog|tag|category|author|feed|wp-json|wp-content|wp-admin|cart|checkout|my-account)(/|$)",
+    r"/page/\d+/?$",
+    r"/feed/?$",
+    r"\.(pdf|jpe?g|png|gif|svg|webp|zip|xml|txt)$",
+]
+
+# first matching section wins; order of the render queue
+SECTION_PRIORITIES: List[Tuple[str, float]] = [
+    (r"^/$", 1.0),
+    (r"^/(multi-vendor-features|features|pricing|lumi-super-ai-app)/", 0.9),
+    (r"-solution/$", 0.9),                        # use cases
+    (r"^/enatega-vs-", 0.7),                      # competitor comparisons
+    (r"^/multi-vendor-doc/", 0.6),
+    (r".*", 0.5),                                 # case studies and everything else
+]
+
+TRACKING_PARAMS = re.compile(r"^(utm_\w+|gclid|fbclid|mc_cid|mc_eid|ref|_ga)$", re.I)
+MAX_SITEMAP_DEPTH = 3
+
+
+@dataclass
+class PageEntry:
+    url: str
+    priority: float
+    lastmod: str = ""
+
+
+def _bare(host: str) -> str:
+    host = (host or "").lower()
+    return host[4:] if host.startswith("www.") else host
+
+
+def canonical_url(url: str, domain: Optional[str] = BASE_DOMAIN) -> Optional[str]:
+    """
+    Bare host (www. dropped), no fragment or tracking params, trailing slash on page paths.
+    None if the URL is not on `domain` (domain=None accepts any host; its scheme and port are kept).
+    """
+    parts = urlsplit(url.strip())
+    host = _bare(parts.hostname)
+    if not host or (domain is not None and host != _bare(domain)):
+        return None
+    scheme = "https" if domain is not None else (parts.scheme or "https")
+    netloc = host if parts.port is None or domain is not None else f"{host}:{parts.port}"
+    path = re.sub(r"/{2,}", "/", parts.path or "/")
+    if not path.endswith("/") and "." not in path.rsplit("/", 1)[-1]:
+        path += "/"
+    query = urlencode([(k, v) for k, v in parse_qsl(parts.query, keep_blank_values=True)
+                       if not TRACKING_PARAMS.match(k)])
+    return urlunsplit((scheme, netloc, path, query, ""))
+
+
+def section_priority(path: str) -> float:
+    for pattern, prio in SECTION_PRIORITIES:
+        if re.search(pattern, path):
+            return prio
+    return 0.5
+
+
+def _local(tag: str) -> str:
+    return tag.rsplit("}", 1)[-1]
+
+
+def parse_sitemap(data: bytes) -> Tuple[List[str], List[Tuple[str, str]]]:
+    """Returns (child sitemap URLs, [(page URL, lastmod)])."""
+    if data[:2] == b"\x1f\x8b":
+        data = gzip.decompress(data)
+    root = ET.fromstring(data)
+    children, pages = [], []
+    for node in root:
+        fields = {_local(c.tag): (c.text or "").strip() for c in node}
+        loc = fields.get("loc")
+        if not loc:
+            continue
+        if _local(root.tag) == "sitemapindex":
+            children.append(loc)
+        else:
+            pages.append((loc, fields.get("lastmod", "")))
+    return children, pages
+
+
+async def crawl_sitemaps(http: httpx.AsyncClient, roots: Iterable[str]) -> List[Tuple[str, str]]:
+    """Fetch sitemap indexes breadth-first (children concurrently); every sitemap fetched once."""
+    seen, pages = set(), []
+    level = [u for u in roots]
+    for _ in range(MAX_SITEMAP_DEPTH + 1):
+        level = [u for u in dict.fromkeys(level) if u not in seen]
+        if not level:
+            break
+        seen.update(level)
+        responses = await asyncio.gather(*(http.get(u) for u in level), return_exceptions=True)
+        nxt = []
+        for url, r in zip(level, responses):
+            if isinstance(r, Exception) or r.status_code != 200:
+                print(f"Sitemap {url} unavailable:", r if isinstance(r, Exception) else r.status_code)
+                continue
+            try:
+                children, found = parse_sitemap(r.content)
+            except ET.ParseError as e:
+                print(f"Sitemap {url} is not valid XML:", e)
+                continue
+            nxt.extend(children)
+            pages.extend(found)
+        level = nxt
+    return pages
+
+
+def select_pages(pages: Iterable[Tuple[str, str]], include: List[str] = INCLUDE, exclude: List[str] = EXCLUDE,
+                 domain: str = BASE_DOMAIN) -> List[PageEntry]:
+    """Canonicalize, filter, de-duplicate (newest lastmod wins) and sort by priority."""
+    inc = [re.compile(p) for p in include]
+    exc = [re.compile(p) for p in exclude]
+    best: Dict[str, PageEntry] = {}
+    for loc, lastmod in pages:
+        url = canonical_url(loc, domain)
+        if not url:
+            continue
+        path = urlsplit(url).path
+        if not any(p.search(path) for p in inc) or any(p.search(path) for p in exc):
+            continue
+        prev = best.get(url)
+        if prev is None or lastmod > prev.lastmod:
+            best[url] = PageEntry(url, section_priority(path), lastmod)
+    # newest first within a priority band (ISO dates sort as strings); sorts are stable
+    entries = sorted(best.values(), key=lambda e: e.url)
+    entries.sort(key=lambda e: e.lastmod, reverse=True)
+    entries.sort(key=lambda e: e.priority, reverse=True)
+    return entries
+
+
+async def discover(sitemaps: List[str] = SITEMAPS, include: List[str] = INCLUDE, exclude: List[str] = EXCLUDE,
+                   domain: str = BASE_DOMAIN, http: Optional[httpx.AsyncClient] = None) -> List[PageEntry]:
+    if http is None:
+        async with httpx.AsyncClient(follow_redirects=True, timeout=20) as client:
+            return await discover(sitemaps, include, exclude, domain, client)
+    return select_pages(await crawl_sitemaps(http, sitemaps), include, exclude, domain)
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--sitemap", action="append", help="Sitemap or sitemap index URL (repeatable)")
+    ap.add_argument("--include", action="append", help="Regex on the URL path to keep (repeatable)")
+    ap.add_argument("--exclude", action="append", help="Regex on the URL path to drop (added to defaults)")
+    ap.add_argument("--domain", default=BASE_DOMAIN)
+    args = ap.parse_args()
+
+    entries = asyncio.run(discover(args.sitemap or SITEMAPS, args.include or INCLUDE,
+                                   EXCLUDE + (args.exclude or []), args.domain))
+    for e in entries:
+        print(f"{e.priority:.1f}  {e.lastmod[:10]:<10}  {e.url}")
+    print(f"\n{len(entries)} pages")
+
+
+if __name__ == "__main__":
+    main()
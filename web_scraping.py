@@ -1,128 +1,104 @@
 # web_scraping.py
-import pathlib, re, textwrap
+import re, html as htmllib, json, time, asyncio, hashlib, pathlib, argparse, textwrap
+from urllib.parse import urljoin, urlsplit
+import httpx
 from bs4 import BeautifulSoup
-from playwright.sync_api import sync_playwright, TimeoutError as PWTimeout
-
-URLS = [
-#     "https://enatega.com/",
-
-#     # Case studies
-#     "https://enatega.com/yalla-delivery/",
-#     "https://enatega.com/stylizenow/",
-#     "https://enatega.com/easy-eats/",
-#     "https://enatega.com/vinifynd/",
-#     "https://enatega.com/snap-delivered/",
-#     "https://enatega.com/borku-delivery/",
-
-#     # Features
-#     "https://enatega.com/multi-vendor-features/",
-#     "https://enatega.com/multi-vendor-doc/overview-of-the-api/",
-#     "https://enatega.com/multi-vendor-doc/prerequisites/",
-   
-
-#    # Competitors
-#     "https://enatega.com/enatega-vs-blink/",
-#     "https://enatega.com/enatega-vs-deonde/",
-#     "https://enatega.com/enatega-vs-gloriafood/",
-#     "https://enatega.com/enatega-vs-ordering-co/",
-#     "https://enatega.com/enatega-vs-shipday/",
-#     "https://enatega.com/enatega-vs-spotneats/",
-#     "https://enatega.com/enatega-vs-yelo/",
-#     "https://enatega.com/enatega-vs-zeew/",
-
-    # Use cases
-    # "https://enatega.com/gift-delivery-solution/",
-    # "https://enatega.com/liquor-delivery-solution/",
-    # "https://enatega.com/food-and-beverage-solution/",
-    # "https://enatega.com/laundry-on-demand-services-solution/",
-    # "https://enatega.com/milk-delivery-solution/",
-    # "https://enatega.com/flower-delivery-solution/",
-    # "https://enatega.com/courier-delivery-solution/",
-    # "https://enatega.com/roadside-assistance-services-solution/",
-    # "https://enatega.com/grocery-delivery-solution/",
-    # "https://enatega.com/medicine-delivery-solution/",
-    # "https://enatega.com/beauty-services-scheduling-solution/",
-    # "https://enatega.com/document-delivery-solution/",
-
-    # "https://enatega.com/multi-vendor-doc/introduction/",
-    # "https://enatega.com/multi-vendor-doc/high-level-architecture/",
-    # "https://enatega.com/multi-vendor-doc/overview-of-the-api/",
-    # "https://enatega.com/multi-vendor-doc/faqs/",
-    # "https://enatega.com/multi-vendor-doc/license/",
-    # "https://enatega.com/multi-vendor-doc/patch-notes/",
-    # "https://enatega.com/multi-vendor-doc/prerequisites/",
-    # "https://enatega.com/multi-vendor-doc/how-to-setup-backend-api-locally/",
-    # "https://enatega.com/multi-vendor-doc/how-to-setup-web-dashboard-locally/",
-    # "https://enatega.com/multi-vendor-doc/how-to-setup-admin-dashboard-locally/",
-    # "https://enatega.com/multi-vendor-doc/how-to-setup-customer-app-locally/",
-    # "https://enatega.com/multi-vendor-doc/how-to-setup-rider-app-locally/",
-    # "https://enatega.com/multi-vendor-doc/how-to-setup-restaurant-app-locally/",
-    # "https://enatega.com/multi-vendor-doc/how-to-deploy-backend-api-server/",
-    # "https://enatega.com/multi-vendor-doc/how-to-deploy-admin-dashboard/",
-    # "https://enatega.com/multi-vendor-doc/how-to-deploy-web-dashboard/",
-    # "https://enatega.com/multi-vendor-doc/how-to-deploy-mobile-applications/",
-    # "https://enatega.com/multi-vendor-doc/configuration-google-maps-api-keys/",
-    # "https://enatega.com/multi-vendor-doc/amplitude-introduction/",
-
-    "https://enatega.com/lumi-super-ai-app/",
-]
+from playwright.async_api import async_playwright, TimeoutError as PWTimeout
+
+from chunk_engine import parse_head_meta
+from url_discovery import SITEMAPS, INCLUDE, EXCLUDE, canonical_url, discover
 
 RAW = pathlib.Path("data/raw"); RAW.mkdir(parents=True, exist_ok=True)
-CLEAN = pathlib.Path("data/clean"); CLEAN.mkdir(parents=True, exist_ok=True)
+SCRAPED = pathlib.Path("data/scraped"); SCRAPED.mkdir(parents=True, exist_ok=True)   # rewrite_texts.py -> data/clean
+
+USER_AGENT = (
+    "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) "
+    "AppleWebKit/537.36 (KHTML, like Gecko) "
+    "Chrome/120.0.0.0 Safari/537.36"
+)
 
 # selectors to detect visible content
 CONTENT_SELECTORS = [
     "main", "[role=main]", "section", "article", "h1", "h2", ".container", ".wrapper"
 ]
 
-def render_page(url: str, wait_ms: int = 1200) -> tuple[str, str]:
-    """Render a page with Playwright, return (html, visible_text)."""
-    with sync_playwright() as p:
-        browser = p.chromium.launch(headless=True)
-        ctx = browser.new_context(user_agent=(
-            "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) "
-            "AppleWebKit/537.36 (KHTML, like Gecko) "
-            "Chrome/120.0.0.0 Safari/537.36"
-        ))
-        page = ctx.new_page()
-        page.goto(url, wait_until="networkidle", timeout=45_000)
-
-        # dismiss common banners
-        for text in ["Accept", "I agree", "Got it", "Allow all", "Accept all", "Close", "OK"]:
+# not needed for text; skipping them is most of the page weight
+BLOCKED_RESOURCES = {"image", "font", "media"}
+
+# cheap probes of unchanged pages shouldn't wait behind renders: more queue workers than render slots
+PROBE_WORKERS_PER_RENDER = 4
+
+# per-URL validators + fingerprints from the last run, and the slugs this run changed
+MANIFEST_NAME = "scrape_manifest.json"
+CHANGED_NAME = "changed_slugs.json"
+
+BANNER_TEXTS = ["Accept", "I agree", "Got it", "Allow all", "Accept all", "Close", "OK"]
+
+# Scroll until the bottom is reached and the DOM has been quiet for `quiet` ms
+# after each step (lazy sections loaded), instead of fixed sleeps. `cap` bounds every wait.
+SCROLL_UNTIL_STABLE_JS = """
+async ({quiet, cap}) => {
+  const settle = () => new Promise(resolve => {
+    let timer = setTimeout(done, quiet);
+    const hardStop = setTimeout(done, cap);
+    const obs = new MutationObserver(() => { clearTimeout(timer); timer = setTimeout(done, quiet); });
+    obs.observe(document.documentElement, {childList: true, subtree: true, attributes: true, characterData: true});
+    function done() { obs.disconnect(); clearTimeout(timer); clearTimeout(hardStop); resolve(); }
+  });
+  await settle();
+  let y = 0;
+  for (let i = 0; i < 200 && y < document.body.scrollHeight; i++) {
+    y += window.innerHeight;
+    window.scrollTo(0, y);
+    await settle();
+  }
+  window.scrollTo(0, 0);
+}
+"""
+
+
+async def _block_heavy(route):
+    if route.request.resource_type in BLOCKED_RESOURCES:
+        await route.abort()
+    else:
+        await route.continue_()
+
+
+async def render_page(browser, url: str, quiet_ms: int = 300, cap_ms: int = 3000) -> tuple[str, str]:
+    """Render a page in its own context of the shared browser, return (html, visible_text)."""
+    ctx = await browser.new_context(user_agent=USER_AGENT)
+    try:
+        await ctx.route("**/*", _block_heavy)
+        page = await ctx.new_page()
+        await page.goto(url, wait_until="domcontentloaded", timeout=45_000)
+
+        # dismiss common banners (only click what is actually there)
+        for text in BANNER_TEXTS:
             try:
-                page.get_by_text(text, exact=False).first.click(timeout=1000)
+                loc = page.get_by_text(text, exact=False).first
+                if await loc.count():
+                    await loc.click(timeout=1000)
             except Exception:
                 pass
 
-        # auto-scroll to load lazy content
-        page.evaluate("""
-            () => new Promise(resolve => {
-              let y = 0; const step = 600;
-              const timer = setInterval(() => {
-                window.scrollBy(0, step); y += step;
-                if (y >= document.body.scrollHeight) { clearInterval(timer); resolve(); }
-              }, 200);
-            })
-        """)
-        page.wait_for_timeout(wait_ms)
+        # auto-scroll to load lazy content, waiting for the DOM to settle
+        await page.evaluate(SCROLL_UNTIL_STABLE_JS, {"quiet": quiet_ms, "cap": cap_ms})
 
         # wait for some content
-        for sel in CONTENT_SELECTORS:
-            try:
-                page.wait_for_selector(sel, timeout=3000)
-                break
-            except PWTimeout:
-                continue
+        try:
+            await page.wait_for_selector(", ".join(CONTENT_SELECTORS), timeout=3000)
+        except PWTimeout:
+            pass
 
         # dump both: full DOM (debugging) + visible text (preferred)
-        html = page.content()
+        html = await page.content()
         try:
-            visible_text = page.locator("body").inner_text(timeout=2000)
+            visible_text = await page.locator("body").inner_text(timeout=2000)
         except Exception:
             visible_text = ""
-
-        browser.close()
         return html, visible_text
+    finally:
+        await ctx.close()
 
 def normalize(text: str) -> str:
     """Basic cleanup for whitespace and junk placeholders."""
@@ -132,43 +108,256 @@ def normalize(text: str) -> str:
 def preview(text: str, n=900) -> str:
     return textwrap.shorten(text, width=n, placeholder="…")
 
-def main():
-    for url in URLS:
-        slug = url.rstrip("/").split("/")[-1] or "home"
-        raw_file = RAW / f"{slug}.html"
-        clean_file = CLEAN / f"{slug}.txt"
-
-        html, visible_text = render_page(url)
-        raw_file.write_text(html, encoding="utf-8")
-
-        # ✅ Prefer visible text (user-facing only)
-        cleaned = normalize(visible_text)
-        if len(cleaned.split()) < 60:  # fallback if visible text too short
-            soup = BeautifulSoup(html, "lxml")
-            for tag in soup(["script", "style", "noscript", "template", "svg", "canvas"]):
-                tag.decompose()
-            for sel in ["header", "nav", "footer", "[role=navigation]"]:
-                for t in soup.select(sel):
-                    t.decompose()
-            main_tag = soup.select_one("main, [role=main], article, section") or soup.body or soup
-            cleaned = normalize(" ".join(s.strip() for s in main_tag.stripped_strings if s))
-
-        clean_file.write_text(cleaned, encoding="utf-8")
-
-        # metadata
-        title = ""
+def url_to_slug(url: str) -> str:
+    return url.rstrip("/").split("/")[-1] or "home"
+
+def sha(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()[:32]
+
+_SCRIPTS = re.compile(r"<(script|style|noscript|template)\b.*?</\1\s*>|<!--.*?-->", re.S | re.I)
+_TAGS = re.compile(r"<[^>]+>")
+
+def source_fingerprint(html: str) -> str:
+    """Hash of the server HTML's text only: scripts, nonces in inline JS and markup churn don't count."""
+    text = _TAGS.sub(" ", _SCRIPTS.sub(" ", html))
+    return sha(normalize(htmllib.unescape(text)))
+
+def load_manifest(raw_dir: pathlib.Path) -> dict:
+    try:
+        return json.loads((raw_dir / MANIFEST_NAME).read_text(encoding="utf-8"))
+    except Exception:
+        return {}
+
+def save_json(path: pathlib.Path, obj):
+    tmp = path.with_name(path.name + ".tmp")
+    tmp.write_text(json.dumps(obj, ensure_ascii=False, indent=1, sort_keys=True), encoding="utf-8")
+    tmp.replace(path)
+
+async def probe(http: httpx.AsyncClient, url: str, entry: dict) -> tuple[bool, dict]:
+    """
+    Cheap change check without a browser: conditional HEAD, then conditional GET of the
+    server HTML compared by text fingerprint. Returns (unchanged, fresh validators).
+    """
+    cond = {}
+    if entry.get("etag"):
+        cond["If-None-Match"] = entry["etag"]
+    if entry.get("last_modified"):
+        cond["If-Modified-Since"] = entry["last_modified"]
+
+    def validators(r: httpx.Response) -> dict:
+        return {"etag": r.headers.get("etag") or entry.get("etag"),
+                "last_modified": r.headers.get("last-modified") or entry.get("last_modified")}
+
+    if cond:
+        r = await http.head(url, headers=cond)
+        if r.status_code == 304:
+            return True, validators(r)
+        if r.status_code == 200 and (
+            (entry.get("etag") and r.headers.get("etag") == entry["etag"]) or
+            (entry.get("last_modified") and r.headers.get("last-modified") == entry["last_modified"])
+        ):
+            return True, validators(r)
+    r = await http.get(url, headers=cond)
+    if r.status_code == 304:
+        return True, validators(r)
+    r.raise_for_status()
+    fresh = {"etag": r.headers.get("etag"), "last_modified": r.headers.get("last-modified"),
+             "source_hash": source_fingerprint(r.text)}
+    return bool(entry.get("source_hash")) and fresh["source_hash"] == entry["source_hash"], fresh
+
+def extract_text(html: str, visible_text: str) -> str:
+    # ✅ Prefer visible text (user-facing only)
+    cleaned = normalize(visible_text)
+    if len(cleaned.split()) < 60:  # fallback if visible text too short
+        soup = BeautifulSoup(html, "lxml")
+        for tag in soup(["script", "style", "noscript", "template", "svg", "canvas"]):
+            tag.decompose()
+        for sel in ["header", "nav", "footer", "[role=navigation]"]:
+            for t in soup.select(sel):
+                t.decompose()
+        main_tag = soup.select_one("main, [role=main], article, section") or soup.body or soup
+        cleaned = normalize(" ".join(s.strip() for s in main_tag.stripped_strings if s))
+    return cleaned
+
+async def scrape_one(browser, sem: asyncio.Semaphore, http: httpx.AsyncClient, url: str, raw_dir: pathlib.Path,
+                     clean_dir: pathlib.Path, manifest: dict, force: bool = False, enqueue=None) -> dict:
+    slug = url_to_slug(url)
+    raw_file = raw_dir / f"{slug}.html"
+    clean_file = clean_dir / f"{slug}.txt"
+    entry = manifest.get(url) or {}
+    now = time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())
+    t0 = time.perf_counter()
+
+    fresh = {}
+    have_files = raw_file.exists() and clean_file.exists()
+    if not force and entry and have_files:
         try:
-            soup = BeautifulSoup(html, "lxml")
-            title = (soup.title.string or "").strip() if soup.title and soup.title.string else ""
-        except Exception:
-            pass
+            unchanged, fresh = await probe(http, url, entry)
+        except Exception as e:
+            unchanged = False
+            print(f"Probe failed for {url} ({e}); rendering.")
+        if unchanged:
+            manifest[url] = {**entry, **fresh, "slug": slug, "checked_at": now}
+            return {"url": url, "slug": slug, "ok": True, "status": "unchanged", "render_ms": 0.0,
+                    "total_ms": (time.perf_counter() - t0) * 1000}
+
+    async with sem:
+        t_render = time.perf_counter()
+        try:
+            html, visible_text = await render_page(browser, url)
+        except Exception as e:
+            print(f"✗ {url}: {e}")
+            return {"url": url, "slug": slug, "ok": False, "status": "failed",
+                    "render_ms": (time.perf_counter() - t_render) * 1000}
+        render_ms = (time.perf_counter() - t_render) * 1000
+
+    # <link rel=canonical> to another page on the same site: scrape that one (once) instead
+    head = parse_head_meta(html)
+    target = canonical_url(urljoin(url, head["canonical"]), None) if head["canonical"] else None
+    if target and target != url and urlsplit(target).netloc == urlsplit(url).netloc:
+        if enqueue:
+            enqueue(target)
+        manifest[url] = {"canonical": target, "checked_at": now}
+        return {"url": url, "slug": slug, "ok": True, "status": "duplicate", "render_ms": render_ms,
+                "total_ms": (time.perf_counter() - t0) * 1000, "canonical": target}
+
+    # parsing is CPU work; keep it off the event loop so other pages keep rendering
+    cleaned = await asyncio.to_thread(extract_text, html, visible_text)
+    text_hash = sha(cleaned)
+    if not force and have_files and text_hash == entry.get("text_hash"):
+        # validators moved but the text didn't: leave files alone so nothing downstream reruns
+        manifest[url] = {**entry, **fresh, "slug": slug, "checked_at": now}
+        return {"url": url, "slug": slug, "ok": True, "status": "same text", "render_ms": render_ms,
+                "total_ms": (time.perf_counter() - t0) * 1000}
+
+    raw_file.write_text(html, encoding="utf-8")
+    clean_file.write_text(cleaned, encoding="utf-8")
+    title = head["title"]
+    if "source_hash" not in fresh:
+        try:
+            r = await http.get(url)
+            fresh = {"etag": r.headers.get("etag"), "last_modified": r.headers.get("last-modified"),
+                     "source_hash": source_fingerprint(r.text)}
+        except Exception as e:
+            print(f"Validator fetch failed for {url}:", e)
+    manifest[url] = {**entry, **fresh, "slug": slug, "text_hash": text_hash, "checked_at": now, "changed_at": now}
+
+    print("="*60)
+    print(f"URL: {url}")
+    print(f"Saved → {raw_file.name}, {clean_file.name}")
+    print(f"Title: {title}")
+    print(f"Words: {len(cleaned.split())}  Render: {render_ms:.0f} ms")
+    print("Preview:", preview(cleaned, 300))
+    return {"url": url, "slug": slug, "ok": True, "status": "changed", "render_ms": render_ms,
+            "total_ms": (time.perf_counter() - t0) * 1000, "words": len(cleaned.split())}
+
+async def scrape_all(urls: list[str], concurrency: int = 4, raw_dir: pathlib.Path = RAW,
+                     clean_dir: pathlib.Path = SCRAPED, force: bool = False) -> list[dict]:
+    """
+    One browser for the whole run; up to `concurrency` pages render at once, each in its own context.
+    URLs go through a work queue in the given order, de-duplicated by canonical form; a page whose
+    <link rel=canonical> names another URL is recorded as a duplicate and that URL is queued instead.
+    Pages whose validators / fingerprints match the manifest are not rendered or rewritten.
+    Writes raw_dir/scrape_manifest.json and raw_dir/changed_slugs.json.
+    """
+    raw_dir.mkdir(parents=True, exist_ok=True)
+    clean_dir.mkdir(parents=True, exist_ok=True)
+    manifest = load_manifest(raw_dir)
+    sem = asyncio.Semaphore(max(1, concurrency))
+    queue: asyncio.Queue = asyncio.Queue()
+    queued, results = set(), []
+
+    def enqueue(u: str):
+        key = canonical_url(u, None) or u
+        if key not in queued:
+            queued.add(key)
+            queue.put_nowait(key)
+
+    for u in urls:
+        enqueue(u)
+
+    async with httpx.AsyncClient(follow_redirects=True, timeout=20, headers={"User-Agent": USER_AGENT}) as http, \
+            async_playwright() as p:
+        browser = await p.chromium.launch(headless=True)
+
+        async def worker():
+            while True:
+                u = await queue.get()
+                try:
+                    results.append(await scrape_one(browser, sem, http, u, raw_dir, clean_dir, manifest, force, enqueue))
+                except Exception as e:
+                    print(f"✗ {u}: {e}")
+                    results.append({"url": u, "slug": url_to_slug(u), "ok": False, "status": "failed", "render_ms": 0.0})
+                finally:
+                    queue.task_done()
+
+        workers = [asyncio.create_task(worker()) for _ in range(max(1, concurrency) * PROBE_WORKERS_PER_RENDER)]
+        try:
+            await queue.join()
+        finally:
+            for w in workers:
+                w.cancel()
+            await asyncio.gather(*workers, return_exceptions=True)
+            await browser.close()
+
+    save_json(raw_dir / MANIFEST_NAME, manifest)
+    by_status = lambda st: sorted(r["slug"] for r in results if r["status"] == st)
+    save_json(raw_dir / CHANGED_NAME, {
+        "generated": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "changed": by_status("changed"),
+        "unchanged": sorted(by_status("unchanged") + by_status("same text")),
+        "failed": by_status("failed"),
+        "duplicate": by_status("duplicate"),
+    })
+    return results
+
+def print_timings(results: list[dict], wall_s: float):
+    print("\n" + "="*60)
+    print(f"{'slug':<40} {'status':>10} {'render ms':>10} {'total ms':>10}")
+    for r in sorted(results, key=lambda r: -r["render_ms"]):
+        total = f"{r['total_ms']:.0f}" if r["ok"] else "-"
+        print(f"{r['slug'][:40]:<40} {r['status']:>10} {r['render_ms']:>10.0f} {total:>10}")
+    counts = {st: sum(r["status"] == st for r in results) for st in ("changed", "same text", "unchanged", "duplicate", "failed")}
+    renders = sorted(r["render_ms"] for r in results if r["ok"] and r["render_ms"])
+    print(f"\n{len(results)} pages in {wall_s:.1f}s wall: " + ", ".join(f"{n} {st}" for st, n in counts.items()))
+    if renders:
+        print(f"render p50 {renders[len(renders) // 2]:.0f} ms, max {renders[-1]:.0f} ms")
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("urls", nargs="*", help="URLs to scrape (default: discovered from the sitemaps)")
+    ap.add_argument("--sitemap", action="append", help="Sitemap or sitemap index URL (repeatable)")
+    ap.add_argument("--include", action="append", help="Regex on the URL path to keep (repeatable)")
+    ap.add_argument("--exclude", action="append", help="Regex on the URL path to drop (added to defaults)")
+    ap.add_argument("--limit", type=int, default=0, help="Only the first N discovered pages (by priority)")
+    ap.add_argument("--discover-only", action="store_true", help="Print the discovered pages and exit")
+    ap.add_argument("--concurrency", type=int, default=4, help="Pages rendered at once")
+    ap.add_argument("--raw-dir", type=pathlib.Path, default=RAW)
+    ap.add_argument("--clean-dir", type=pathlib.Path, default=SCRAPED, help="Where extracted page text goes")
+    ap.add_argument("--force", action="store_true", help="Render and rewrite every page, ignoring the manifest")
+    args = ap.parse_args()
 
-        print("="*60)
-        print(f"URL: {url}")
-        print(f"Saved → {raw_file.name}, {clean_file.name}")
-        print(f"Title: {title}")
-        print(f"Words: {len(cleaned.split())}")
-        print("Preview:", preview(cleaned, 300))
+    if args.urls:
+        urls = list(dict.fromkeys(args.urls))
+    else:
+        entries = asyncio.run(discover(args.sitemap or SITEMAPS, args.include or INCLUDE,
+                                       EXCLUDE + (args.exclude or [])))
+        if args.limit:
+            entries = entries[:args.limit]
+        if args.discover_only:
+            for e in entries:
+                print(f"{e.priority:.1f}  {e.lastmod[:10]:<10}  {e.url}")
+            print(f"\n{len(entries)} pages")
+            return
+        if not entries:
+            print("No pages discovered; check the sitemap URL or patterns.")
+            raise SystemExit(1)
+        urls = [e.url for e in entries]
+    t0 = time.perf_counter()
+    results = asyncio.run(scrape_all(urls, args.concurrency, args.raw_dir, args.clean_dir, args.force))
+    print_timings(results, time.perf_counter() - t0)
+    if not all(r["ok"] for r in results):
+        raise SystemExit(1)
 
 
 if __name__ == "__main__":